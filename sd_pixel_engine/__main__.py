@@ -1,3 +1,8 @@
+import multiprocessing
+
 from sd_pixel_engine.main import main
 
+# Compaction runs a process pool, which needs this in the frozen exe
+multiprocessing.freeze_support()
+
 main()
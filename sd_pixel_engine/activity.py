@@ -0,0 +1,109 @@
+import sys
+import logging
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+import numpy as np
+
+from sd_pixel_engine.selection import make_thumbnail
+
+logger = logging.getLogger(__name__)
+
+IDLE_THRESHOLD = 300  # seconds without keyboard or mouse input before grabs pause
+BLANK_LEVEL = 8  # brightest thumbnail pixel of a frame that counts as blank (displays off)
+
+
+def input_idle_seconds() -> Optional[float]:
+    """Seconds since the last keyboard or mouse input of the session, None when unknown."""
+    if sys.platform != "win32":
+        return None
+    import ctypes
+    from ctypes import wintypes
+
+    class LASTINPUTINFO(ctypes.Structure):
+        _fields_ = [("cbSize", wintypes.UINT), ("dwTime", wintypes.DWORD)]
+
+    info = LASTINPUTINFO(cbSize=ctypes.sizeof(LASTINPUTINFO))
+    if not ctypes.windll.user32.GetLastInputInfo(ctypes.byref(info)):
+        return None
+    # Both are 32 bit millisecond tick counts, the difference survives the wrap
+    elapsed = (ctypes.windll.kernel32.GetTickCount() - info.dwTime) & 0xFFFFFFFF
+    return elapsed / 1000
+
+
+def screen_locked() -> bool:
+    if sys.platform != "win32":
+        return False
+    from sd_pixel_engine.capture_window_new import is_screen_locked
+    return is_screen_locked()
+
+
+def is_blank_frame(frame: np.ndarray, level: int = BLANK_LEVEL) -> bool:
+    """Checked on a thumbnail, so a blank desktop is dropped before anything is encoded."""
+    return float(make_thumbnail(frame).max()) <= level
+
+
+class ActivityGate:
+    """
+    Wraps a grab function (grab_desktop or a capture source) and returns None
+    instead of grabbing while the workstation is locked or the user has been
+    idle for idle_threshold seconds. Frames that come back blank (displays
+    off) are dropped after a thumbnail check, before staging encodes them.
+
+    The slot still needs a screenshot for its idle event, so force() lets
+    one grab through whatever the state.
+    """
+
+    def __init__(self, grab: Callable, idle_threshold: float = IDLE_THRESHOLD,
+                 idle_seconds: Callable[[], Optional[float]] = input_idle_seconds,
+                 locked: Callable[[], bool] = screen_locked):
+        self.grab = grab
+        self.idle_threshold = idle_threshold
+        self.idle_seconds = idle_seconds
+        self.locked = locked
+        self.state = "active"
+        self.paused = Counter()
+        self.forced = False
+
+    def check(self) -> str:
+        if self.locked():
+            return "locked"
+        idle = self.idle_seconds()
+        if idle is not None and idle >= self.idle_threshold:
+            return "idle"
+        return "active"
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            logger.info(f"activity => {state} (was {self.state})")
+            self.state = state
+        if state != "active":
+            self.paused[state] += 1
+
+    @contextmanager
+    def force(self):
+        self.forced = True
+        try:
+            yield
+        finally:
+            self.forced = False
+
+    def __call__(self):
+        if not self.forced:
+            state = self.check()
+            if state != "active":
+                self._set_state(state)
+                return None
+
+        grabbed = self.grab()
+        if grabbed is None or self.forced:
+            return grabbed
+        if is_blank_frame(grabbed[0]):
+            self._set_state("blank")
+            return None
+        self._set_state("active")
+        return grabbed
+
+    def stats(self) -> dict:
+        return {"state": self.state, "paused": dict(self.paused)}
@@ -0,0 +1,243 @@
+import os
+import sys
+import random
+import logging
+import argparse
+from bisect import bisect_right
+from collections import Counter
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from sd_pixel_engine.const import INTERVAL
+from sd_pixel_engine.selection import make_thumbnail, window_key
+
+try:
+    import psutil
+except ImportError:  # optional, Windows falls back to GetSystemTimes
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+MIN_INTERVAL = 10  # seconds between grabs while the screen changes quickly
+MAX_INTERVAL = 300  # seconds between grabs for a still screen or a busy CPU
+SLOT_GRABS = 6  # grabs a slot gets at least, however far the interval backs off
+STILL_CHANGE = 0.005  # mean thumbnail difference (0..1) below which frames count as identical
+RAPID_CHANGE = 0.08  # difference above which content counts as changing rapidly
+CPU_BUSY = 0.85  # system CPU load (0..1) above which grabs back off
+BACKOFF = 1.5  # interval factor per still or busy observation
+TIGHTEN = 0.5  # interval factor per rapid change observation
+
+
+def slot_max_interval(slot_seconds: float, max_interval=MAX_INTERVAL) -> float:
+    """
+    Longest interval that still leaves SLOT_GRABS grabs per slot. Backing
+    off to a quarter of a 20 minute slot let some slots miss the window
+    that was in front longest (synthetic traces, dwell 30 s).
+    """
+    return min(max_interval, slot_seconds / SLOT_GRABS)
+
+
+def frame_change(previous: Optional[np.ndarray], current: Optional[np.ndarray]) -> Optional[float]:
+    """Mean absolute difference of two thumbnails, 0 (identical) to 1."""
+    if previous is None or current is None:
+        return None
+    if previous.shape != current.shape:
+        return 1.0
+    return float(np.abs(current - previous).mean()) / 255
+
+
+class CpuLoad:
+    """Busy fraction of all CPUs since the previous call, None when unknown."""
+
+    def __init__(self):
+        self._last = None
+        if psutil is not None:
+            psutil.cpu_percent(None)  # primes the counter
+
+    def _system_times(self):
+        import ctypes
+        from ctypes import wintypes
+
+        idle, kernel, user = wintypes.FILETIME(), wintypes.FILETIME(), wintypes.FILETIME()
+        if not ctypes.windll.kernel32.GetSystemTimes(ctypes.byref(idle), ctypes.byref(kernel), ctypes.byref(user)):
+            return None
+        value = lambda t: (t.dwHighDateTime << 32) | t.dwLowDateTime
+        # Kernel time includes idle time
+        return value(idle), value(kernel) + value(user)
+
+    def __call__(self) -> Optional[float]:
+        if psutil is not None:
+            return psutil.cpu_percent(None) / 100
+        if sys.platform != "win32":
+            return None
+
+        times = self._system_times()
+        last, self._last = self._last, times
+        if times is None or last is None:
+            return None
+        idle, total = times[0] - last[0], times[1] - last[1]
+        return 1 - idle / total if total > 0 else None
+
+
+class AdaptiveRate:
+    """
+    Interval between staging grabs, adapted after every grab.
+
+    Backs off by BACKOFF towards max_interval while the CPU is busy or
+    consecutive frames are near-identical, halves towards min_interval while
+    the content of one window changes rapidly, returns to the base interval
+    when the foreground window switches, and drifts back to it otherwise.
+    A busy CPU wins over everything else. The scheduler still fires
+    every slot and grabs once at slot time if no tick ran in it, so the one
+    screenshot per slot guarantee holds at any interval.
+    """
+
+    def __init__(self, base=INTERVAL, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL,
+                 cpu_load: Optional[Callable[[], Optional[float]]] = None):
+        self.base = base
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.cpu_load = cpu_load
+        self.interval = base
+        self.reason = "start"
+        self.reasons = Counter()
+        self._thumbnail = None
+        self._window = None
+
+    def update(self, change: Optional[float], load: Optional[float], switched=False) -> float:
+        if load is not None and load >= CPU_BUSY:
+            self.interval = min(self.max_interval, self.interval * BACKOFF)
+            self.reason = "cpu busy"
+        elif switched:
+            self.interval = self.base
+            self.reason = "window switch"
+        elif change is not None and change >= RAPID_CHANGE:
+            self.interval = max(self.min_interval, self.interval * TIGHTEN)
+            self.reason = "rapid change"
+        elif change is not None and change < STILL_CHANGE:
+            self.interval = min(self.max_interval, self.interval * BACKOFF)
+            self.reason = "still"
+        else:
+            if self.interval > self.base:
+                self.interval = max(self.base, self.interval / BACKOFF)
+            else:
+                self.interval = min(self.base, self.interval / TIGHTEN)
+            self.reason = "steady"
+        self.reasons[self.reason] += 1
+        return self.interval
+
+    def observe(self, frame: Optional[np.ndarray], window: Optional[dict] = None) -> float:
+        """Feed the latest grab (None when it failed), returns the next interval."""
+        thumbnail = make_thumbnail(frame) if frame is not None else None
+        change = frame_change(self._thumbnail, thumbnail)
+        switched = False
+        if thumbnail is not None:
+            key = window_key(window)
+            switched = self._thumbnail is not None and key != self._window
+            self._thumbnail, self._window = thumbnail, key
+        return self.update(change, self.cpu_load() if self.cpu_load else None, switched)
+
+    def stats(self) -> dict:
+        return {"interval": round(self.interval, 1), "reason": self.reason, "reasons": dict(self.reasons)}
+
+
+# Thumbnail change between two grabs of the same window, per kind of activity
+ACTIVITY_CHANGE = {"still": 0.001, "typing": 0.02, "scrolling": 0.15}
+ACTIVITY_WEIGHTS = [0.5, 0.35, 0.15]
+
+
+def _annotate_trace(trace: dict, seed: int, busy_share: float):
+    """Give every foreground segment an activity, and mark busy CPU periods."""
+    rng = random.Random(seed)
+    activities = [rng.choices(list(ACTIVITY_CHANGE), ACTIVITY_WEIGHTS)[0] for _ in trace["foreground"]]
+    busy, now = [], 0.0
+    while now < trace["duration"]:
+        length = rng.uniform(60, 600)
+        if rng.random() < busy_share:
+            busy.append((now, now + length))
+        now += length
+    return activities, busy
+
+
+def simulate(trace: dict, times_per_hour: float, adaptive: bool, grab_cost: float,
+             seed=1, busy_share=0.15) -> dict:
+    """
+    Grab times over a recorded foreground trace with a fixed or adaptive
+    interval; reports CPU spent on grabs and how well slots are served.
+    """
+    starts = [start for start, _ in trace["foreground"]]
+    windows = [window for _, window in trace["foreground"]]
+    activities, busy = _annotate_trace(trace, seed, busy_share)
+    slot = 3600 / times_per_hour
+    rate = AdaptiveRate(max_interval=slot_max_interval(slot))
+
+    def segment(t):
+        return max(0, bisect_right(starts, t) - 1)
+
+    grabs: List[float] = []
+    now, previous, slot_end = 0.0, None, slot
+    while now <= trace["duration"]:
+        if now >= slot_end:
+            # Slot guarantee: nothing grabbed in this slot, grab at its boundary
+            if not grabs or grabs[-1] < slot_end - slot:
+                grabs.append(slot_end)
+            slot_end += slot
+            continue
+        grabs.append(now)
+        current = segment(now)
+        if adaptive:
+            switched = previous is not None and windows[previous] != windows[current]
+            change = 1.0 if switched else None if previous is None else ACTIVITY_CHANGE[activities[current]]
+            load = 0.95 if any(a <= now < b for a, b in busy) else 0.3
+            rate.update(change, load, switched)
+        previous = current
+        now += rate.interval if adaptive else INTERVAL
+
+    # Quality: did the slot grab the window that was in front longest?
+    ends = starts[1:] + [trace["duration"]]
+    served = slots = 0
+    for slot_start in np.arange(0, trace["duration"], slot):
+        dwell = Counter()
+        for i in range(segment(slot_start), len(starts)):
+            if starts[i] >= slot_start + slot:
+                break
+            dwell[windows[i]] += min(ends[i], slot_start + slot) - max(starts[i], slot_start)
+        grabbed = {windows[segment(t)] for t in grabs if slot_start <= t < slot_start + slot}
+        slots += 1
+        served += dwell.most_common(1)[0][0] in grabbed
+
+    hours = trace["duration"] / 3600
+    result = {
+        "grabs_per_hour": round(len(grabs) / hours, 1),
+        "cpu_seconds_per_hour": round(len(grabs) * grab_cost / hours, 1),
+        "dominant_window_served": round(served / slots, 3),
+        "window_coverage": round(len({windows[segment(t)] for t in grabs}) / len(set(windows)), 3),
+    }
+    if adaptive:
+        result["reasons"] = dict(rate.reasons)
+    return result
+
+
+if __name__ == '__main__':
+    from sd_pixel_engine.triggers import synthetic_trace
+
+    parser = argparse.ArgumentParser(description="Simulate fixed vs adaptive sampling over a foreground trace")
+    parser.add_argument("--trace", help="JSON trace as written for sd_pixel_engine.triggers")
+    parser.add_argument("--hours", type=float, default=8)
+    parser.add_argument("--dwell", type=float, default=30, help="Median seconds a synthetic window stays in front")
+    parser.add_argument("--times_per_hour", type=float, default=3)
+    parser.add_argument("--grab_ms", type=float, default=150, help="CPU time of one grab and encode")
+    parser.add_argument("--busy_share", type=float, default=0.15, help="Share of time the CPU is busy")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.trace and os.path.exists(args.trace):
+        import json
+        with open(args.trace) as f:
+            trace = json.load(f)
+    else:
+        trace = synthetic_trace(args.hours, args.seed, args.dwell)
+    for adaptive in (False, True):
+        result = simulate(trace, args.times_per_hour, adaptive, args.grab_ms / 1000, args.seed, args.busy_share)
+        print(f"{'adaptive' if adaptive else f'fixed {INTERVAL}s':10} {result}")
@@ -0,0 +1,359 @@
+import heapq
+import signal
+import asyncio
+import logging
+import itertools
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Optional
+
+import requests
+
+from sd_pixel_engine.const import SLOT_NETWORK_DEADLINE
+from sd_pixel_engine.scheduler import MAX_SLEEP, LATENESS_HISTORY, _summary
+from sd_pixel_engine.hibernation import wake_signal
+from sd_pixel_engine.schedule import VirtualClock
+
+logger = logging.getLogger(__name__)
+
+CAPTURE_WORKERS = 1  # threads grabbing and staging frames
+ENCODE_WORKERS = 1  # threads encoding, writing and uploading slot finals
+IO_WORKERS = 2  # threads for event refreshes and outbox delivery
+EVENT_REFRESH = 60  # seconds between background event timeline refreshes
+SETTLE_ROUNDS = 5  # idle loop rounds before a VirtualClock moves to the next sleeper
+
+
+class StageLatency:
+    """
+    Latency of every engine stage in one place: how long work waited for
+    its executor (and the staging lock) and how long it ran there. Tick and
+    slot lateness against their deadlines are recorded as waits.
+    """
+
+    def __init__(self, history=LATENESS_HISTORY):
+        self.waits = defaultdict(lambda: deque(maxlen=history))
+        self.runs = defaultdict(lambda: deque(maxlen=history))
+
+    def record(self, stage: str, waited: float, ran: Optional[float] = None):
+        self.waits[stage].append(waited)
+        if ran is not None:
+            self.runs[stage].append(ran)
+
+    def stats(self) -> dict:
+        return {
+            stage: {"wait": _summary(self.waits[stage]), "run": _summary(self.runs[stage])}
+            for stage in self.waits
+        }
+
+
+class AsyncEngine:
+    """
+    Runs one ScreenShot on an asyncio loop instead of its blocking run().
+
+    The slot scheduler, the 30 second sampling ticker, the event timeline
+    refresh and the upload outbox are tasks on the loop; grabs go to the
+    capture executor, slot finals (select, encode, write) to the encode
+    executor and network work (event refreshes, slot uploads, outbox) to
+    the io executor. Each executor is bounded and every task awaits its own
+    work, so nothing queues without limit. Grabs and slot writes share the
+    staging lock, staging stays single-writer; a slot's upload runs after
+    the lock is released, so a slow server never holds up grabs. Slots
+    always use the two-call flow (ScreenShot._prepare_slot). The loop
+    itself never blocks, so deadlines stay on time while a slot is being
+    encoded or the server is slow.
+
+    Every time read and sleep goes through the ScreenShot's clock. On a
+    VirtualClock sleeping tasks wait in a timer heap and the clock jumps to
+    the earliest one once every task is blocked, so a simulated day runs in
+    seconds with the same ordering as real time.
+
+    stop() or SIGTERM cancels the tasks, waits for running executor work and
+    leaves the rest to ScreenShot.shutdown(). Capture triggers are not
+    used here, ticks stay on their grid; with an adaptive rate a slot
+    without a grab still gets one (scheduler.slot_tick).
+    """
+
+    def __init__(self, screenshot, anchored=False, capture_workers=CAPTURE_WORKERS,
+                 encode_workers=ENCODE_WORKERS, io_workers=IO_WORKERS):
+        self.screenshot = screenshot
+        self.anchored = anchored
+        self.clock = screenshot.clock
+        self.capture = ThreadPoolExecutor(capture_workers, thread_name_prefix="capture")
+        self.encode = ThreadPoolExecutor(encode_workers, thread_name_prefix="encode")
+        self.io = ThreadPoolExecutor(io_workers, thread_name_prefix="engine-io")
+        self.latency = StageLatency()
+        self.skipped_ticks = 0
+        self.skipped_slots = 0
+        self._slot_ticks = 0  # grabs since the last slot, for slot_tick
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks = []
+
+        self._virtual = isinstance(self.clock, VirtualClock)
+        self._timers = []  # (deadline, seq, future) of tasks sleeping on a VirtualClock
+        self._timer_seq = itertools.count()
+        self._busy = 0  # executor stages in flight
+        self._activity = 0  # bumped by every sleep and stage, tells the driver the loop is not settled
+
+    async def _run(self, executor, fn: Callable):
+        self._busy += 1
+        self._activity += 1
+        try:
+            return await self._loop.run_in_executor(executor, fn)
+        finally:
+            self._busy -= 1
+            self._activity += 1
+
+    async def _stage(self, stage: str, executor, fn: Callable, lock: Optional[asyncio.Lock] = None):
+        """Run fn on executor as one measured stage, holding lock around it when given."""
+        queued = self.clock.monotonic()
+        started = []
+
+        def timed():
+            started.append(self.clock.monotonic())
+            return fn()
+
+        if lock is not None:
+            async with lock:
+                result = await self._run(executor, timed)
+        else:
+            result = await self._run(executor, timed)
+        self.latency.record(stage, started[0] - queued, self.clock.monotonic() - started[0])
+        return result
+
+    async def _sleep(self, seconds: float):
+        """asyncio.sleep on the engine clock."""
+        seconds = max(0.0, seconds)
+        if not self._virtual:
+            await asyncio.sleep(seconds)
+            return
+        waiter = self._loop.create_future()
+        heapq.heappush(self._timers, (self.clock.monotonic() + seconds, next(self._timer_seq), waiter))
+        self._activity += 1
+        await waiter
+
+    async def _wait(self, event: asyncio.Event, timeout: float):
+        """event.wait() for at most timeout seconds on the engine clock."""
+        waits = [asyncio.ensure_future(event.wait()), asyncio.ensure_future(self._sleep(timeout))]
+        try:
+            await asyncio.wait(waits, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiting in waits:
+                waiting.cancel()
+
+    async def _drive_virtual_time(self):
+        """Move a VirtualClock to the earliest sleeper once every task is blocked."""
+        quiet = 0
+        while True:
+            if self._busy or not self._timers:
+                # Executor work runs in real time, let it finish
+                await asyncio.sleep(0.001)
+                quiet = 0
+                continue
+            seen = self._activity
+            await asyncio.sleep(0)
+            quiet = quiet + 1 if seen == self._activity else 0
+            if quiet < SETTLE_ROUNDS:
+                continue
+            deadline, _, waiter = heapq.heappop(self._timers)
+            if waiter.cancelled():
+                continue
+            # Raises SimulationEnd at the clock's end, which stops the engine
+            self.clock.sleep(deadline - self.clock.monotonic())
+            waiter.set_result(None)
+            quiet = 0
+
+    async def _sleep_until(self, wall_target: float):
+        """Sleep to a wall clock instant in chunks, so clock changes and resume are noticed."""
+        while True:
+            remaining = wall_target - self.clock.time()
+            if remaining <= 0:
+                return
+            await self._sleep(min(remaining, MAX_SLEEP))
+
+    async def _hibernate(self, until, reason: str):
+        logger.info(f"Hibernating until {until} ({reason})")
+        self._window.clear()
+        await self._stage("release", self.encode, self.screenshot._release_resources, self._staging)
+        await self._sleep_until(until.timestamp())
+        wake_signal.take_long_sleep()  # nothing staged from before the sleep
+        self.screenshot._start_window_sampling()
+        logger.info("Hibernation ended")
+        self._window.set()
+
+    def _write_slot(self, capture_time):
+        """Staging half of a slot, under the staging lock: pick, write and clear."""
+        screenshot = self.screenshot
+        if not self.anchored and screenshot._slot_outside_window():
+            screenshot._finish_slot()
+            return None
+        if screenshot.scheduler.slot_tick and not self._slot_ticks:
+            # The adaptive interval outgrew the slot, it still gets its grab
+            screenshot._take_screenshot_30_seconds()
+        self._slot_ticks = 0
+        # An idle range the refresh did not cover is still looked up here
+        with screenshot.client.deadline(SLOT_NETWORK_DEADLINE):
+            return screenshot._prepare_slot(capture_time)
+
+    def _send_slot(self, prepared, capture_time):
+        with self.screenshot.client.deadline(SLOT_NETWORK_DEADLINE):
+            self.screenshot._send_slot(*prepared, capture_time)
+
+    async def _finalize(self):
+        screenshot = self.screenshot
+        logger.info("Slot screenshot triggered")
+        capture_time = self.clock.utcnow()
+        try:
+            if screenshot.event_timeline.fetch_on_query:
+                # Events up to now, so the slot's query under the lock is answered locally
+                await self._stage("events", self.io, self._refresh_events)
+            prepared = await self._stage("finalize", self.encode, partial(self._write_slot, capture_time),
+                                         self._staging)
+            if prepared is None:
+                return
+            await self._sleep(screenshot._upload_delay())
+            await self._stage("upload", self.io, partial(self._send_slot, prepared, capture_time))
+        except requests.exceptions.RequestException as req_e:
+            logger.error(f"Slot upload failed: {req_e}")
+        except Exception:
+            logger.exception("Slot finalize failed")
+
+    async def _slots(self):
+        screenshot = self.screenshot
+        while True:
+            now = self.clock.now()
+            if self.anchored:
+                next_run = screenshot._next_anchored_time(now)
+            else:
+                next_run, wake_at, reason = screenshot._plan_next(now)
+                if wake_at is not None:
+                    await self._hibernate(wake_at, reason)
+                    continue
+
+            await self._sleep_until(next_run.timestamp())
+            lateness = self.clock.time() - next_run.timestamp()
+            self.latency.record("slot", lateness)
+
+            if wake_signal.take_long_sleep():
+                logger.info("Resumed after a long sleep, dropping the frames staged before it")
+                await self._stage("release", self.encode, screenshot._release_resources, self._staging)
+                screenshot._start_window_sampling()
+                continue
+            if screenshot.scheduler.late_policy == "skip" and lateness > screenshot.scheduler.slot_grace:
+                self.skipped_slots += 1
+                logger.warning(f"Slot {lateness:.1f}s late, skipping it")
+                continue
+
+            await self._finalize()
+            self._outbox_wake.set()
+            logger.info(f"async engine => {self.stats()}")
+
+    async def _ticker(self):
+        next_tick = None
+        while True:
+            if not self._window.is_set():
+                await self._window.wait()
+                next_tick = None
+            now = self.clock.monotonic()
+            if next_tick is None:
+                next_tick = now
+            if now < next_tick:
+                await self._sleep(next_tick - now)
+                continue
+
+            interval = self.screenshot.scheduler.tick_interval
+            lateness = now - next_tick
+            self.latency.record("tick", lateness)
+            # Missed ticks are not caught up, a late grab of the current screen replaces them
+            missed = int(lateness // interval)
+            self.skipped_ticks += missed
+            await self._stage("capture", self.capture, self._grab, self._staging)
+            next_tick += (missed + 1) * interval
+
+    def _grab(self):
+        # The window may have closed while this grab waited for the staging lock
+        if self._window.is_set():
+            self.screenshot._take_screenshot_30_seconds()
+            self._slot_ticks += 1
+
+    def _refresh_events(self):
+        try:
+            self.screenshot.event_timeline.refresh(self.clock.time())
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.info(f"Event timeline refresh failed: {e}")
+
+    async def _events(self):
+        """Keep the event timeline warm, so a slot's query is mostly answered locally."""
+        while True:
+            await self._window.wait()
+            await self._stage("events", self.io, self._refresh_events)
+            await self._sleep(EVENT_REFRESH)
+
+    async def _outbox(self):
+        """The outbox worker as a task, woken early after every slot; it also refreshes events."""
+        outbox = self.screenshot.outbox
+        while True:
+            await self._stage("outbox", self.io, outbox.work_once)
+            await self._wait(self._outbox_wake, outbox.poll_interval)
+            self._outbox_wake.clear()
+
+    def _install_signal_handlers(self):
+        for name in ("SIGTERM", "SIGBREAK"):
+            signum = getattr(signal, name, None)
+            if signum is None:
+                continue
+            try:
+                self._loop.add_signal_handler(signum, self.stop)
+            except (NotImplementedError, RuntimeError):
+                pass  # no loop signal handlers on Windows, hibernation's SystemExit handler applies
+
+    async def main(self):
+        self._loop = asyncio.get_running_loop()
+        self._window = asyncio.Event()
+        self._window.set()
+        self._staging = asyncio.Lock()
+        self._outbox_wake = asyncio.Event()
+        self._install_signal_handlers()
+
+        screenshot = self.screenshot
+        logger.info(f"Async engine started ({'anchored' if self.anchored else 'windowed'} mode)")
+        screenshot._start_window_sampling()
+        await self._stage("negotiate", self.io, partial(screenshot.negotiate_capabilities, start_outbox=False))
+
+        coroutines = [self._slots(), self._ticker(), self._outbox() if screenshot.outbox else self._events()]
+        if self._virtual:
+            coroutines.append(self._drive_virtual_time())
+        self._tasks = [asyncio.create_task(coroutine) for coroutine in coroutines]
+        try:
+            await asyncio.gather(*self._tasks)
+        except asyncio.CancelledError:
+            logger.info("Async engine cancelled")
+        finally:
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            # Work already running finishes, queued work is dropped
+            for executor in (self.capture, self.encode, self.io):
+                executor.shutdown(wait=True, cancel_futures=True)
+            logger.info(f"async engine stopped => {self.stats()}")
+
+    def stop(self):
+        """Cancel all tasks, safe to call from any thread."""
+        if self._loop is None:
+            return
+
+        def cancel():
+            for task in self._tasks:
+                task.cancel()
+
+        self._loop.call_soon_threadsafe(cancel)
+
+    def run(self):
+        asyncio.run(self.main())
+
+    def stats(self) -> dict:
+        return {
+            "stages": self.latency.stats(),
+            "skipped_ticks": self.skipped_ticks,
+            "skipped_slots": self.skipped_slots,
+        }
@@ -1,3 +1,4 @@
+import io
 import os
 import logging
 from typing import Tuple, Optional
@@ -26,6 +27,8 @@ BLACK_RATIO_THRESHOLD = 0.05  # 5%
 BLACK_PIXEL_THRESHOLD = 10
 BOX_THICKNESS = 4
 BOX_COLOR = (255, 0, 0)  # Red in RGB
+MAX_PNG_BYTES = 1024 * 1024  # larger screenshots get downscaled and quantized
+MAX_PNG_WIDTH = 1280
 
 
 def get_true_window_rect(hwnd: int) -> Optional[Tuple[int, int, int, int]]:
@@ -45,48 +48,133 @@ def get_true_window_rect(hwnd: int) -> Optional[Tuple[int, int, int, int]]:
         logger.info(f"Failed to get window rect via DWM: {e}")
         return None
     
-def capture_screenshots(filename: str, ocr_filename: str):
+def get_window_title(hwnd: int) -> str:
+    length = ctypes.windll.user32.GetWindowTextLengthW(hwnd)
+    buffer = ctypes.create_unicode_buffer(length + 1)
+    ctypes.windll.user32.GetWindowTextW(hwnd, buffer, length + 1)
+    return buffer.value
+
+def grab_desktop() -> Optional[Tuple[np.ndarray, Tuple[int, int, int, int], dict]]:
+    """
+    Grab the whole virtual desktop as an RGB array.
+
+    Returns:
+        (frame, rect, window) where frame is a HxWx3 uint8 array, rect is the
+        foreground window bounds relative to the frame and window holds the
+        foreground "id" and "owner" (title), or None when there is no usable
+        foreground window.
+    """
     hwnd = ctypes.windll.user32.GetForegroundWindow()
     if not hwnd:
         logger.warning("No active window found.")
-        return
+        return None
 
     rect = get_true_window_rect(hwnd)
     if not rect: 
-        return
+        return None
     wx1, wy1, wx2, wy2 = rect
 
     with mss.mss() as sct:
         monitor_all = sct.monitors[0]
         shot = sct.grab(monitor_all)
-        canvas = Image.frombytes("RGB", shot.size, shot.bgra, "raw", "BGRX")
+
+        # BGRA -> RGB without going through PIL
+        bgra = np.frombuffer(shot.bgra, dtype=np.uint8).reshape(shot.height, shot.width, 4)
+        frame = np.ascontiguousarray(bgra[:, :, 2::-1])
 
         # Virtual screen offsets
         vx1, vy1 = monitor_all["left"], monitor_all["top"]
 
-        # Calculate relative crop coordinates
-        cx1, cy1 = wx1 - vx1, wy1 - vy1
-        cx2, cy2 = wx2 - vx1, wy2 - vy1
-
-        # Fix for Windows 11 hidden top border / scaled overlays
-        safe_top = max(cy1, 0) + (BOX_THICKNESS // 2)
-        safe_left = max(cx1, 0) + (BOX_THICKNESS // 2)
-        safe_right = min(cx2, canvas.width) - (BOX_THICKNESS // 2)
-        safe_bottom = min(cy2, canvas.height) - (BOX_THICKNESS // 2)
-
-        # 1. Save CLEAN crop for OCR (Using original coords)
-        active_window_crop = canvas.crop((cx1, cy1, cx2, cy2))
-        active_window_crop.save(ocr_filename)
-
-        # 2. Draw the Box on the context shot using SAFE coordinates
-        draw = ImageDraw.Draw(canvas)
-        draw.rectangle(
-            [safe_left, safe_top, safe_right, safe_bottom],
-            outline=BOX_COLOR,
-            width=BOX_THICKNESS
-        )
-        
-        canvas.save(filename)
+    window = {"id": hwnd, "owner": get_window_title(hwnd)}
+
+    # Calculate relative crop coordinates
+    return frame, (wx1 - vx1, wy1 - vy1, wx2 - vx1, wy2 - vy1), window
+
+def _boxed_canvas(frame: np.ndarray, rect: Tuple[int, int, int, int]) -> Tuple[Image.Image, Image.Image]:
+    """The context shot with the foreground window boxed, and the clean OCR crop."""
+    # fromarray copies RGB data, so drawing never touches the source buffer
+    canvas = Image.fromarray(frame, "RGB")
+    cx1, cy1, cx2, cy2 = rect
+
+    # Fix for Windows 11 hidden top border / scaled overlays
+    safe_top = max(cy1, 0) + (BOX_THICKNESS // 2)
+    safe_left = max(cx1, 0) + (BOX_THICKNESS // 2)
+    safe_right = min(cx2, canvas.width) - (BOX_THICKNESS // 2)
+    safe_bottom = min(cy2, canvas.height) - (BOX_THICKNESS // 2)
+
+    # 1. CLEAN crop for OCR (Using original coords)
+    active_window_crop = canvas.crop((cx1, cy1, cx2, cy2))
+
+    # 2. Draw the Box on the context shot using SAFE coordinates
+    draw = ImageDraw.Draw(canvas)
+    draw.rectangle(
+        [safe_left, safe_top, safe_right, safe_bottom],
+        outline=BOX_COLOR,
+        width=BOX_THICKNESS
+    )
+    return canvas, active_window_crop
+
+
+def render_screenshots(frame: np.ndarray, rect: Tuple[int, int, int, int],
+                       filename: str, ocr_filename: str):
+    """Save the boxed context shot and the clean OCR crop of a grabbed frame."""
+    canvas, active_window_crop = _boxed_canvas(frame, rect)
+    active_window_crop.save(ocr_filename)
+    canvas.save(filename)
+
+
+def crop_black_image(img: Image.Image, threshold: int = BLACK_PIXEL_THRESHOLD) -> Image.Image:
+    """crop_black_background for an image already in memory."""
+    gray = cv2.cvtColor(np.asarray(img.convert("RGB")), cv2.COLOR_RGB2GRAY)
+    if np.sum(gray <= threshold) / gray.size <= BLACK_RATIO_THRESHOLD:
+        return img
+
+    coords = np.argwhere(gray > threshold)
+    if not len(coords):
+        return img
+    y_min, x_min = coords.min(axis=0)
+    y_max, x_max = coords.max(axis=0)
+    return img.crop((x_min, y_min, x_max + 1, y_max + 1))
+
+
+def png_bytes(img: Image.Image, max_bytes: Optional[int] = MAX_PNG_BYTES) -> bytes:
+    """Encode to PNG in memory, shrinking like aggressive_compress_png when too large."""
+    buffer = io.BytesIO()
+    img.save(buffer, "PNG")
+    if max_bytes is None or buffer.tell() <= max_bytes:
+        return buffer.getvalue()
+
+    img = img.convert("RGB")
+    if img.width > MAX_PNG_WIDTH:
+        img = img.resize((MAX_PNG_WIDTH, int(img.height * MAX_PNG_WIDTH / img.width)), Image.Resampling.LANCZOS)
+    img = img.convert("P", palette=Image.ADAPTIVE, colors=256)
+    buffer = io.BytesIO()
+    img.save(buffer, "PNG", optimize=True)
+    return buffer.getvalue()
+
+
+def shrink_png(data: bytes, max_bytes: int = MAX_PNG_BYTES) -> bytes:
+    """Size cap for PNG bytes already encoded, recompressed in memory only when over max_bytes."""
+    if len(data) <= max_bytes:
+        return data
+    with Image.open(io.BytesIO(data)) as img:
+        return png_bytes(img.convert("RGB"), max_bytes)
+
+
+def encode_screenshots(frame: np.ndarray, rect: Tuple[int, int, int, int]) -> Tuple[bytes, bytes]:
+    """
+    In-memory counterpart of render_screenshots followed by the final's
+    black crop and compression. Returns (screenshot png, ocr png).
+    """
+    canvas, active_window_crop = _boxed_canvas(frame, rect)
+    return png_bytes(crop_black_image(canvas)), png_bytes(active_window_crop, max_bytes=None)
+
+def capture_screenshots(filename: str, ocr_filename: str):
+    grabbed = grab_desktop()
+    if grabbed is None:
+        return
+    frame, rect, _ = grabbed
+    render_screenshots(frame, rect, filename, ocr_filename)
    
 def crop_black_background(image_path: str, 
                           output_path: Optional[str] = None, 
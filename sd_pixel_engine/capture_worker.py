@@ -0,0 +1,277 @@
+import sys
+import logging
+import threading
+import multiprocessing
+from collections import Counter
+from multiprocessing import shared_memory
+from typing import Optional
+
+import numpy as np
+
+from sd_pixel_engine.staging import LocalCodec
+from sd_pixel_engine.frame_feed import _attach
+
+try:
+    import psutil
+except ImportError:  # optional, the worker then reports no memory use
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+CALL_TIMEOUT = 30  # seconds one grab or encode may take before the worker counts as hung
+MAX_WORKER_RSS = 1024 * 2 ** 20  # bytes of worker memory before it is recycled
+MAX_GDI_HANDLES = 2000  # GDI objects of the worker before it is recycled (Windows)
+MAX_WORKER_TASKS = 0  # calls before the worker is recycled anyway (0 = never)
+GRAB_SLOT, ENCODE_SLOT = 0, 1  # the two frame slots of the shared segment
+
+
+def _health() -> dict:
+    """Memory and GDI handles of the current process, whichever is measurable."""
+    health = {}
+    if psutil is not None:
+        health["rss"] = psutil.Process().memory_info().rss
+    if sys.platform == "win32":
+        import ctypes
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        health["gdi"] = ctypes.windll.user32.GetGuiResources(process, 0)
+    return health
+
+
+def _frame_view(segment, slot: int, slot_bytes: int, shape) -> np.ndarray:
+    return np.ndarray(shape, dtype=np.uint8, buffer=segment.buf, offset=slot * slot_bytes)
+
+
+def _run_command(command, grab, segment, slot_bytes, args, held: dict):
+    if command in ("grab", "resend"):
+        # resend: the grab that did not fit, now that the segment is larger
+        grabbed = held.pop("grab", None) if command == "resend" else grab()
+        held.clear()
+        if grabbed is None:
+            return None
+        frame, rect, window = grabbed
+        if segment is None or frame.nbytes > slot_bytes:
+            # Coordinator allocates a larger segment and asks for this frame again
+            held["grab"] = grabbed
+            return ("resize", frame.nbytes)
+        _frame_view(segment, GRAB_SLOT, slot_bytes, frame.shape)[:] = frame
+        return ("frame", frame.shape, rect, window)
+    if command == "render":
+        shape, rect, path, ocr_path = args
+        LocalCodec.render(_frame_view(segment, ENCODE_SLOT, slot_bytes, shape), rect, path, ocr_path)
+    elif command == "encode":
+        shape, rect = args
+        return LocalCodec.encode(_frame_view(segment, ENCODE_SLOT, slot_bytes, shape), rect)
+    elif command == "crop":
+        LocalCodec.crop(args[0])
+    return None
+
+
+def _worker_main(conn, source):
+    """
+    Worker process loop. Commands come in as tuples, pixels only ever travel
+    through the shared segment the coordinator names in each command.
+    """
+    from sd_pixel_engine.capture_window import grab_desktop
+    grab = source or grab_desktop
+    segment = None
+    held = {}
+
+    while True:
+        try:
+            command, name, slot_bytes, *args = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if command == "stop":
+            break
+        if name is not None and (segment is None or segment.name != name):
+            if segment is not None:
+                segment.close()
+            # The coordinator owns and unlinks it, spawned children share its resource tracker
+            segment = _attach(name, shared_tracker=True)
+
+        try:
+            result = _run_command(command, grab, segment, slot_bytes, args, held)
+        except Exception as e:
+            # Python level failures are answered, only native crashes kill the worker
+            result = ("error", f"{type(e).__name__}: {e}")
+        conn.send((result, _health()))
+
+    if segment is not None:
+        segment.close()
+
+
+class WorkerUnavailable(RuntimeError):
+    """The worker crashed or hung during a call, it is being restarted."""
+
+
+class CaptureWorker:
+    """
+    Desktop grabs and PNG encoding in a supervised child process.
+
+    Native capture code (mss, GDI, PrintWindow) and PIL/cv2 encoding run
+    there, off the engine's GIL; a crash or a handle leak costs one grab
+    instead of the engine. Frames cross in a shared memory segment owned
+    by the coordinator, two frame-sized slots: the worker writes grabs into
+    one, the coordinator copies encode input into the other. Only shapes,
+    rects and encoded PNG bytes are pickled.
+
+    Use it as a capture source (it returns (frame, rect, window) like
+    grab_desktop) and as a staging codec (render, encode, crop like
+    staging.LocalCodec). The worker starts on first use and is restarted
+    when it dies, hangs past call_timeout or reports more than max_rss
+    bytes or max_gdi GDI handles; max_tasks recycles it unconditionally.
+    A failed grab returns None, a failed encode falls back to LocalCodec.
+
+    source replaces grab_desktop inside the worker, it must be picklable.
+    """
+
+    def __init__(self, source=None, call_timeout=CALL_TIMEOUT, max_rss=MAX_WORKER_RSS,
+                 max_gdi=MAX_GDI_HANDLES, max_tasks=MAX_WORKER_TASKS):
+        self.source = source
+        self.call_timeout = call_timeout
+        self.max_rss = max_rss
+        self.max_gdi = max_gdi
+        self.max_tasks = max_tasks
+        self._context = multiprocessing.get_context("spawn")
+        self._lock = threading.RLock()
+        self._process = None
+        self._conn = None
+        self._segment: Optional[shared_memory.SharedMemory] = None
+        self._slot_bytes = 0
+        self._tasks = 0
+        self.health = {}
+        self.restarts = Counter()
+        self.calls = Counter()
+
+    def _start(self):
+        parent, child = self._context.Pipe()
+        self._process = self._context.Process(target=_worker_main, args=(child, self.source),
+                                              name="sd-capture-worker", daemon=True)
+        self._process.start()
+        child.close()
+        self._conn = parent
+        self._tasks = 0
+        logger.info(f"Capture worker started => pid {self._process.pid}")
+
+    def _kill(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        if self._process is not None:
+            self._process.kill()
+            self._process.join(5)
+            self._process = None
+
+    def _restart(self, reason: str, detail: str = ""):
+        logger.warning(f"Capture worker restart => {reason} {detail}".rstrip())
+        self.restarts[reason] += 1
+        self._kill()
+
+    def _allocate(self, frame_bytes: int):
+        if self._segment is not None:
+            logger.warning("Display topology changed, reallocating the capture worker's frame slots")
+            self._release_segment()
+        self._slot_bytes = frame_bytes
+        self._segment = shared_memory.SharedMemory(create=True, size=2 * frame_bytes)
+
+    def _release_segment(self):
+        if self._segment is not None:
+            self._segment.close()
+            self._segment.unlink()
+            self._segment = None
+            self._slot_bytes = 0
+
+    def _check_health(self):
+        self._tasks += 1
+        if self.health.get("rss", 0) > self.max_rss:
+            self._restart("memory", f"{self.health['rss'] // 2 ** 20} MiB")
+        elif self.health.get("gdi", 0) > self.max_gdi:
+            self._restart("gdi handles", str(self.health["gdi"]))
+        elif self.max_tasks and self._tasks >= self.max_tasks:
+            self._restart("task limit")
+
+    def _call(self, command: str, *args):
+        """One round trip to the worker, restarting it when it is gone or hung."""
+        if self._process is None or not self._process.is_alive():
+            if self._process is not None:
+                self._restart("exited", f"with code {self._process.exitcode}")
+            self._start()
+        name = self._segment.name if self._segment is not None else None
+        try:
+            self._conn.send((command, name, self._slot_bytes) + args)
+            if not self._conn.poll(self.call_timeout):
+                self._restart("hung", f"{command} took over {self.call_timeout}s")
+                raise WorkerUnavailable(command)
+            result, self.health = self._conn.recv()
+        except (EOFError, OSError) as e:
+            self._restart("crashed", f"during {command} ({type(e).__name__})")
+            raise WorkerUnavailable(command)
+        self.calls[command] += 1
+        self._check_health()
+        if isinstance(result, tuple) and result[0] == "error":
+            raise RuntimeError(f"Capture worker {command} failed: {result[1]}")
+        return result
+
+    def __call__(self):
+        with self._lock:
+            try:
+                result = self._call("grab")
+                if result is not None and result[0] == "resize":
+                    # The worker holds the frame that did not fit, it costs no second grab
+                    self._allocate(result[1])
+                    result = self._call("resend")
+                    if result is None:
+                        result = self._call("grab")  # recycled in between, the held frame is gone
+            except WorkerUnavailable:
+                return None
+            if result is None or result[0] != "frame":
+                return None
+            _, shape, rect, window = result
+            # Copy out, the slot is overwritten by the next grab
+            return _frame_view(self._segment, GRAB_SLOT, self._slot_bytes, shape).copy(), rect, window
+
+    def _encode_call(self, command: str, frame: np.ndarray, *args):
+        with self._lock:
+            if self._segment is None or frame.nbytes > self._slot_bytes:
+                self._allocate(frame.nbytes)
+            _frame_view(self._segment, ENCODE_SLOT, self._slot_bytes, frame.shape)[:] = frame
+            return self._call(command, frame.shape, *args)
+
+    def render(self, frame: np.ndarray, rect, filename: str, ocr_filename: str):
+        try:
+            self._encode_call("render", frame, rect, filename, ocr_filename)
+        except WorkerUnavailable:
+            LocalCodec.render(frame, rect, filename, ocr_filename)
+
+    def encode(self, frame: np.ndarray, rect):
+        try:
+            return self._encode_call("encode", frame, rect)
+        except WorkerUnavailable:
+            return LocalCodec.encode(frame, rect)
+
+    def crop(self, path: str):
+        with self._lock:
+            try:
+                self._call("crop", path)
+            except WorkerUnavailable:
+                LocalCodec.crop(path)
+
+    def stop(self):
+        """Stop the worker and free the shared segment; the next call starts a new one."""
+        with self._lock:
+            if self._process is not None and self._process.is_alive():
+                try:
+                    self._conn.send(("stop", None, 0))
+                    self._process.join(5)
+                except OSError:
+                    pass
+            self._kill()
+            self._release_segment()
+
+    def stats(self) -> dict:
+        return {
+            "pid": self._process.pid if self._process is not None else None,
+            "calls": dict(self.calls),
+            "restarts": dict(self.restarts),
+            "health": self.health,
+        }
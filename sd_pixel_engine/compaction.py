@@ -0,0 +1,216 @@
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from sd_pixel_engine.const import SCREENSHOT_FOLDER, SCREENSHOT_SHARDED_FOLDER
+from sd_pixel_engine.layout import parse_final_name
+
+logger = logging.getLogger(__name__)
+
+COMPACTION_CHECKPOINT = os.path.join(SCREENSHOT_FOLDER, ".compaction.json")
+COMPACTION_MAX_WIDTH = 960
+COMPACTION_COLORS = 64
+COMPACTION_BATCH = 64
+COMPACTION_PERIOD = 24 * 3600  # seconds between background runs
+COMPACTION_RETRIES = 3  # runs a failing file is retried in before it is left as is
+
+IDLE_PRIORITY_CLASS = 0x00000040
+
+CompactionReport = namedtuple("CompactionReport", ["files", "reclaimed_bytes", "cpu_seconds", "wall_seconds"])
+
+
+def set_idle_priority():
+    """Process pool initializer, keep compaction out of the user's way."""
+    try:
+        if sys.platform == "win32":
+            import ctypes
+            handle = ctypes.windll.kernel32.GetCurrentProcess()
+            ctypes.windll.kernel32.SetPriorityClass(handle, IDLE_PRIORITY_CLASS)
+        else:
+            os.nice(19)
+    except Exception as e:
+        logger.info(f"Failed to lower compaction priority: {e}")
+
+
+def reencode_screenshot(path: str, max_width=COMPACTION_MAX_WIDTH,
+                        colors=COMPACTION_COLORS) -> Tuple[str, int, int, float]:
+    """
+    Downscale and palette-quantize one final in place.
+
+    Returns (path, size before, size after, cpu seconds). The original is
+    kept when the cheaper profile does not actually save space.
+    """
+    cpu_start = time.process_time()
+    old_size = os.path.getsize(path)
+    tmp_path = path + ".compact"
+
+    with Image.open(path) as img:
+        if img.mode == "P":
+            # Already palette based, nothing cheaper to do
+            return path, old_size, old_size, time.process_time() - cpu_start
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+
+        width, height = img.size
+        if width > max_width:
+            img = img.resize((max_width, int(height * max_width / width)), Image.Resampling.LANCZOS)
+        img = img.convert("P", palette=Image.ADAPTIVE, colors=colors)
+        img.save(tmp_path, "PNG", optimize=True)
+
+    new_size = os.path.getsize(tmp_path)
+    if new_size < old_size:
+        os.replace(tmp_path, path)
+    else:
+        os.remove(tmp_path)
+        new_size = old_size
+    return path, old_size, new_size, time.process_time() - cpu_start
+
+
+def find_aging_screenshots(cutoff: datetime, after: Optional[float] = None,
+                           include_ocr=False) -> List[Tuple[float, str]]:
+    """
+    Finals in the flat and sharded layouts captured before cutoff.
+
+    Returns (capture timestamp, path) pairs oldest first, skipping everything
+    at or before the checkpoint timestamp `after`.
+    """
+    found = []
+    folders = [(SCREENSHOT_FOLDER, False), (SCREENSHOT_SHARDED_FOLDER, True)]
+    for folder, recursive in folders:
+        if not os.path.isdir(folder):
+            continue
+        if recursive:
+            walker = ((root, files) for root, _, files in os.walk(folder))
+        else:
+            walker = [(folder, os.listdir(folder))]
+
+        for root, files in walker:
+            for name in files:
+                if name.endswith("_ocr.png") and not include_ocr:
+                    continue
+                parsed = parse_final_name(name)
+                if not parsed:
+                    continue
+                captured_at = parsed[1]
+                timestamp = captured_at.timestamp()
+                if captured_at >= cutoff or (after is not None and timestamp <= after):
+                    continue
+                found.append((timestamp, os.path.join(root, name)))
+    found.sort()
+    return found
+
+
+def _load_checkpoint(checkpoint_path) -> Tuple[Optional[float], Dict[str, int]]:
+    """(newest capture time compacted, failed path -> attempts) of the last run."""
+    try:
+        with open(checkpoint_path) as f:
+            checkpoint = json.load(f)
+        return checkpoint.get("compacted_until"), checkpoint.get("failed", {})
+    except (OSError, ValueError):
+        return None, {}
+
+
+def _save_checkpoint(checkpoint_path, compacted_until: Optional[float], failed: Dict[str, int]):
+    tmp_path = checkpoint_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"compacted_until": compacted_until, "failed": failed}, f)
+    os.replace(tmp_path, checkpoint_path)
+
+
+def _retry_candidates(failed: Dict[str, int]) -> List[Tuple[float, str]]:
+    retries = []
+    for path in list(failed):
+        parsed = parse_final_name(path)
+        if parsed is None or not os.path.isfile(path):
+            del failed[path]  # removed in the meantime, nothing left to retry
+            continue
+        retries.append((parsed[1].timestamp(), path))
+    return retries
+
+
+def compact_screenshots(max_age_days: float, active_slot_seconds: float = 0,
+                        workers: Optional[int] = None,
+                        checkpoint_path=COMPACTION_CHECKPOINT,
+                        include_ocr=False) -> CompactionReport:
+    """
+    Re-encode finals older than max_age_days with the cheap profile.
+
+    Files are processed oldest first in batches on an idle-priority process
+    pool. After every batch the newest finished capture time is written to
+    the checkpoint, so an interrupted run resumes where it stopped. Files
+    that failed are recorded there too and retried by the next runs, up to
+    COMPACTION_RETRIES times. Nothing inside the active slot (the last
+    active_slot_seconds) is ever touched.
+    """
+    wall_start = time.monotonic()
+    now = datetime.now(timezone.utc)
+    cutoff = min(now - timedelta(days=max_age_days), now - timedelta(seconds=active_slot_seconds))
+
+    compacted_until, failed = _load_checkpoint(checkpoint_path)
+    candidates = sorted(_retry_candidates(failed) + find_aging_screenshots(cutoff, compacted_until, include_ocr))
+    if not candidates:
+        return CompactionReport(0, 0, 0.0, time.monotonic() - wall_start)
+
+    files = 0
+    reclaimed = 0
+    cpu_seconds = 0.0
+    workers = workers or max(1, (os.cpu_count() or 2) // 2)
+    with ProcessPoolExecutor(max_workers=workers, initializer=set_idle_priority) as pool:
+        for start in range(0, len(candidates), COMPACTION_BATCH):
+            batch = candidates[start:start + COMPACTION_BATCH]
+            futures = [(path, pool.submit(reencode_screenshot, path)) for _, path in batch]
+            for path, future in futures:
+                try:
+                    _, old_size, new_size, cpu = future.result()
+                except Exception as e:
+                    attempts = failed.get(path, 0) + 1
+                    if attempts < COMPACTION_RETRIES:
+                        failed[path] = attempts
+                        logger.warning(f"Compaction failed for {path}, retrying next run: {e}")
+                    else:
+                        failed.pop(path, None)
+                        logger.warning(f"Compaction failed for {path} {attempts} times, leaving it as is: {e}")
+                    continue
+                failed.pop(path, None)
+                files += 1
+                reclaimed += old_size - new_size
+                cpu_seconds += cpu
+            # Retried files are older than the checkpoint, it never moves back
+            compacted_until = max(compacted_until or batch[-1][0], batch[-1][0])
+            _save_checkpoint(checkpoint_path, compacted_until, failed)
+
+    return CompactionReport(files, reclaimed, cpu_seconds, time.monotonic() - wall_start)
+
+
+def _compaction_loop(max_age_days, active_slot_seconds):
+    while True:
+        try:
+            report = compact_screenshots(max_age_days, active_slot_seconds)
+            logger.info(
+                f"Compaction run => {report.files} files, "
+                f"{report.reclaimed_bytes / (1024 * 1024):.2f} MB reclaimed, "
+                f"{report.cpu_seconds:.1f}s CPU, {report.wall_seconds:.1f}s wall"
+            )
+        except Exception:
+            logger.exception("Compaction run failed")
+        time.sleep(COMPACTION_PERIOD)
+
+
+def start_compaction(max_age_days, active_slot_seconds):
+    """Start the daily background compaction job."""
+    compaction_thread = threading.Thread(
+        target=_compaction_loop,
+        args=(max_age_days, active_slot_seconds),
+        daemon=True
+    )
+    compaction_thread.start()
+    return compaction_thread
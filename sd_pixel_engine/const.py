@@ -2,6 +2,15 @@ import os
 
 SCREENSHOT_FOLDER_USER = os.path.join(os.environ['LOCALAPPDATA'], "Sundial", "Sundial", "Screenshots", '{user_id}')
 SCREENSHOT_FOLDER = os.path.join(os.environ['LOCALAPPDATA'], "Sundial", "Sundial", "Screenshots")
+# Sharded finals, <user_id>/<yyyy>/<mm>/<dd>/ (kept apart from the per-user staging folder)
+SCREENSHOT_SHARDED_FOLDER = os.path.join(SCREENSHOT_FOLDER, "archive")
+# Daily pack files, <user_id>/<yyyy-mm-dd>.pack
+SCREENSHOT_PACK_FOLDER = os.path.join(SCREENSHOT_FOLDER, "packs")
+# Pending uploads, survives restarts (the per-user folder is wiped at startup)
+OUTBOX_FILE = os.path.join(SCREENSHOT_FOLDER, "outbox_{user_id}.db")
 
 INTERVAL = 30  # seconds
+SLOT_NETWORK_DEADLINE = 20  # seconds of network work allowed per slot
+
+RING_FILE_NAME = "frames.ring"
 
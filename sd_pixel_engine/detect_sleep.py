@@ -7,7 +7,7 @@ from datetime import datetime
 import win32gui
 import win32con
 
-from sd_pixel_engine.utils import stop_process_by_exe
+from sd_pixel_engine.hibernation import wake_signal
 
 # Global variable to store time just before sleep
 sleep_lock = threading.Lock()
@@ -42,10 +42,8 @@ def is_long_sleep() -> bool:
 def on_long_sleep_detected():    
     slept_hours = (datetime.now() - last_sleep_time).total_seconds() / 3600
     logger.info(f"Long sleep detected! ({slept_hours:.1f} hours)")
-    try:
-        stop_process_by_exe("sd-pixel-engine.exe")
-    except Exception as e:
-        logger.error(f"Failed to stop process: {e}")
+    # The engine drops what it staged before the sleep, no process restart
+    wake_signal.resumed(long_sleep=True)
 
 
 def wnd_proc(hwnd, msg, wparam, lparam):
@@ -61,11 +59,14 @@ def wnd_proc(hwnd, msg, wparam, lparam):
 
         elif wparam == win32con.PBT_APMRESUMEAUTOMATIC:
             logger.info(f"Automatic resume => {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+            wake_signal.resumed()
 
         elif wparam == win32con.PBT_APMRESUMESUSPEND:
             logger.info(f"Resume + user present => {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
             if is_long_sleep():
                 on_long_sleep_detected()
+            else:
+                wake_signal.resumed()
 
     return 0
 
@@ -0,0 +1,320 @@
+import time
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sd_pixel_engine.const import INTERVAL
+from sd_pixel_engine.scheduler import DriftFreeScheduler
+from sd_pixel_engine.hibernation import wake_signal
+from sd_pixel_engine.schedule import SystemClock, VirtualClock
+from sd_pixel_engine.utils import parse_time, parse_days
+
+logger = logging.getLogger(__name__)
+
+
+class CaptureStream:
+    """
+    One desktop grab per engine tick, handed to every profile, so N
+    profiles cost one grab and stage the same frame object.
+    """
+
+    def __init__(self, grab=None):
+        if grab is None:
+            from sd_pixel_engine.capture_window import grab_desktop
+            grab = grab_desktop
+        self.grab = grab
+        self.grabs = 0
+
+    def tick(self):
+        self.grabs += 1
+        return self.grab()
+
+
+class ProfileSource:
+    """Capture source of one profile: the stream grab its worker is staging right now."""
+
+    def __init__(self):
+        self.latest = None
+
+    def __call__(self):
+        return self.latest
+
+
+class Profile:
+    """
+    One schedule of the engine: its ScreenShot, when its next slot fires,
+    and the worker thread its grabs and slots run on, in order. A slow
+    finalize or upload jitter only holds up this profile; while it is busy
+    at most one more grab is queued for it, later ticks skip it.
+
+    With threaded=False jobs run inline on the caller, which simulations
+    on a VirtualClock need: time there only moves when the loop sleeps.
+    """
+
+    def __init__(self, screenshot, anchored: bool, source: Optional[ProfileSource] = None, threaded=True):
+        self.screenshot = screenshot
+        self.anchored = anchored
+        self.source = source
+        self.next_slot: Optional[datetime] = None
+        self.skipped_ticks = 0
+        self._worker = None
+        if threaded:
+            self._worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"profile-{screenshot.user_id}")
+        self._tick_queued = threading.Event()
+
+    def _run(self, job, *args):
+        try:
+            job(*args)
+        except Exception:
+            logger.exception(f"Profile {self.screenshot.user_id} job failed")
+
+    def _stage(self, grabbed):
+        self._tick_queued.clear()
+        self.source.latest = grabbed
+        try:
+            self.screenshot._take_screenshot_30_seconds()
+        finally:
+            # Staging holds its own references, the source keeps none between ticks
+            self.source.latest = None
+
+    def tick(self, grabbed):
+        if self._tick_queued.is_set():
+            self.skipped_ticks += 1
+            return
+        self._tick_queued.set()
+        self.submit(self._stage, grabbed)
+
+    def submit(self, job, *args):
+        if self._worker is None:
+            self._run(job, *args)
+        else:
+            self._worker.submit(self._run, job, *args)
+
+    def drain(self):
+        """Wait for everything queued on the worker."""
+        if self._worker is not None:
+            self._worker.submit(lambda: None).result()
+
+    def close(self):
+        if self._worker is not None:
+            self._worker.shutdown(wait=True)
+
+    def schedule_next(self, now: datetime):
+        if self.anchored:
+            self.next_slot = self.screenshot._next_anchored_time(now)
+        else:
+            self.next_slot = self.screenshot._next_run_datetime(now)
+
+    def active(self, now: datetime) -> bool:
+        if self.anchored:
+            return True
+        if self.next_slot is not None and self.next_slot - now <= timedelta(seconds=INTERVAL):
+            return True  # one grab before the window opens, so its first slot has a frame
+        return self.screenshot._in_schedule(now - timedelta(seconds=self.screenshot.phase_offset))
+
+
+def _profile_kwargs(config: dict, defaults: dict) -> dict:
+    kwargs = dict(defaults, **config)
+    for key in ("start_time", "end_time"):
+        if isinstance(kwargs.get(key), str):
+            kwargs[key] = parse_time(kwargs[key])
+    if isinstance(kwargs.get("days"), str):
+        kwargs["days"] = parse_days(kwargs["days"])
+    return kwargs
+
+
+class MultiProfileEngine:
+    """
+    Run several schedule profiles (user ids, server targets, windows) over
+    one capture stream.
+
+    Every profile keeps its own slot times, selection and upload target but
+    stages into a "shared" FramePool by reference, so grabs and staged
+    memory grow with the number of distinct frames, not with the number of
+    profiles. The engine ticks on one fixed 30 second grid and only grabs
+    while some profile is in its window; per-profile capture triggers and
+    adaptive rates do not apply here, nor do capture workers. Staging and
+    slots run on per-profile workers (Profile), the tick loop only grabs
+    and hands out. When no profile has a slot until later (all windowed and
+    outside their windows) the engine hibernates like a single ScreenShot.
+    """
+
+    def __init__(self, profiles: List[Profile], stream: CaptureStream, pool, late_policy="catch-up", clock=None):
+        self.profiles = profiles
+        self.stream = stream
+        self.pool = pool
+        self.clock = clock or SystemClock()
+        self.scheduler = DriftFreeScheduler(INTERVAL, late_policy, clock=self.clock.monotonic,
+                                            wall_clock=self.clock.time, sleep=self.clock.sleep)
+
+    @classmethod
+    def from_configs(cls, configs: List[dict], defaults: Optional[dict] = None, grab=None,
+                     late_policy="catch-up", clock=None) -> "MultiProfileEngine":
+        """
+        configs: one dict of ScreenShot keyword arguments per profile, with
+        times as "HH:MM", days as "0,1,2" and tracking_interval (0 = anchored
+        mode); missing keys come from defaults. Profiles must have distinct
+        user ids, they key the outbox, the staging folder and the frame feed.
+        """
+        from sd_pixel_engine.screenshot import ScreenShot
+        from sd_pixel_engine.staging import FramePool
+
+        profile_kwargs = [_profile_kwargs(config, defaults or {}) for config in configs]
+        user_ids = [kwargs.get("user_id") for kwargs in profile_kwargs]
+        repeated = sorted({str(user_id) for user_id in user_ids if user_ids.count(user_id) > 1})
+        if repeated:
+            raise ValueError(f"Profiles need distinct user ids, repeated: {', '.join(repeated)}")
+
+        pool = FramePool()
+        stream = CaptureStream(grab)
+        profiles = []
+        for kwargs in profile_kwargs:
+            anchored = kwargs.pop("tracking_interval", 0) == 0
+            source = ProfileSource()
+            kwargs.update(staging="shared", capture_source=source, frame_pool=pool,
+                          capture_triggers=False, adaptive_rate=False, clock=clock, capture_worker=False)
+            profiles.append(Profile(ScreenShot(**kwargs), anchored, source,
+                                    threaded=not isinstance(clock, VirtualClock)))
+        return cls(profiles, stream, pool, late_policy, clock)
+
+    def _tick(self):
+        now = self.clock.now()
+        active = [profile for profile in self.profiles if profile.active(now)]
+        if not active:
+            return
+        grabbed = self.stream.tick()
+        for profile in active:
+            profile.tick(grabbed)
+
+    def drain(self):
+        for profile in self.profiles:
+            profile.drain()
+
+    def _plan_wake(self, now: datetime) -> Optional[datetime]:
+        """When to wake if every profile is outside its schedule, else None."""
+        if any(profile.anchored for profile in self.profiles):
+            return None
+        wakes = []
+        for profile in self.profiles:
+            _, wake_at, _ = profile.screenshot._plan_next(now)
+            if wake_at is None:
+                return None
+            wakes.append(wake_at)
+        return min(wakes)
+
+    def hibernate(self, until: datetime):
+        logger.info(f"Engine hibernating until {until}, no profile is in its schedule")
+        self.drain()
+        for profile in self.profiles:
+            profile.screenshot._release_resources()
+        self.scheduler.reset()
+        woken = wake_signal.sleep_until(until.timestamp(), self.clock)
+        logger.info(f"Engine hibernation ended => {'resume' if woken else 'scheduled'}")
+        wake_signal.take_long_sleep()  # nothing staged from before the sleep
+        now = self.clock.now()
+        for profile in self.profiles:
+            profile.screenshot._start_window_sampling()
+            profile.schedule_next(now)
+
+    def _fire(self, profile: Profile):
+        screenshot = profile.screenshot
+        if profile.anchored:
+            screenshot._anchored_job()
+        else:
+            # Drops the staged frames of a slot outside the window itself
+            screenshot._scheduled_job()
+
+    def run(self):
+        logger.info(f"Engine started with {len(self.profiles)} profiles")
+        now = self.clock.now()
+        for profile in self.profiles:
+            profile.screenshot._start_window_sampling()
+            profile.screenshot.negotiate_capabilities()
+            profile.schedule_next(now)
+
+        while True:
+            wake_at = self._plan_wake(self.clock.now())
+            if wake_at is not None and wake_at > self.clock.now():
+                self.hibernate(wake_at)
+                continue
+
+            target = min(profile.next_slot for profile in self.profiles)
+            lateness = self.scheduler.wait_until(target.timestamp(), self._tick)
+            logger.info(f"engine => {self.stats()}")
+
+            if wake_signal.take_long_sleep():
+                logger.info("Resumed after a long sleep, dropping the frames staged before it")
+                self.drain()
+                for profile in self.profiles:
+                    profile.screenshot._release_resources()
+                    profile.screenshot._start_window_sampling()
+                lateness = None
+
+            now = self.clock.now()
+            for profile in self.profiles:
+                if profile.next_slot <= now:
+                    if lateness is not None:
+                        profile.submit(self._fire, profile)
+                    profile.schedule_next(self.clock.now())
+
+    def shutdown(self):
+        for profile in self.profiles:
+            profile.close()
+            profile.screenshot.shutdown()
+
+    def stats(self) -> dict:
+        return {
+            "profiles": len(self.profiles),
+            "grabs": self.stream.grabs,
+            "skipped_ticks": {profile.screenshot.user_id: profile.skipped_ticks for profile in self.profiles},
+            "pooled_frames": len(self.pool),
+            "pooled_mib": round(self.pool.nbytes() / 2 ** 20, 1),
+            "scheduler": self.scheduler.stats(),
+        }
+
+
+def benchmark(profile_counts: List[int], ticks: int, size=(720, 1280)):
+    """CPU and staged memory of N profiles on one stream vs N independent instances."""
+    from sd_pixel_engine.screenshot import ScreenShot
+    from sd_pixel_engine.loadgen import FakeCaptureSource
+
+    for count in profile_counts:
+        configs = [{"user_id": f"profile{i}", "times_per_hour": 3} for i in range(count)]
+        engine = MultiProfileEngine.from_configs(configs, {"server_url": None}, grab=FakeCaptureSource(1, size=size))
+        began = time.process_time()
+        for _ in range(ticks):
+            engine._tick()
+            engine.drain()
+        shared_cpu = time.process_time() - began
+        shared_mib = engine.pool.nbytes() / 2 ** 20
+
+        separate = [
+            ScreenShot(None, f"profile{i}", times_per_hour=3, staging="shared",
+                       capture_source=FakeCaptureSource(1, size=size))
+            for i in range(count)
+        ]
+        began = time.process_time()
+        for _ in range(ticks):
+            for screenshot in separate:
+                screenshot._take_screenshot_30_seconds()
+        separate_cpu = time.process_time() - began
+        separate_mib = sum(s.staging.pool.nbytes() for s in separate) / 2 ** 20
+
+        print(f"{count:3} profiles  shared {shared_cpu / ticks * 1000:7.1f} ms/tick {shared_mib:7.1f} MiB"
+              f"   separate {separate_cpu / ticks * 1000:7.1f} ms/tick {separate_mib:7.1f} MiB")
+        for profile in engine.profiles:
+            profile.close()
+            profile.screenshot.staging.close()
+        for screenshot in separate:
+            screenshot.staging.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark profiles sharing one capture stream")
+    parser.add_argument("--profiles", default="1,2,4,8", help="Comma-separated profile counts")
+    parser.add_argument("--ticks", type=int, default=20)
+    args = parser.parse_args()
+    benchmark([int(n) for n in args.profiles.split(",")], args.ticks)
@@ -0,0 +1,234 @@
+import json
+import time
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+import numpy as np
+import requests
+
+from sd_pixel_engine.wire import (EVENT_RECORD, OPAQUE_EVENT_RECORD, accept_header, as_event_id, decode_events,
+                                  events_from_rows, events_to_rows)
+
+logger = logging.getLogger(__name__)
+
+EVENT_RETENTION = 6 * 3600  # seconds of event history kept locally
+
+
+def utc_to_epoch(value: str) -> float:
+    """
+    Parse the UTC strings used by the event API into a POSIX timestamp.
+
+    Accepts both event timestamps ('2026-01-14 06:49:15.373000+00:00') and
+    range bounds ('2026-01-14 06:49:15.373000', implicitly UTC).
+    """
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def epoch_to_utc(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+class EventTimeline:
+    """
+    Local, time-bounded copy of the server's event timeline.
+
+    Events are kept as typed rows (wire.EVENT_RECORD) sorted by start time,
+    or wire.OPAQUE_EVENT_RECORD once the server sent ids that are not integers.
+    A query only asks the server for events from the cursor on, where the
+    cursor is the start of the newest known event (it may still be running,
+    so its duration is refreshed), and merges the answer by event id.
+    Queries that end before what has already been fetched are answered
+    locally.
+
+    With fetch_on_query=False queries never touch the network and only see
+    what a background refresh() has already pulled in.
+
+    The idle event id the server reports belongs to the range it was asked
+    for, so it is kept per fetched range. A query without events (an idle
+    slot) gets the id of exactly its own range, fetching it when needed,
+    the same answer a per-slot request would get.
+    """
+
+    def __init__(self, server_url, retention=EVENT_RETENTION, post=requests.post,
+                 fetch_on_query=True):
+        self.server_url = server_url
+        self.retention = retention
+        self.post = post
+        self.fetch_on_query = fetch_on_query
+        self._lock = threading.RLock()
+
+        self._events = np.zeros(0, dtype=EVENT_RECORD)
+        self._max_duration = 0.0
+        self.fetched_from: Optional[float] = None
+        self.fetched_until: Optional[float] = None
+        self._idle_ids = {}  # (start, end) of a fetched range -> the server's idle event id for it
+
+        self.started_at = time.monotonic()
+        self.round_trips = 0
+        self.local_hits = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.content_type = None  # encoding of the last answer
+
+    def __len__(self):
+        return len(self._events)
+
+    @property
+    def cursor(self) -> Optional[float]:
+        """Where the next incremental fetch starts."""
+        if self.fetched_until is None:
+            return None
+        if len(self._events):
+            return min(float(self._events["start"][-1]), self.fetched_until)
+        return self.fetched_until
+
+    def covers(self, start: float, end: float) -> bool:
+        return (self.fetched_from is not None
+                and self.fetched_from <= start and end <= self.fetched_until)
+
+    def merge(self, events):
+        """Insert new events and replace updated ones (in-progress durations grow)."""
+        if not isinstance(events, np.ndarray):
+            events = events_from_rows(events)
+        if not len(events):
+            return
+        if events.dtype != self._events.dtype:
+            self._events = self._events.astype(OPAQUE_EVENT_RECORD)
+            events = events.astype(OPAQUE_EVENT_RECORD)
+        if self._events.dtype == EVENT_RECORD:
+            replaced = np.isin(self._events["id"], events["id"])
+        else:
+            # Opaque ids may not even be comparable with each other, only hashable
+            new_ids = set(events["id"].tolist())
+            replaced = np.array([event_id in new_ids for event_id in self._events["id"].tolist()], dtype=bool)
+        kept = self._events[~replaced]
+        merged = np.concatenate((kept, events))
+        self._events = merged[np.argsort(merged["start"], kind="stable")]
+        self._max_duration = max(self._max_duration, float(events["duration"].max()))
+
+    def clear(self):
+        """Forget every cached event, the next query fetches again."""
+        with self._lock:
+            self._events = np.zeros(0, dtype=EVENT_RECORD)
+            self._max_duration = 0.0
+            self.fetched_from = None
+            self.fetched_until = None
+            self._idle_ids = {}
+
+    def evict(self, now: float):
+        """Drop events that ended more than `retention` seconds ago."""
+        horizon = now - self.retention
+        self._events = self._events[self._events["start"] + self._events["duration"] >= horizon]
+        if self.fetched_from is not None:
+            self.fetched_from = max(self.fetched_from, min(horizon, self.fetched_until))
+        self._idle_ids = {key: value for key, value in self._idle_ids.items() if key[1] >= horizon}
+
+    def _between(self, start: float, end: float) -> np.ndarray:
+        starts = self._events["start"]
+        first = int(np.searchsorted(starts, start - self._max_duration, side="left"))
+        last = int(np.searchsorted(starts, end, side="right"))
+        window = self._events[first:last]
+        return window[window["start"] + window["duration"] >= start]
+
+    def events_between(self, start: float, end: float) -> List[dict]:
+        """Events overlapping [start, end], in start order, shaped like the server's rows."""
+        return events_to_rows(self._between(start, end))
+
+    def _fetch(self, start: float, end: float):
+        payload = {
+            'start_time': epoch_to_utc(start),
+            'end_time': epoch_to_utc(end),
+        }
+        body = json.dumps(payload)
+        response = self.post(self.server_url + "get_event_time_range", data=body,
+                             headers={"Content-Type": "application/json", "Accept": accept_header()})
+        response.raise_for_status() # Raise an exception for bad status codes
+
+        self.round_trips += 1
+        self.request_bytes += len(body)
+        self.response_bytes += len(response.content)
+
+        self.content_type = response.headers.get("Content-Type")
+        events, idle_event_id = decode_events(self.content_type, response.content)
+        self.merge(events)
+        self._idle_ids[(start, end)] = idle_event_id
+        if self.fetched_from is None or start < self.fetched_from:
+            self.fetched_from = start
+        self.fetched_until = end if self.fetched_until is None else max(self.fetched_until, end)
+
+    def query(self, start_time: str, end_time: str) -> Tuple[List[dict], object]:
+        """
+        Events overlapping the staged window, same rows the server returns.
+
+        Returns (rows, idle event id of this range when there are no rows).
+        """
+        start = utc_to_epoch(start_time)
+        end = utc_to_epoch(end_time)
+
+        with self._lock:
+            if self.fetch_on_query:
+                self._update(start, end)
+            else:
+                self.local_hits += 1
+            rows = self.events_between(start, end)
+            return rows, None if rows else self.idle_event_id(start, end)
+
+    def idle_event_id(self, start: float, end: float):
+        """
+        The server's idle event id for exactly [start, end], asked for when
+        not known yet (unless fetch_on_query is off). The id of another
+        range may name a different window.
+        """
+        with self._lock:
+            if (start, end) not in self._idle_ids and self.fetch_on_query:
+                self._fetch(start, end)
+            return self._idle_ids.get((start, end))
+
+    def _update(self, start: float, end: float):
+        if self.covers(start, end):
+            self.local_hits += 1
+        elif self.fetched_from is not None and self.fetched_from <= start <= self.fetched_until:
+            # Only the tail is unknown, refresh from the newest event on
+            self._fetch(self.cursor, end)
+            self.evict(end)
+        else:
+            if self.fetched_from is not None and (start > self.fetched_until or end < self.fetched_from):
+                # Disjoint from what is cached, coverage restarts here
+                self.fetched_from = self.fetched_until = None
+            self._fetch(start, end)
+            self.evict(end)
+
+    def refresh(self, now: Optional[float] = None):
+        """Pull events up to now, from the cursor (or one retention period back)."""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._update(self.cursor if self.cursor is not None else now - self.retention, now)
+
+    def event_at(self, timestamp: float):
+        """Id of the longest event running at timestamp, else the last one before it."""
+        with self._lock:
+            running = self._between(timestamp, timestamp)
+            if len(running):
+                return as_event_id(running["id"][np.argmax(running["duration"])])
+            before = int(np.searchsorted(self._events["start"], timestamp, side="right"))
+            if before:
+                return as_event_id(self._events["id"][before - 1])
+            # Nothing known before it, the idle id of the newest range around it
+            ranges = [key for key in self._idle_ids if key[0] <= timestamp <= key[1]]
+            return self._idle_ids[max(ranges, key=lambda key: key[1])] if ranges else None
+
+    def stats(self) -> dict:
+        hours = max((time.monotonic() - self.started_at) / 3600, 1 / 3600)
+        return {
+            "round_trips_per_hour": round(self.round_trips / hours, 2),
+            "request_bytes_per_hour": round(self.request_bytes / hours),
+            "response_bytes_per_hour": round(self.response_bytes / hours),
+            "local_hits": self.local_hits,
+            "cached_events": len(self),
+            "encoding": self.content_type,
+        }
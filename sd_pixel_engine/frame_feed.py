@@ -0,0 +1,272 @@
+import os
+import sys
+import time
+import struct
+import logging
+import argparse
+from collections import namedtuple
+from multiprocessing import shared_memory
+from typing import Iterator, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FEED_NAME = "sd-feed-{user_id}"
+FEED_MODES = ["off", "selected", "all"]
+FEED_SLOTS = 4  # frames kept in the ring, a subscriber must read within this many publishes
+SAMPLED, SELECTED = 0, 1  # kind of a published frame: a 30 second grab or a slot's final
+
+MAGIC = b"SDFF"
+VERSION = 1
+# magic, version, generation, slots, slot_bytes, head (newest sequence number)
+HEADER = struct.Struct("<4sIIIQQ")
+# seq (0 while being written), timestamp, height, width, rect, event_id (-1 = none), kind
+RECORD = struct.Struct("<QdIIiiiiqI4x")
+
+# One published frame; pixels is a read-only view into the ring, valid until
+# the publisher wraps around to its slot (see FeedReader.valid)
+FeedFrame = namedtuple("FeedFrame", ["seq", "timestamp", "rect", "event_id", "kind", "pixels"])
+
+_published = set()  # segments created by feeds of this process, tracked by it already
+
+
+def _attach(name: str, shared_tracker=False) -> shared_memory.SharedMemory:
+    """
+    Open a segment someone else owns, so this process never unlinks it on exit.
+
+    shared_tracker: this process was spawned by the owner and reports to its
+    resource tracker (capture_worker), where attaching only repeats the
+    owner's registration and unregistering would drop it.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    segment = shared_memory.SharedMemory(name=name)
+    if os.name == "posix" and name not in _published and not shared_tracker:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(segment._name, "shared_memory")
+    return segment
+
+
+def _close(segment: shared_memory.SharedMemory):
+    try:
+        segment.close()
+    except BufferError:
+        # A subscriber still holds frame views, the mapping goes with them
+        logger.warning("Frame feed still has live views, leaving mapping open")
+
+
+def _frames_name(name: str, generation: int) -> str:
+    return f"{name}-{generation}"
+
+
+class FrameFeed:
+    """
+    Publishes frames into a named shared memory ring for local consumers
+    (OCR, the tracker UI), which then read pixels in place instead of
+    decoding PNG files.
+
+    Two segments: a small control block "<name>" with a header and one
+    record per slot (sequence number, timestamp, shape, rect, event id,
+    kind), and the pixel ring "<name>-<generation>". A record's sequence
+    number is zeroed while its slot is rewritten, so readers detect torn
+    or overwritten frames by comparing it before and after use. When the
+    frame size grows the pixel ring is recreated under the next generation.
+    """
+
+    def __init__(self, name: str, slots: int = FEED_SLOTS):
+        self.name = name
+        self.slots = slots
+        self.generation = 0
+        self.slot_bytes = 0
+        self.head = 0
+        self._frames: Optional[shared_memory.SharedMemory] = None
+        size = HEADER.size + slots * RECORD.size
+        try:
+            self._control = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Left behind by a crashed engine, nobody else publishes under this name
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            self._control = shared_memory.SharedMemory(name=name, create=True, size=size)
+        _published.add(name)
+        self._control.buf[:size] = bytes(size)
+        self._write_header()
+
+    def _write_header(self):
+        HEADER.pack_into(self._control.buf, 0, MAGIC, VERSION, self.generation, self.slots,
+                         self.slot_bytes, self.head)
+
+    def _record_offset(self, slot: int) -> int:
+        return HEADER.size + slot * RECORD.size
+
+    def _ensure_frames(self, frame: np.ndarray):
+        if self._frames is not None and frame.nbytes <= self.slot_bytes:
+            return
+        if self._frames is not None:
+            logger.warning("Display topology changed, reallocating the frame feed")
+            self._frames.close()
+            self._frames.unlink()
+        for slot in range(self.slots):
+            RECORD.pack_into(self._control.buf, self._record_offset(slot), 0, 0.0, 0, 0, 0, 0, 0, 0, -1, 0)
+        self.generation += 1
+        self.slot_bytes = frame.nbytes
+        self._frames = shared_memory.SharedMemory(name=_frames_name(self.name, self.generation), create=True,
+                                                  size=self.slots * self.slot_bytes)
+        _published.add(self._frames.name)
+        self._write_header()
+
+    def publish(self, frame: np.ndarray, rect, timestamp: float, event_id=None, kind=SELECTED) -> int:
+        """Copy one HxWx3 uint8 frame into the ring, returns its sequence number."""
+        self._ensure_frames(frame)
+        seq = self.head + 1
+        slot = (seq - 1) % self.slots
+        offset = self._record_offset(slot)
+        height, width = frame.shape[:2]
+
+        RECORD.pack_into(self._control.buf, offset, 0, 0.0, 0, 0, 0, 0, 0, 0, -1, 0)
+        target = np.ndarray(frame.shape, dtype=np.uint8, buffer=self._frames.buf, offset=slot * self.slot_bytes)
+        target[:] = frame
+        x1, y1, x2, y2 = rect
+        # Ids that are not integers (UUIDs) do not fit the record, they read back as none
+        record_event_id = event_id if isinstance(event_id, (int, np.integer)) and event_id >= 0 else -1
+        RECORD.pack_into(self._control.buf, offset, seq, timestamp, height, width, x1, y1, x2, y2,
+                         record_event_id, kind)
+        self.head = seq
+        self._write_header()
+        return seq
+
+    def uri(self, seq: int) -> str:
+        """Where a published final lives, sent in place of a file path when PNGs are not written."""
+        return f"shm://{self.name}/{seq}"
+
+    def close(self):
+        for segment in (self._frames, self._control):
+            if segment is not None:
+                segment.close()
+                segment.unlink()
+        self._frames = self._control = None
+
+
+class FeedReader:
+    """Subscriber side of a FrameFeed, from any local process."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._control = _attach(name)
+        self._frames = None
+        self.generation = None
+        self._attach_frames()
+
+    def _header(self):
+        magic, version, generation, slots, slot_bytes, head = HEADER.unpack_from(self._control.buf, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{self.name} is not a version {VERSION} frame feed")
+        return generation, slots, slot_bytes, head
+
+    def _attach_frames(self):
+        generation, self.slots, self.slot_bytes, _ = self._header()
+        if generation == self.generation:
+            return
+        if self._frames is not None:
+            _close(self._frames)
+            self._frames = None
+        self.generation = generation
+        if generation:
+            self._frames = _attach(_frames_name(self.name, generation))
+
+    def head(self) -> int:
+        return self._header()[3]
+
+    def _record(self, slot: int):
+        return RECORD.unpack_from(self._control.buf, HEADER.size + slot * RECORD.size)
+
+    def read(self, seq: int) -> Optional[FeedFrame]:
+        """Frame seq as a zero-copy view, None when it was never published or is already overwritten."""
+        self._attach_frames()
+        if self._frames is None or seq <= 0:
+            return None
+        slot = (seq - 1) % self.slots
+        record_seq, timestamp, height, width, x1, y1, x2, y2, event_id, kind = self._record(slot)
+        if record_seq != seq:
+            return None
+        pixels = np.ndarray((height, width, 3), dtype=np.uint8, buffer=self._frames.buf,
+                            offset=slot * self.slot_bytes)
+        pixels.flags.writeable = False
+        return FeedFrame(seq, timestamp, (x1, y1, x2, y2), None if event_id < 0 else event_id, kind, pixels)
+
+    def valid(self, frame: FeedFrame) -> bool:
+        """Whether frame's pixels are still intact; check after using a view, copy if it must outlive that."""
+        return self._record((frame.seq - 1) % self.slots)[0] == frame.seq
+
+    def latest(self) -> Optional[FeedFrame]:
+        return self.read(self.head())
+
+    def frames_since(self, seq: int) -> Iterator[FeedFrame]:
+        """Frames published after seq that are still in the ring, oldest first."""
+        head = self.head()
+        for next_seq in range(max(seq + 1, head - self.slots + 1), head + 1):
+            frame = self.read(next_seq)
+            if frame is not None:
+                yield frame
+
+    def close(self):
+        for segment in (self._frames, self._control):
+            if segment is not None:
+                _close(segment)
+        self._frames = self._control = None
+
+
+def benchmark(frames: int, size=(1080, 1920)):
+    """Publish and read frames through the feed vs the PNG file handoff."""
+    import tempfile
+    from PIL import Image
+
+    rng = np.random.default_rng(1)
+    frame = rng.integers(0, 255, (*size, 3), dtype=np.uint8)
+    frame[:, : size[1] // 2] = 40  # half flat, like a desktop
+
+    feed = FrameFeed(f"sd-feed-benchmark-{os.getpid()}")
+    reader = FeedReader(feed.name)
+    began = time.perf_counter()
+    for i in range(frames):
+        seq = feed.publish(frame, (0, 0, 100, 100), time.time())
+        read = reader.read(seq)
+        read.pixels[::64, ::64].sum()  # touch the pixels like a consumer
+    feed_ms = (time.perf_counter() - began) / frames * 1000
+    reader.close()
+    feed.close()
+
+    path = os.path.join(tempfile.mkdtemp(prefix="sd-feed-"), "frame.png")
+    began = time.perf_counter()
+    for i in range(frames):
+        Image.fromarray(frame).save(path)
+        with Image.open(path) as img:
+            np.asarray(img)[::64, ::64].sum()
+    png_ms = (time.perf_counter() - began) / frames * 1000
+    os.remove(path)
+    print(f"{size[1]}x{size[0]} frame handoff  feed {feed_ms:7.2f} ms   png write+decode {png_ms:7.2f} ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Follow or benchmark a shared memory frame feed")
+    parser.add_argument("--user_id", help="Print the frames published by this user's engine")
+    parser.add_argument("--benchmark", type=int, default=0, help="Compare N frame handoffs with PNG files")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.benchmark)
+    elif args.user_id:
+        reader = FeedReader(FEED_NAME.format(user_id=args.user_id))
+        seen = reader.head()
+        try:
+            while True:
+                for frame in reader.frames_since(seen):
+                    kind = "selected" if frame.kind == SELECTED else "sampled"
+                    print(f"#{frame.seq} {kind} {frame.pixels.shape[1]}x{frame.pixels.shape[0]} "
+                          f"at {frame.timestamp:.3f} rect {frame.rect} event {frame.event_id}")
+                    seen = frame.seq
+                time.sleep(0.5)
+        except KeyboardInterrupt:
+            reader.close()
@@ -0,0 +1,182 @@
+import os
+import mmap
+import struct
+import logging
+from collections import namedtuple
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+logger = logging.getLogger(__name__)
+
+RING_MAGIC = b"SDRING01"
+RING_VERSION = 1
+
+CODEC_RAW = 0
+CODEC_LZ4 = 1
+
+SLOT_EMPTY = 0
+SLOT_USED = 1
+
+# magic, version, slot_count, slot_size, data_offset
+HEADER = struct.Struct("<8sIIQQ")
+# state, codec, payload length, utc timestamp, height, width, rect (x1, y1, x2, y2), sequence
+ENTRY = struct.Struct("<BB2xIdIIiiiiQ")
+
+RingEntry = namedtuple("RingEntry", ["slot", "seq", "timestamp", "height", "width",
+                                     "rect", "codec", "length"])
+
+
+def _align(value: int, alignment: int = mmap.ALLOCATIONGRANULARITY) -> int:
+    return (value + alignment - 1) // alignment * alignment
+
+
+class FrameRing:
+    """
+    Preallocated ring file holding raw RGB frames for one staging slot.
+
+    The file is laid out as a fixed header, a fixed-width index with one entry
+    per slot (timestamp, size and foreground rect) and the frame slots
+    themselves. Everything is accessed through a single mmap, so staging a
+    frame is a memcpy and reading one back is a NumPy view over the mapping.
+
+    Staged frames only matter for the slot being captured, so the file is
+    recreated empty whenever a ring is opened.
+    """
+
+    def __init__(self, path: str, slot_count: int, slot_size: int, compress: bool = False):
+        if compress and lz4_frame is None:
+            logger.warning("lz4 is not installed, staging frames uncompressed")
+            compress = False
+
+        self.path = path
+        self.slot_count = slot_count
+        self.slot_size = slot_size
+        self.codec = CODEC_LZ4 if compress else CODEC_RAW
+        self.data_offset = _align(HEADER.size + ENTRY.size * slot_count)
+        self._entries: List[Optional[RingEntry]] = [None] * slot_count
+        self._cursor = 0
+        self._seq = 0
+
+        file_size = self.data_offset + slot_size * slot_count
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self._file = open(path, "w+b")
+        # Preallocate once, the mapping never grows afterwards
+        self._file.truncate(file_size)
+        self._mm = mmap.mmap(self._file.fileno(), file_size)
+        self._write_header()
+
+    @classmethod
+    def for_frame_shape(cls, path: str, slot_count: int, height: int, width: int,
+                        compress: bool = False) -> "FrameRing":
+        """Size every slot for an uncompressed RGB frame of the given topology."""
+        return cls(path, slot_count, height * width * 3, compress=compress)
+
+    def _write_header(self):
+        HEADER.pack_into(self._mm, 0, RING_MAGIC, RING_VERSION, self.slot_count,
+                         self.slot_size, self.data_offset)
+        empty = ENTRY.pack(SLOT_EMPTY, CODEC_RAW, 0, 0.0, 0, 0, 0, 0, 0, 0, 0)
+        self._mm[HEADER.size:HEADER.size + ENTRY.size * self.slot_count] = empty * self.slot_count
+
+    def _write_entry(self, slot: int, entry: Optional[RingEntry]):
+        offset = HEADER.size + ENTRY.size * slot
+        if entry is None:
+            ENTRY.pack_into(self._mm, offset, SLOT_EMPTY, CODEC_RAW, 0, 0.0, 0, 0, 0, 0, 0, 0, 0)
+        else:
+            ENTRY.pack_into(self._mm, offset, SLOT_USED, entry.codec, entry.length,
+                            entry.timestamp, entry.height, entry.width, *entry.rect, entry.seq)
+        self._entries[slot] = entry
+
+    def _next_slot(self) -> int:
+        # Write sequentially from the cursor, preferring free slots and
+        # overwriting the oldest frame only when the ring is full.
+        for step in range(self.slot_count):
+            slot = (self._cursor + step) % self.slot_count
+            if self._entries[slot] is None:
+                return slot
+        return min(self.entries(), key=lambda e: e.seq).slot
+
+    def fits(self, frame: np.ndarray) -> bool:
+        return frame.nbytes <= self.slot_size
+
+    def append(self, timestamp: float, frame: np.ndarray,
+               rect: Tuple[int, int, int, int]) -> RingEntry:
+        """
+        Stage one HxWx3 uint8 frame.
+
+        Args:
+            timestamp: UTC capture time as a POSIX timestamp
+            frame: RGB pixels of the whole virtual desktop
+            rect: foreground window bounds relative to the frame
+
+        High-entropy frames can come out of LZ4 larger than they went in,
+        those are stored raw.
+        """
+        height, width = frame.shape[:2]
+        payload = np.ascontiguousarray(frame).data.cast("B")
+        codec = CODEC_RAW
+        if self.codec == CODEC_LZ4:
+            compressed = lz4_frame.compress(payload)
+            if len(compressed) <= self.slot_size:
+                payload, codec = compressed, CODEC_LZ4
+
+        if len(payload) > self.slot_size:
+            raise ValueError(f"Frame of {len(payload)} bytes does not fit ring slot of {self.slot_size} bytes")
+
+        slot = self._next_slot()
+        start = self.data_offset + slot * self.slot_size
+        self._mm[start:start + len(payload)] = payload
+
+        entry = RingEntry(slot, self._seq, timestamp, height, width,
+                          tuple(int(v) for v in rect), codec, len(payload))
+        self._write_entry(slot, entry)
+        self._seq += 1
+        self._cursor = (slot + 1) % self.slot_count
+        return entry
+
+    def entries(self) -> List[RingEntry]:
+        """Staged frames ordered by capture time."""
+        return sorted((e for e in self._entries if e is not None), key=lambda e: e.timestamp)
+
+    def read(self, slot: int) -> Tuple[np.ndarray, RingEntry]:
+        """
+        Return the frame stored in a slot.
+
+        Raw frames are returned as a read-only view straight over the mapping,
+        so the caller must drop the array before the ring is closed. LZ4
+        frames have to be decompressed into a fresh buffer.
+        """
+        entry = self._entries[slot]
+        if entry is None:
+            raise KeyError(f"Ring slot {slot} is empty")
+
+        start = self.data_offset + slot * self.slot_size
+        if entry.codec == CODEC_LZ4:
+            raw = lz4_frame.decompress(self._mm[start:start + entry.length])
+            frame = np.frombuffer(raw, dtype=np.uint8)
+        else:
+            frame = np.frombuffer(self._mm, dtype=np.uint8, count=entry.length, offset=start)
+            frame.flags.writeable = False
+        return frame.reshape(entry.height, entry.width, 3), entry
+
+    def discard(self, slot: int):
+        if self._entries[slot] is not None:
+            self._write_entry(slot, None)
+
+    def clear(self):
+        for slot in range(self.slot_count):
+            self.discard(slot)
+
+    def close(self):
+        try:
+            self._mm.close()
+        except BufferError:
+            logger.warning("Frame ring still has live views, leaving mapping open")
+            return
+        self._file.close()
@@ -0,0 +1,68 @@
+import signal
+import logging
+import threading
+
+from sd_pixel_engine.schedule import SystemClock
+
+logger = logging.getLogger(__name__)
+
+HIBERNATE_POLL = 5  # seconds per wait, so wall clock jumps and signals are noticed
+SHUTDOWN_TIMEOUT = 10  # seconds the outbox gets to deliver on shutdown
+
+
+class WakeSignal:
+    """
+    Wake notifications from the power listener (detect_sleep) to the engine.
+
+    A hibernating engine wakes up early on any resume; a resume after a long
+    sleep is also remembered until the engine takes it, so frames staged
+    before the sleep are dropped instead of restarting the process.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._long_sleep = False
+
+    def resumed(self, long_sleep: bool = False):
+        with self._lock:
+            self._long_sleep = self._long_sleep or long_sleep
+        self._event.set()
+
+    def take_long_sleep(self) -> bool:
+        with self._lock:
+            long_sleep, self._long_sleep = self._long_sleep, False
+        return long_sleep
+
+    def sleep_until(self, wall_target: float, clock=None, poll=HIBERNATE_POLL) -> bool:
+        """
+        Sleep until wall_target (POSIX seconds) on clock (schedule.SystemClock
+        by default), returns True when a resume cut it short.
+        """
+        clock = clock or SystemClock()
+        self._event.clear()
+        while True:
+            remaining = wall_target - clock.time()
+            if remaining <= 0:
+                return False
+            if clock.wait(self._event, min(remaining, poll) if clock.jumps else remaining):
+                self._event.clear()
+                return True
+
+
+wake_signal = WakeSignal()
+
+
+def install_shutdown_handlers():
+    """
+    Turn SIGTERM and console close (SIGBREAK on Windows) into SystemExit,
+    so the engine's finally blocks flush staging and the outbox.
+    """
+    def handler(signum, frame):
+        logger.info(f"Received signal {signum}, shutting down")
+        raise SystemExit(0)
+
+    for name in ("SIGTERM", "SIGBREAK"):
+        signum = getattr(signal, name, None)
+        if signum is not None:
+            signal.signal(signum, handler)
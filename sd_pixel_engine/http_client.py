@@ -0,0 +1,402 @@
+import io
+import sys
+import time
+import socket
+import random
+import select
+import logging
+import argparse
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+from urllib.parse import quote, unquote, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.connectionpool import HTTPConnectionPool
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+logger = logging.getLogger(__name__)
+
+CONNECT_TIMEOUT = 3.05  # seconds, just over the 3s TCP retransmit window
+READ_TIMEOUT = 15
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 8
+FAILURE_THRESHOLD = 5  # consecutive failures before the circuit opens
+CIRCUIT_RESET = 60  # seconds the circuit stays open before a trial request
+RETRY_STATUS = (502, 503, 504)
+PIPE_POLL = 0.01  # seconds between checks for data on a named pipe with a timeout
+
+# Local transports, the host part of the URL is the quoted socket path or pipe name:
+#   http+unix://%2Frun%2Fsundial%2Fapi.sock/screenshot/
+#   http+npipe://%5C%5C.%5Cpipe%5Csundial/screenshot/
+UNIX_SCHEME = "http+unix"
+PIPE_SCHEME = "http+npipe"
+
+
+def local_url(scheme: str, address: str, path="/screenshot/") -> str:
+    return f"{scheme}://{quote(address, safe='')}{path}"
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """The server failed too often recently, requests are not attempted."""
+
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """The per-slot network budget ran out."""
+
+
+def _never_sent(error: requests.exceptions.ConnectionError) -> bool:
+    """True when the connection was never established, so the server saw nothing."""
+    reason = error.args[0] if error.args else None
+    if isinstance(reason, MaxRetryError):
+        reason = reason.reason
+    return isinstance(reason, NewConnectionError)
+
+
+class _PipeReader(io.RawIOBase):
+    """Read side of a pipe for http.client, closing it leaves the pipe open."""
+
+    def __init__(self, pipe_socket):
+        self._socket = pipe_socket
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        self._socket.wait_readable()
+        return self._socket._pipe.readinto(buffer)
+
+
+class NamedPipeSocket:
+    """
+    Just enough of the socket interface for http.client over a Windows named pipe.
+
+    Synchronous pipe handles have no timeouts, so with one set a read first
+    polls for data (PeekNamedPipe, select() on POSIX FIFOs) and raises
+    socket.timeout once it has waited that long, like a socket would.
+    """
+
+    def __init__(self, path: str):
+        self._pipe = open(path, "r+b", buffering=0)
+        self._timeout: Optional[float] = None
+
+    def sendall(self, data):
+        view = memoryview(data)
+        while view:
+            view = view[self._pipe.write(view):]
+
+    def makefile(self, mode="rb", *args, **kwargs):
+        return io.BufferedReader(_PipeReader(self))
+
+    def settimeout(self, timeout):
+        self._timeout = timeout
+
+    def gettimeout(self) -> Optional[float]:
+        return self._timeout
+
+    def _readable(self) -> bool:
+        if sys.platform == "win32":
+            import ctypes
+            import msvcrt
+            available = ctypes.c_ulong(0)
+            handle = msvcrt.get_osfhandle(self._pipe.fileno())
+            if not ctypes.windll.kernel32.PeekNamedPipe(handle, None, 0, None, ctypes.byref(available), None):
+                return True  # broken pipe, the read reports it
+            return available.value > 0
+        readable, _, _ = select.select([self._pipe], [], [], 0)
+        return bool(readable)
+
+    def wait_readable(self):
+        if self._timeout is None:
+            return
+        deadline = time.monotonic() + self._timeout
+        while not self._readable():
+            if time.monotonic() >= deadline:
+                raise socket.timeout("timed out")
+            time.sleep(PIPE_POLL)
+
+    def setsockopt(self, *args):
+        pass
+
+    def fileno(self):
+        return self._pipe.fileno()
+
+    def close(self):
+        self._pipe.close()
+
+
+class UnixSocketConnection(HTTPConnection):
+    def __init__(self, *args, address: str = "", **kwargs):
+        self.address = address
+        super().__init__(*args, **kwargs)
+
+    def _new_conn(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if isinstance(self.timeout, (int, float)):
+            sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.address)
+        except OSError as e:
+            sock.close()
+            raise NewConnectionError(self, f"Failed to connect to {self.address}: {e}") from e
+        return sock
+
+
+class NamedPipeConnection(UnixSocketConnection):
+    def _new_conn(self):
+        try:
+            return NamedPipeSocket(self.address)
+        except OSError as e:
+            raise NewConnectionError(self, f"Failed to open pipe {self.address}: {e}") from e
+
+    @property
+    def is_connected(self) -> bool:
+        # select() only works on sockets on Windows, trust the handle
+        return self.sock is not None
+
+
+class UnixSocketConnectionPool(HTTPConnectionPool):
+    ConnectionCls = UnixSocketConnection
+
+
+class NamedPipeConnectionPool(HTTPConnectionPool):
+    ConnectionCls = NamedPipeConnection
+
+
+class LocalTransportAdapter(HTTPAdapter):
+    """
+    requests adapter for a server on the same host, over a Unix domain
+    socket (http+unix://) or a Windows named pipe (http+npipe://). Requests
+    keep their usual paths and headers, only the connection differs.
+    """
+
+    POOLS = {UNIX_SCHEME: UnixSocketConnectionPool, PIPE_SCHEME: NamedPipeConnectionPool}
+
+    def __init__(self, pool_size=4):
+        self.pool_size = pool_size
+        self._local_pools: Dict[Tuple[str, str], HTTPConnectionPool] = {}
+        self._pools_lock = threading.Lock()
+        super().__init__(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+
+    def get_connection(self, url, proxies=None):
+        parsed = urlparse(url)
+        key = (parsed.scheme, unquote(parsed.netloc))
+        with self._pools_lock:
+            pool = self._local_pools.get(key)
+            if pool is None:
+                pool = self.POOLS[key[0]]("localhost", maxsize=self.pool_size, address=key[1])
+                self._local_pools[key] = pool
+            return pool
+
+    def get_connection_with_tls_context(self, request, verify, proxies=None, cert=None):
+        return self.get_connection(request.url, proxies)
+
+    def request_url(self, request, proxies):
+        return request.path_url
+
+    def close(self):
+        super().close()
+        with self._pools_lock:
+            for pool in self._local_pools.values():
+                pool.close()
+            self._local_pools.clear()
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold failures in a row. Once reset_timeout has
+    passed it is half-open: the first allow() takes the trial token and
+    every other caller is refused until that trial records its outcome. A
+    trial that never reports back frees the token after another reset_timeout.
+    """
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_at: Optional[float] = None  # when the half-open trial request was let through
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state != "half-open":
+                return state == "closed"
+            if self.trial_at is not None and self.clock() - self.trial_at < self.reset_timeout:
+                return False  # another caller's trial is in flight
+            self.trial_at = self.clock()
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.trial_at = None
+            self.failures += 1
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                if self.opened_at is None:
+                    logger.warning(f"Server failed {self.failures} times in a row, opening circuit")
+                # A failed half-open trial re-opens for another full period
+                self.opened_at = self.clock()
+
+
+class SundialClient:
+    """
+    One keep-alive connection pool for every call to the Sundial server.
+
+    Each request gets connect/read timeouts, is retried a bounded number of
+    times with full-jitter exponential backoff, and goes through a circuit
+    breaker so a dead server costs nothing until the reset period is over.
+    Inside `with client.deadline(seconds):` all requests and backoff sleeps
+    of the current thread share one time budget. Besides http(s) the server
+    can be reached over a local socket or pipe, see LocalTransportAdapter.
+    """
+
+    def __init__(self, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT,
+                 max_retries=MAX_RETRIES, pool_size=4, breaker: Optional[CircuitBreaker] = None):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.breaker = breaker or CircuitBreaker()
+        self._local = threading.local()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        local = LocalTransportAdapter(pool_size)
+        self.session.mount(UNIX_SCHEME + "://", local)
+        self.session.mount(PIPE_SCHEME + "://", local)
+
+    @contextmanager
+    def deadline(self, seconds: float):
+        previous = getattr(self._local, "deadline", None)
+        self._local.deadline = time.monotonic() + seconds
+        try:
+            yield
+        finally:
+            self._local.deadline = previous
+
+    def _remaining(self) -> Optional[float]:
+        deadline = getattr(self._local, "deadline", None)
+        if deadline is None:
+            return None
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded("Slot network deadline exceeded")
+        return remaining
+
+    def _timeouts(self):
+        remaining = self._remaining()
+        if remaining is None:
+            return self.connect_timeout, self.read_timeout
+        return min(self.connect_timeout, remaining), min(self.read_timeout, remaining)
+
+    def _backoff(self, attempt: int):
+        delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+        remaining = self._remaining()
+        if remaining is not None and delay >= remaining:
+            raise DeadlineExceeded("Slot network deadline exceeded during backoff")
+        time.sleep(delay)
+
+    def request(self, method, url, idempotent=True, **kwargs) -> requests.Response:
+        """
+        Send one request, retrying transient failures.
+
+        Non-idempotent requests are only retried when the connection could
+        not be made, never after the server may have seen them.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Circuit open, skipping {method} {url}")
+
+        attempt = 0
+        while True:
+            kwargs["timeout"] = self._timeouts()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.exceptions.ConnectTimeout as e:
+                error, retryable = e, True
+            except requests.exceptions.ConnectionError as e:
+                error, retryable = e, idempotent or _never_sent(e)
+            except requests.exceptions.Timeout as e:
+                error, retryable = e, idempotent
+            else:
+                if response.status_code not in RETRY_STATUS:
+                    self.breaker.record_success()
+                    return response
+                error = requests.exceptions.HTTPError(f"{response.status_code} from {url}", response=response)
+                retryable = idempotent or response.status_code == 503
+
+            self.breaker.record_failure()
+            if not retryable or attempt >= self.max_retries or not self.breaker.allow():
+                raise error
+            logger.info(f"Retrying {method} {url} after: {error}")
+            self._backoff(attempt)
+            attempt += 1
+
+    def get(self, url, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, idempotent=True, **kwargs) -> requests.Response:
+        return self.request("POST", url, idempotent=idempotent, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+def transport_benchmark(count: int):
+    """Median latency of small GETs against the mock server, TCP loopback vs local socket."""
+    import os
+    import tempfile
+    import statistics
+    from sd_pixel_engine.mock_server import MockSundialServer, MockState
+
+    servers = [("tcp loopback", MockSundialServer(state=MockState()))]
+    if hasattr(socket, "AF_UNIX"):
+        path = os.path.join(tempfile.mkdtemp(), "sundial.sock")
+        servers.append(("unix socket", MockSundialServer(state=MockState(), unix_socket=path)))
+
+    for name, server in servers:
+        server.start()
+        client = SundialClient()
+        try:
+            for fresh in (False, True):
+                timings = []
+                for _ in range(count):
+                    began = time.perf_counter()
+                    client.get(server.url + "capabilities").content
+                    timings.append(time.perf_counter() - began)
+                    if fresh:
+                        client.session.close()
+                label = "new connection" if fresh else "keep-alive"
+                print(f"{name:14} {label:15} median {statistics.median(timings) * 1e6:8.0f} us"
+                      f"  p99 {sorted(timings)[int(count * 0.99) - 1] * 1e6:8.0f} us")
+        finally:
+            client.close()
+            server.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare local server transports")
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+    if sys.platform == "win32":
+        print("Named pipe benchmarks need a pipe server, only TCP loopback is measured")
+    transport_benchmark(args.requests)
@@ -0,0 +1,76 @@
+import os
+import re
+import logging
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+
+from sd_pixel_engine.const import SCREENSHOT_FOLDER, SCREENSHOT_SHARDED_FOLDER
+
+logger = logging.getLogger(__name__)
+
+LAYOUTS = ["flat", "sharded"]
+
+# "0a07029c9a901fe0819abf69dca12c0d_2026-01-14T00-55-52.905552Z.png"
+# "0a07029c9a901fe0819abf69dca12c0d_2026-01-14T00-55-52.905552Z_ocr.png"
+# The user id runs up to the timestamp suffix and may contain "_" itself
+FINAL_NAME_RE = re.compile(r"^(?P<user_id>.+)_(?P<timestamp>\d{4}-\d{2}-\d{2}T[\d.-]+Z)(_ocr)?\.png$")
+
+
+def parse_final_name(filename: str) -> Optional[Tuple[str, datetime]]:
+    """Return (user_id, utc capture time) of a final screenshot file name."""
+    match = FINAL_NAME_RE.match(os.path.basename(filename))
+    if not match:
+        return None
+    captured_at = datetime.strptime(match.group("timestamp"), "%Y-%m-%dT%H-%M-%S.%fZ")
+    return match.group("user_id"), captured_at.replace(tzinfo=timezone.utc)
+
+
+def shard_folder(user_id, captured_at: datetime, root=SCREENSHOT_SHARDED_FOLDER) -> str:
+    """<root>/<user>/<yyyy>/<mm>/<dd>, dated by the UTC capture time."""
+    return os.path.join(root, str(user_id), captured_at.strftime("%Y"),
+                        captured_at.strftime("%m"), captured_at.strftime("%d"))
+
+
+class ScreenshotLayout:
+    """
+    Resolve where final screenshots live.
+
+    The flat layout keeps every final directly in SCREENSHOT_FOLDER. The
+    sharded layout spreads them over <user>/<yyyy>/<mm>/<dd>/ folders that
+    are created the first time a day is written.
+
+    Finals written before switching to the sharded layout are never moved:
+    the server and the outbox hold their absolute paths. They stay in the
+    flat folder, where compaction still re-encodes them in place.
+    """
+
+    def __init__(self, layout="flat", flat_folder=SCREENSHOT_FOLDER,
+                 sharded_folder=SCREENSHOT_SHARDED_FOLDER):
+        if layout not in LAYOUTS:
+            raise ValueError(f"Unknown screenshot layout: {layout}")
+        self.layout = layout
+        self.flat_folder = flat_folder
+        self.sharded_folder = sharded_folder
+        self._created = set()
+
+    @property
+    def sharded(self) -> bool:
+        return self.layout == "sharded"
+
+    def _ensure_folder(self, folder):
+        if folder not in self._created:
+            os.makedirs(folder, exist_ok=True)
+            self._created.add(folder)
+
+    def folder_for(self, filename: str) -> str:
+        if self.sharded:
+            parsed = parse_final_name(filename)
+            if parsed:
+                return shard_folder(*parsed, root=self.sharded_folder)
+        return self.flat_folder
+
+    def resolve(self, filename: str) -> str:
+        """Absolute path a new final should be written to, creating its folder lazily."""
+        folder = self.folder_for(filename)
+        self._ensure_folder(folder)
+        return os.path.abspath(os.path.join(folder, os.path.basename(filename)))
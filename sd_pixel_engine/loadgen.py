@@ -0,0 +1,220 @@
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+import tempfile
+import threading
+import statistics
+from datetime import datetime, timezone
+from typing import List, Optional
+
+import numpy as np
+import requests
+
+logger = logging.getLogger(__name__)
+
+FRAME_SIZE = (180, 320)  # height, width of fake frames
+
+
+class FakeCaptureSource:
+    """
+    Stand-in for grab_desktop: small synthetic frames and a foreground
+    window that switches now and then, seeded per agent.
+    """
+
+    def __init__(self, seed: int, windows=4, switch_probability=0.3, size=FRAME_SIZE):
+        self.random = random.Random(seed)
+        self.windows = windows
+        self.switch_probability = switch_probability
+        self.height, self.width = size
+        self.window = 0
+        self.grabs = 0
+
+    def __call__(self):
+        self.grabs += 1
+        if self.random.random() < self.switch_probability:
+            self.window = self.random.randrange(self.windows)
+
+        frame = np.full((self.height, self.width, 3), 40 + 50 * self.window, dtype=np.uint8)
+        y = self.random.randrange(self.height // 2)
+        x = self.random.randrange(self.width // 2)
+        frame[y:y + self.height // 4, x:x + self.width // 4] = self.random.randrange(256)
+        rect = (self.width // 8, self.height // 8, self.width * 7 // 8, self.height * 7 // 8)
+        return frame, rect, {"id": 1000 + self.window, "owner": f"Window {self.window}"}
+
+
+def _sleep_until(deadline: float):
+    remaining = deadline - time.time()
+    if remaining > 0:
+        time.sleep(remaining)
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class SimulatedAgent:
+    """One ScreenShot instance driven on a compressed schedule."""
+
+    def __init__(self, index: int, screenshot):
+        self.index = index
+        self.screenshot = screenshot
+        self.latencies: List[float] = []
+        self.errors = 0
+
+    def run(self, start: float, slots: int, slot_seconds: float, ticks_per_slot: int, deadline: float):
+        self.screenshot.negotiate_capabilities()
+        start += self.screenshot.phase_offset
+        tick = slot_seconds / ticks_per_slot
+        for slot in range(slots):
+            slot_start = start + slot * slot_seconds
+            for i in range(ticks_per_slot):
+                _sleep_until(slot_start + i * tick)
+                self.screenshot._take_screenshot_30_seconds()
+            _sleep_until(slot_start + slot_seconds)
+
+            capture_time = datetime.now(timezone.utc)
+            self.screenshot._sleep_upload_jitter()
+            began = time.perf_counter()
+            try:
+                with self.screenshot.client.deadline(deadline):
+                    self.screenshot._finalize_slot(capture_time)
+            except (requests.exceptions.RequestException, ValueError) as e:
+                self.errors += 1
+                logger.debug(f"agent {self.index} slot {slot} failed: {e}")
+                self.screenshot._finish_slot()
+            self.latencies.append(time.perf_counter() - began)
+
+
+def run_load(args) -> dict:
+    # Imported late: the screenshot modules read LOCALAPPDATA when first imported
+    from sd_pixel_engine.screenshot import ScreenShot
+    from sd_pixel_engine.mock_server import MockSundialServer, MockState
+
+    server = None
+    server_url = args.server_url
+    if not server_url:
+        state = MockState(latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+                          failure_rate=args.failure_rate, drop_rate=args.drop_rate,
+                          event_length=args.event_length, idle_ratio=args.idle_ratio, seed=args.seed)
+        server = MockSundialServer(state=state).start()
+        server_url = server.url
+
+    agents = [
+        SimulatedAgent(i, ScreenShot(
+            server_url, f"agent{i:04d}", times_per_hour=3600 / args.slot_seconds,
+            staging=args.staging, top_k=args.top_k,
+            capture_source=FakeCaptureSource(args.seed * 100_003 + i),
+            desync_slots=args.desync, upload_jitter=args.upload_jitter,
+        ))
+        for i in range(args.agents)
+    ]
+
+    # Every agent anchors on the same boundary, like a fleet sharing start_hour,
+    # unless --desync gives each its own phase
+    start = float(int(time.time()) + 2)
+    threads = [
+        threading.Thread(target=agent.run, daemon=True,
+                         args=(start, args.slots, args.slot_seconds, args.ticks_per_slot, args.deadline))
+        for agent in agents
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    latencies = [latency for agent in agents for latency in agent.latencies]
+    report = {
+        "agents": args.agents,
+        "slots": args.slots * args.agents,
+        "slot_errors": sum(agent.errors for agent in agents),
+        "finalize_p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "finalize_p95_ms": round(_percentile(latencies, 0.95) * 1000, 1),
+        "finalize_p99_ms": round(_percentile(latencies, 0.99) * 1000, 1),
+        "finalize_max_ms": round(max(latencies) * 1000, 1),
+    }
+    if server is not None:
+        report["server"] = server.state.rate_stats(args.bucket)
+        report["server_paths"] = dict(server.state.requests)
+        server.stop()
+
+    for agent in agents:
+        agent.screenshot.staging.close()
+        agent.screenshot.client.close()
+    return report
+
+
+def simulate_fleet(agents: int, slot_seconds: float, slots=4, requests_per_slot=2,
+                   desync=False, upload_jitter=0.0, bucket=1.0, seed=1) -> dict:
+    """
+    Offline model of a fleet's slot traffic: every agent sends
+    requests_per_slot requests when its slot fires, plus upload jitter.
+    Returns the peak-to-mean ratio of requests per bucket over the run.
+    """
+    from sd_pixel_engine.utils import slot_phase_offset
+
+    rng = random.Random(seed)
+    buckets = int(slots * slot_seconds / bucket) + 1
+    counts = np.zeros(buckets + int(slot_seconds / bucket) + int(upload_jitter / bucket) + 2, dtype=np.int64)
+    for i in range(agents):
+        phase = slot_phase_offset(f"agent{i:04d}", slot_seconds) if desync else 0.0
+        for slot in range(slots):
+            fired = slot * slot_seconds + phase + rng.uniform(0, upload_jitter)
+            counts[int(fired / bucket)] += requests_per_slot
+
+    # Steady state only: the first slot period is still warming up with desync
+    window = counts[int(slot_seconds / bucket):int(slots * slot_seconds / bucket)]
+    mean = window.mean() if len(window) else 0
+    return {"peak_per_bucket": int(window.max()), "mean_per_bucket": round(float(mean), 2),
+            "peak_to_mean": round(float(window.max() / mean), 2) if mean else None}
+
+
+def setup_argument_parser():
+    parser = argparse.ArgumentParser(description="Run simulated screenshot agents against a Sundial server")
+    parser.add_argument("--agents", type=int, default=200)
+    parser.add_argument("--slots", type=int, default=3, help="Slots each agent finalizes")
+    parser.add_argument("--slot_seconds", type=float, default=10, help="Compressed slot length")
+    parser.add_argument("--ticks_per_slot", type=int, default=3, help="Grabs per slot")
+    parser.add_argument("--staging", default="ring", help="Staging backend of the agents")
+    parser.add_argument("--top_k", type=int, default=0)
+    parser.add_argument("--deadline", type=float, default=20, help="Network budget per slot")
+    parser.add_argument("--server_url", help="Target this server instead of a bundled mock")
+    parser.add_argument("--latency_ms", type=float, default=5)
+    parser.add_argument("--jitter_ms", type=float, default=5)
+    parser.add_argument("--failure_rate", type=float, default=0)
+    parser.add_argument("--drop_rate", type=float, default=0)
+    parser.add_argument("--event_length", type=float, default=4)
+    parser.add_argument("--idle_ratio", type=float, default=0.2)
+    parser.add_argument("--bucket", type=float, default=1.0, help="Seconds per server rate bucket")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workdir", help="LOCALAPPDATA for the agents (default: a temp folder)")
+    parser.add_argument("--desync", action="store_true", help="Per-user slot phase offsets")
+    parser.add_argument("--upload_jitter", type=float, default=0, help="Seconds of random upload delay")
+    parser.add_argument("--simulate", action="store_true",
+                        help="Only model peak-to-mean traffic with and without desync, no agents run")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None):
+    args = setup_argument_parser().parse_args(argv)
+    if args.simulate:
+        for desync, jitter in ((False, 0.0), (False, args.upload_jitter), (True, 0.0), (True, args.upload_jitter)):
+            result = simulate_fleet(args.agents, args.slot_seconds, max(args.slots, 2),
+                                    desync=desync, upload_jitter=jitter, bucket=args.bucket, seed=args.seed)
+            print(f"desync={desync!s:5} jitter={jitter:5.1f}s  {result}")
+        return
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    # Keep agent staging folders and finals away from the real Sundial folder
+    os.environ["LOCALAPPDATA"] = args.workdir or tempfile.mkdtemp(prefix="sd-loadgen-")
+    report = run_load(args)
+    for key, value in report.items():
+        print(f"{key:16} {value}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,4 +1,5 @@
 import os 
+import json
 import argparse
 import shutil
 import logging 
@@ -8,6 +9,16 @@ from datetime import time
 from sd_core.log import setup_logging
 from sd_pixel_engine.screenshot import ScreenShot
 from sd_pixel_engine.const import SCREENSHOT_FOLDER_USER
+from sd_pixel_engine.staging import STAGING_BACKENDS
+from sd_pixel_engine.layout import LAYOUTS
+from sd_pixel_engine.compaction import start_compaction
+from sd_pixel_engine.stream_upload import UPLOAD_MODES
+from sd_pixel_engine.scheduler import LATE_POLICIES
+from sd_pixel_engine.activity import IDLE_THRESHOLD
+from sd_pixel_engine.hibernation import install_shutdown_handlers
+from sd_pixel_engine.engine import MultiProfileEngine
+from sd_pixel_engine.async_engine import AsyncEngine
+from sd_pixel_engine.frame_feed import FEED_MODES, FEED_SLOTS
 from sd_pixel_engine.utils import parse_time, parse_days, str2bool
 from sd_pixel_engine.detect_sleep import create_hidden_power_listener
 
@@ -16,7 +27,8 @@ logger = logging.getLogger(__name__)
 def setup_argument_parser():
     """Create and return the argument parser."""
     parser = argparse.ArgumentParser(description="Screenshot uploader")
-    parser.add_argument("--server_url", required=True, help="URL to upload screenshots")
+    parser.add_argument("--server_url", required=True,
+                        help="URL to upload screenshots (http://, http+unix:// or http+npipe://)")
     parser.add_argument("--user_id", required=True, help="User ID for identification")
     parser.add_argument("--start_hour", type=parse_time, default=time(8, 0),
                         help="Start time (HH:MM)")
@@ -30,6 +42,51 @@ def setup_argument_parser():
                         default=False, help="Enable idle screenshots (true/false, default=False)")
     parser.add_argument("--tracking_interval", type=int, default=0, 
                         help="Tracking interval in seconds (0=always mode)")
+    parser.add_argument("--staging", choices=STAGING_BACKENDS, default="png",
+                        help="Staging backend for 30 second grabs (png files or mmap ring file)")
+    parser.add_argument("--layout", choices=LAYOUTS, default="flat",
+                        help="Final screenshot layout (flat folder or <user>/<yyyy>/<mm>/<dd> shards)")
+    parser.add_argument("--pack_finals", type=str2bool, nargs="?", const=True,
+                        default=False, help="Store finals in daily pack files (true/false, default=False)")
+    parser.add_argument("--compact_after_days", type=float, default=0,
+                        help="Re-encode finals older than this many days in the background (0=disabled)")
+    parser.add_argument("--top_k", type=int, default=0,
+                        help="Candidate frames kept staged per slot (0=keep every 30 second grab)")
+    parser.add_argument("--window_sampling", type=str2bool, nargs="?", const=True, default=False,
+                        help="Sample the foreground window every second and match events locally (true/false)")
+    parser.add_argument("--outbox", type=str2bool, nargs="?", const=True, default=False,
+                        help="Queue uploads in a durable outbox sent in the background (true/false)")
+    parser.add_argument("--upload_mode", choices=UPLOAD_MODES, default="path",
+                        help="Send the final's local path, or stream its bytes to a remote server")
+    parser.add_argument("--stream_rate_limit", type=int, default=0,
+                        help="Stream upload rate limit in bytes per second (0=unlimited)")
+    parser.add_argument("--desync_slots", type=str2bool, nargs="?", const=True, default=False,
+                        help="Offset this user's slots by a fixed per-user phase (true/false)")
+    parser.add_argument("--upload_jitter", type=float, default=0,
+                        help="Random delay of up to this many seconds before each upload")
+    parser.add_argument("--late_policy", choices=LATE_POLICIES, default="catch-up",
+                        help="After a stall run missed work once (catch-up) or drop it (skip)")
+    parser.add_argument("--capture_triggers", type=str2bool, nargs="?", const=True, default=False,
+                        help="Grab on foreground window changes and input instead of every 30 seconds (true/false)")
+    parser.add_argument("--adaptive_rate", type=str2bool, nargs="?", const=True, default=False,
+                        help="Adapt the 30 second grab interval to screen changes and CPU load (true/false)")
+    parser.add_argument("--activity_gate", type=str2bool, nargs="?", const=True, default=False,
+                        help="Pause grabs while locked, idle or blank (true/false)")
+    parser.add_argument("--idle_threshold", type=float, default=IDLE_THRESHOLD,
+                        help="Seconds without input before the activity gate pauses grabs")
+    parser.add_argument("--capture_worker", type=str2bool, nargs="?", const=True, default=False,
+                        help="Grab and encode in a supervised child process (true/false)")
+    parser.add_argument("--async_engine", type=str2bool, nargs="?", const=True, default=False,
+                        help="Run scheduling, sampling and uploads as asyncio tasks with capture and "
+                             "encode in executors (true/false)")
+    parser.add_argument("--frame_feed", choices=FEED_MODES, default="off",
+                        help="Publish selected (or all sampled) frames into a shared memory feed for local consumers")
+    parser.add_argument("--feed_only", type=str2bool, nargs="?", const=True, default=False,
+                        help="Skip writing the final PNG, uploads point at the frame feed, which keeps "
+                             f"the last {FEED_SLOTS} finals; needs --frame_feed selected (true/false)")
+    parser.add_argument("--profiles",
+                        help="JSON file with a list of schedule profiles sharing one capture stream; "
+                             "keys not set in a profile come from the other flags")
     return parser
 
 
@@ -55,26 +112,80 @@ def main():
     # Set up logging
     setup_logging("sd-pixel-engine", log_file=True)
 
+    if args.profiles:
+        return run_profiles(args)
+
     # Cleanup and initialize
     cleanup_screenshot_folder(args.user_id)
 
     # Create and start screenshot manager
-    screenshot = ScreenShot(
+    screenshot = ScreenShot(**screenshot_kwargs(args))
+    if args.compact_after_days > 0:
+        start_compaction(args.compact_after_days, screenshot.interval)
+
+    # Run in appropriate mode, stopping gracefully on Ctrl+C, SIGTERM or console close
+    install_shutdown_handlers()
+    try:
+        if args.async_engine:
+            AsyncEngine(screenshot, anchored=args.tracking_interval == 0).run()
+        elif args.tracking_interval == 0:
+            screenshot.run_always()
+        else:
+            screenshot.run()
+    except KeyboardInterrupt:
+        logger.info("Interrupted")
+    finally:
+        screenshot.shutdown()
+
+def run_profiles(args):
+    """Several schedules in one process over one capture stream."""
+    with open(args.profiles) as f:
+        configs = json.load(f)
+    defaults = dict(screenshot_kwargs(args), tracking_interval=args.tracking_interval)
+    for config in configs:
+        cleanup_screenshot_folder(config.get("user_id", args.user_id))
+    engine = MultiProfileEngine.from_configs(configs, defaults, late_policy=args.late_policy)
+
+    if args.compact_after_days > 0:
+        start_compaction(args.compact_after_days, min(p.screenshot.interval for p in engine.profiles))
+
+    install_shutdown_handlers()
+    try:
+        engine.run()
+    except KeyboardInterrupt:
+        logger.info("Interrupted")
+    finally:
+        engine.shutdown()
+
+def screenshot_kwargs(args) -> dict:
+    return dict(
         server_url=args.server_url,
         user_id=args.user_id,
         start_time=args.start_hour,
         end_time=args.end_hour,
         times_per_hour=args.times_per_hour,
         days=args.days,
-        is_idle_screenshot=args.is_idle_screenshot
+        is_idle_screenshot=args.is_idle_screenshot,
+        staging=args.staging,
+        layout=args.layout,
+        pack_finals=args.pack_finals,
+        top_k=args.top_k,
+        window_sampling=args.window_sampling,
+        outbox=args.outbox,
+        upload_mode=args.upload_mode,
+        stream_rate_limit=args.stream_rate_limit,
+        desync_slots=args.desync_slots,
+        upload_jitter=args.upload_jitter,
+        late_policy=args.late_policy,
+        capture_triggers=args.capture_triggers,
+        adaptive_rate=args.adaptive_rate,
+        activity_gate=args.activity_gate,
+        idle_threshold=args.idle_threshold,
+        capture_worker=args.capture_worker,
+        frame_feed=args.frame_feed,
+        feed_only=args.feed_only
     )
 
-    # Run in appropriate mode
-    if args.tracking_interval == 0:
-        screenshot.run_always()
-    else:
-        screenshot.run()
-
 if __name__ == '__main__':
     start_sleep_detection()
     main()
@@ -0,0 +1,496 @@
+import os
+import json
+import time
+import random
+import zlib
+import logging
+import itertools
+import argparse
+import threading
+import socketserver
+from io import BytesIO
+from urllib.parse import quote
+from email.parser import BytesParser
+from email.policy import HTTP
+from datetime import datetime, timezone
+from http.client import parse_headers
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+from sd_pixel_engine.wire import CONTENT_JSON, choose_content_type, encode_events, events_from_rows, integer_ids
+
+logger = logging.getLogger(__name__)
+
+EVENT_LENGTH = 45  # seconds per synthetic event
+
+
+def _utc_to_epoch(value: str) -> float:
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def _epoch_to_event_timestamp(timestamp: float) -> str:
+    # Same shape as the real server: '2026-01-14 06:49:15.373000+00:00'
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat(sep=" ", timespec="microseconds")
+
+
+class MockState:
+    """
+    Synthetic event stream and request log shared by all handler threads.
+
+    Events start every EVENT_LENGTH seconds, with ids derived from their
+    start time. With idle_ratio > 0 each event is cut short by a
+    deterministic pseudo-random fraction, leaving idle gaps between events.
+    The event containing "now" is still in progress, so its duration keeps
+    growing like a real foreground event does.
+
+    latency/jitter (seconds) delay every answer, failure_rate answers with
+    a 503 and drop_rate closes the connection without answering.
+    """
+
+    def __init__(self, finalize=True, event_length=EVENT_LENGTH, clock=time.time, binary=True,
+                 latency=0.0, jitter=0.0, failure_rate=0.0, drop_rate=0.0, idle_ratio=0.0, seed=None):
+        self.finalize = finalize
+        self.binary = binary  # answer event ranges in the encoding the client prefers
+        self.event_length = event_length
+        self.clock = clock
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.drop_rate = drop_rate
+        self.idle_ratio = idle_ratio
+        self.seed = seed or 0
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.uploads = []
+        self.requests = {}
+        self.log = []  # (arrival time, path, status) of every request
+        self.idempotency_keys = set()
+        self.duplicates = 0
+        self.streams = {}  # upload id -> {part: bytearray}
+        self.pending = {}  # finalize upload id -> upload waiting for its confirm
+        self.aborted = 0
+        self._upload_ids = itertools.count(1)
+        self.stream_failures = 0  # next N chunks are stored but answered with a 500
+        self.stream_drops = 0  # next N chunks are stored, then the connection closes without an answer
+
+    def count(self, path):
+        with self.lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+
+    def log_request(self, arrived: float, path: str, status: int):
+        with self.lock:
+            self.log.append((arrived, path, status))
+
+    def fault(self) -> str:
+        """Sleep the configured latency, then pick "drop", "fail" or "ok"."""
+        with self.lock:
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            roll = self.random.random()
+        if delay > 0:
+            time.sleep(delay)
+        if roll < self.drop_rate:
+            return "drop"
+        if roll < self.drop_rate + self.failure_rate:
+            return "fail"
+        return "ok"
+
+    def rate_stats(self, bucket=1.0) -> dict:
+        """Requests per bucket over the logged period: mean, peak and peak-to-mean ratio."""
+        with self.lock:
+            arrivals = [arrived for arrived, _, _ in self.log]
+            errors = sum(1 for _, _, status in self.log if status >= 500)
+        if not arrivals:
+            return {"requests": 0}
+        first = min(arrivals)
+        counts = {}
+        for arrived in arrivals:
+            index = int((arrived - first) // bucket)
+            counts[index] = counts.get(index, 0) + 1
+        buckets = max(counts) + 1
+        mean = len(arrivals) / buckets
+        peak = max(counts.values())
+        return {
+            "requests": len(arrivals),
+            "errors": errors,
+            "seconds": round(buckets * bucket, 1),
+            "mean_per_bucket": round(mean, 2),
+            "peak_per_bucket": peak,
+            "peak_to_mean": round(peak / mean, 2),
+        }
+
+    def record_upload(self, body, key=None) -> bool:
+        """Store an upload once per idempotency key, False for a duplicate."""
+        with self.lock:
+            if key is not None:
+                if key in self.idempotency_keys:
+                    self.duplicates += 1
+                    return False
+                self.idempotency_keys.add(key)
+            self.uploads.append(body)
+            return True
+
+    def hold_upload(self, upload: dict) -> str:
+        """Park a finalize choice until the client confirms it wrote the file."""
+        with self.lock:
+            upload_id = f"finalize-{next(self._upload_ids)}"
+            self.pending[upload_id] = upload
+            return upload_id
+
+    def settle_upload(self, upload_id: str, confirm: bool, file_location=None) -> bool:
+        with self.lock:
+            upload = self.pending.pop(upload_id, None)
+            if upload is None:
+                return False
+            if not confirm:
+                self.aborted += 1
+                return True
+            if file_location:
+                upload["file_location"] = file_location
+            self.uploads.append(upload)
+            return True
+
+    def write_chunk(self, upload, part, offset, data) -> int:
+        with self.lock:
+            buffer = self.streams.setdefault(upload, {}).setdefault(part, bytearray())
+            if offset > len(buffer):
+                raise ValueError(f"Gap in {upload}/{part}: offset {offset}, have {len(buffer)}")
+            buffer[offset:offset + len(data)] = data
+            return len(buffer)
+
+    def events_between(self, start: float, end: float):
+        now = self.clock()
+        end = min(end, now)
+        rows = []
+        index = int(start // self.event_length)
+        while index * self.event_length <= end:
+            event_start = index * self.event_length
+            duration = min(self._event_span(index), now - event_start)
+            if duration > 0 and event_start + duration >= start:
+                rows.append({
+                    "id": index,
+                    "timestamp": _epoch_to_event_timestamp(event_start),
+                    "duration": round(duration, 3),
+                })
+            index += 1
+        return rows
+
+    def _event_span(self, index: int) -> float:
+        if not self.idle_ratio:
+            return self.event_length
+        fraction = (zlib.crc32(f"{self.seed}:{index}".encode()) & 0xFFFF) / 0xFFFF
+        return self.event_length * (1 - self.idle_ratio * fraction)
+
+    def choose(self, candidates, start: float, end: float):
+        """Same rule as the client: longest event containing a candidate, else the latest."""
+        rows = self.events_between(start, end)
+        if not candidates:
+            return None, rows[-1]["id"] if rows else None
+
+        best = None
+        for candidate in candidates:
+            captured_at = _utc_to_epoch(candidate["timestamp"])
+            for row in rows:
+                row_start = _utc_to_epoch(row["timestamp"])
+                if row_start <= captured_at <= row_start + row["duration"]:
+                    if best is None or row["duration"] >= best[1]["duration"]:
+                        best = (candidate, row)
+        if best:
+            return best[0], best[1]["id"]
+
+        longest = max(rows, key=lambda r: r["duration"]) if rows else None
+        return candidates[-1], longest["id"] if longest else None
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state: MockState = None
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _read_multipart(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        head = f"Content-Type: {self.headers.get('Content-Type')}\r\n\r\n".encode()
+        message = BytesParser(policy=HTTP).parsebytes(head + self.rfile.read(length))
+        return {part.get_param("name", header="content-disposition"): part.get_payload(decode=True)
+                for part in message.iter_parts()}
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, body, status=200):
+        self._send_bytes(json.dumps(body).encode(), "application/json", status)
+
+    def _send_bytes(self, data: bytes, content_type: str, status=200):
+        self.state.log_request(self._arrived, self.path, status)
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _inject_fault(self) -> bool:
+        """Apply latency and failure injection, True when the request was consumed."""
+        self._arrived = time.time()
+        outcome = self.state.fault()
+        if outcome == "ok":
+            return False
+        # The body is left unread, so the connection cannot be reused either way
+        self.close_connection = True
+        if outcome == "fail":
+            self._send_json({"detail": "Injected failure"}, 503)
+        else:
+            self.state.log_request(self._arrived, self.path, 599)
+        return True
+
+    def do_GET(self):
+        self.state.count(self.path)
+        if self._inject_fault():
+            return
+        if self.path == "/screenshot/capabilities" and self.state.finalize:
+            self._send_json({"capabilities": ["finalize", "batch", "stream"]})
+        elif self.path.startswith("/screenshot/stream/"):
+            parts = self.state.streams.get(self.path.rsplit("/", 1)[1])
+            if parts is None:
+                self._send_json({"detail": "Not Found"}, 404)
+            else:
+                self._send_json({"parts": {name: len(data) for name, data in parts.items()}})
+        else:
+            self._send_json({"detail": "Not Found"}, 404)
+
+    def do_POST(self):
+        self.state.count(self.path)
+        if self._inject_fault():
+            return
+        if self.path.startswith("/screenshot/stream/") and not self.path.endswith("/commit"):
+            return self._stream_chunk()
+        body = self._read_json()
+
+        if self.path == "/screenshot/":
+            self.state.record_upload(body, self.headers.get("Idempotency-Key"))
+            self._send_json({"status": "ok"})
+
+        elif self.path.startswith("/screenshot/stream/"):
+            upload = self.path.split("/")[-2]
+            parts = self.state.streams.get(upload, {})
+            sizes = body.get("sizes", {})
+            if any(len(parts.get(name, b"")) != size for name, size in sizes.items()):
+                self._send_json({"detail": "Upload incomplete"}, 409)
+                return
+            body["size"] = sum(sizes.values())
+            body["file_location"] = f"stream:{upload}"
+            self.state.record_upload(body, upload)
+            self._send_json({"status": "ok"})
+
+        elif self.path == "/screenshot/batch" and self.state.finalize:
+            accepted = []
+            for item in body.get("items", []):
+                key = item.pop("idempotency_key", None)
+                self.state.record_upload(item, key)
+                accepted.append(key)
+            self._send_json({"accepted": accepted})
+
+        elif self.path == "/screenshot/get_event_time_range":
+            rows = self.state.events_between(_utc_to_epoch(body["start_time"]), _utc_to_epoch(body["end_time"]))
+            events = events_from_rows(rows)
+            content_type = (choose_content_type(self.headers.get("Accept"), integer_ids(events))
+                            if self.state.binary else CONTENT_JSON)
+            if content_type == CONTENT_JSON:
+                self._send_json({"result": json.dumps(rows)})
+            else:
+                self._send_bytes(encode_events(events, None, content_type), content_type)
+
+        elif self.path == "/screenshot/finalize" and self.state.finalize:
+            candidate, event_id = self.state.choose(
+                body.get("candidates", []), _utc_to_epoch(body["start_time"]), _utc_to_epoch(body["end_time"]))
+            upload_id = None
+            if candidate is not None:
+                upload_id = self.state.hold_upload({
+                    "file_location": candidate["file_location"],
+                    "is_idle_screenshot": body.get("is_idle_screenshot"),
+                    "created_at": body.get("created_at"),
+                    "event_id": event_id,
+                })
+            self._send_json({
+                "accepted": candidate is not None,
+                "timestamp": candidate["timestamp"] if candidate else None,
+                "event_id": event_id,
+                "upload_id": upload_id,
+            })
+
+        elif self.path.startswith("/screenshot/finalize/") and self.state.finalize:
+            # /screenshot/finalize/<upload id>/confirm or /abort
+            _, upload_id, action = self.path.rsplit("/", 2)
+            if action not in ("confirm", "abort") or not self.state.settle_upload(
+                    upload_id, action == "confirm", body.get("file_location")):
+                self._send_json({"detail": "Not Found"}, 404)
+            else:
+                self._send_json({"status": "ok"})
+
+        else:
+            self._send_json({"detail": "Not Found"}, 404)
+
+
+    def _stream_chunk(self):
+        fields = self._read_multipart()
+        upload = self.path.rsplit("/", 1)[1]
+        try:
+            received = self.state.write_chunk(upload, fields["part"].decode(), int(fields["offset"]), fields["chunk"])
+        except (KeyError, ValueError) as e:
+            self._send_json({"detail": str(e)}, 400)
+            return
+        with self.state.lock:
+            drop = self.state.stream_drops > 0
+            self.state.stream_drops -= drop
+            fail = not drop and self.state.stream_failures > 0
+            self.state.stream_failures -= fail
+        # Either way the chunk is stored, but the client never hears about it
+        if drop:
+            self.close_connection = True
+            self.state.log_request(self._arrived, self.path, 599)
+        elif fail:
+            self._send_json({"detail": "Injected failure"}, 500)
+        else:
+            self._send_json({"received": received})
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class MockSundialServer:
+    """
+    Local stand-in for the Sundial screenshot API, runs on a background thread.
+
+    Listens on TCP, or on a Unix domain socket when unix_socket is a path.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, state=None, unix_socket=None):
+        self.state = state or MockState()
+        self.unix_socket = unix_socket
+        # Headers and body are separate writes, Nagle would hold the body back on TCP
+        handler = type("BoundMockHandler", (MockHandler,), {
+            "state": self.state, "disable_nagle_algorithm": not unix_socket})
+        if unix_socket:
+            if os.path.exists(unix_socket):
+                os.remove(unix_socket)
+            self.httpd = UnixHTTPServer(unix_socket, handler)
+        else:
+            self.httpd = ThreadingHTTPServer((host, port), handler)
+            self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        if self.unix_socket:
+            return f"http+unix://{quote(self.unix_socket, safe='')}/screenshot/"
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/screenshot/"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self.unix_socket and os.path.exists(self.unix_socket):
+            os.remove(self.unix_socket)
+
+
+class _Connection:
+    """One request's bytes in, the handler's answer out, in place of a socket."""
+
+    def __init__(self, data: bytes):
+        self.rfile = BytesIO(data)
+        self.sent = BytesIO()
+
+    def makefile(self, mode, *args, **kwargs):
+        return self.rfile
+
+    def sendall(self, data):
+        self.sent.write(data)
+
+    def settimeout(self, timeout):
+        pass
+
+    def setsockopt(self, *args):
+        pass
+
+
+class InProcessAdapter(BaseAdapter):
+    """
+    requests adapter that hands each request straight to MockHandler on the
+    calling thread, without sockets or a server thread. Mount it on a
+    client's session for simulations, where loopback HTTP would dominate.
+    """
+
+    def __init__(self, state: MockState):
+        super().__init__()
+        self.handler = type("InProcessMockHandler", (MockHandler,), {"state": state})
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        body = request.body or b""
+        if isinstance(body, str):
+            body = body.encode()
+        elif not isinstance(body, (bytes, bytearray)):
+            body = b"".join(body)
+        headers = "".join(f"{name}: {value}\r\n" for name, value in request.headers.items()
+                          if name.lower() != "content-length")
+        head = f"{request.method} {request.path_url} HTTP/1.1\r\n{headers}Content-Length: {len(body)}\r\n"
+        connection = _Connection(head.encode() + b"\r\n" + bytes(body))
+        self.handler(connection, ("127.0.0.1", 0), None)
+
+        answer = BytesIO(connection.sent.getvalue())
+        if not answer.getvalue():
+            raise requests.exceptions.ConnectionError("Mock dropped the connection", request=request)
+        status = answer.readline().split(None, 2)
+        response = requests.Response()
+        response.status_code = int(status[1])
+        response.reason = status[2].strip().decode() if len(status) > 2 else ""
+        response.headers = CaseInsensitiveDict(parse_headers(answer).items())
+        response._content = answer.read()
+        response.url = request.url
+        response.request = request
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        return response
+
+    def close(self):
+        pass
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Local stand-in for the Sundial screenshot server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7600)
+    parser.add_argument("--legacy", action="store_true", help="Do not offer the finalize and batch endpoints")
+    parser.add_argument("--json_only", action="store_true", help="Answer event ranges in JSON only")
+    parser.add_argument("--unix_socket", help="Listen on this Unix domain socket instead of TCP")
+    parser.add_argument("--latency_ms", type=float, default=0, help="Delay added to every answer")
+    parser.add_argument("--jitter_ms", type=float, default=0, help="Extra uniform random delay")
+    parser.add_argument("--failure_rate", type=float, default=0, help="Share of requests answered with 503")
+    parser.add_argument("--drop_rate", type=float, default=0, help="Share of connections closed without answer")
+    parser.add_argument("--event_length", type=float, default=EVENT_LENGTH, help="Seconds per synthetic event")
+    parser.add_argument("--idle_ratio", type=float, default=0, help="Up to this share of each event is idle")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    state = MockState(finalize=not args.legacy, binary=not args.json_only, event_length=args.event_length,
+                      latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+                      failure_rate=args.failure_rate, drop_rate=args.drop_rate, idle_ratio=args.idle_ratio)
+    server = MockSundialServer(args.host, args.port, state, unix_socket=args.unix_socket)
+    logger.info(f"Mock server listening on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.httpd.server_close()
@@ -0,0 +1,249 @@
+import os
+import json
+import time
+import uuid
+import random
+import sqlite3
+import logging
+import threading
+from typing import List, Optional
+
+import requests
+
+from sd_pixel_engine.const import OUTBOX_FILE
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 20  # uploads per delivery round trip
+POLL_INTERVAL = 30  # seconds between delivery rounds when nothing wakes the worker
+RETRY_BASE = 5
+RETRY_CAP = 15 * 60
+MAX_AGE = 7 * 24 * 3600  # undelivered uploads older than this are dropped
+COMPACT_THRESHOLD = 500  # pending rows before obsolete entries are looked for
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    idempotency_key TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    captured_at REAL NOT NULL,
+    created_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL DEFAULT 0,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (next_attempt);
+"""
+
+
+def idempotency_key(user_id, created_at: str) -> str:
+    """Same slot, same key: a re-sent upload is recognisable by the server."""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"sundial:{user_id}:{created_at}"))
+
+
+class UploadOutbox:
+    """
+    Durable queue of slot uploads between the capture loop and the server.
+
+    The capture thread only inserts a row into a local SQLite file. A
+    background worker sends due rows, in batches when the server offers the
+    "batch" capability, and deletes a row only after the server accepted it,
+    so delivery is at-least-once across crashes and restarts. Every upload
+    carries an Idempotency-Key header so the server can drop the duplicates.
+
+    Uploads queued without an event id get it resolved from the event
+    timeline right before they are sent, the worker keeps that timeline
+    fresh so the capture thread can match slots without a round trip.
+    """
+
+    def __init__(self, user_id, server_url, client, event_timeline=None, path=None,
+                 batch_size=BATCH_SIZE, poll_interval=POLL_INTERVAL, max_age=MAX_AGE):
+        self.user_id = user_id
+        self.server_url = server_url
+        self.client = client
+        self.event_timeline = event_timeline
+        self.path = path or OUTBOX_FILE.format(user_id=user_id)
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_age = max_age
+        self.batch = False  # set when the server offers the batch endpoint
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._delivering = threading.Lock()  # worker and flush() never send the same rows twice
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.delivered = 0
+        self.failed_rounds = 0
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def enqueue(self, payload: dict, captured_at: float, delay: float = 0) -> str:
+        """
+        Persist one upload, returns its idempotency key. Never touches the
+        network. The first delivery attempt waits at least `delay` seconds.
+        """
+        key = idempotency_key(self.user_id, payload.get("created_at"))
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO outbox (idempotency_key, payload, captured_at, created_at, next_attempt) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, json.dumps(payload), captured_at, now, now + delay),
+            )
+        self._wake.set()
+        return key
+
+    def _due(self, now: float) -> List[tuple]:
+        with self._lock:
+            return self._db.execute(
+                "SELECT idempotency_key, payload, captured_at, attempts FROM outbox "
+                "WHERE next_attempt <= ? ORDER BY created_at LIMIT ?",
+                (now, self.batch_size),
+            ).fetchall()
+
+    def _resolve(self, payload: dict, captured_at: float) -> dict:
+        if payload.get("event_id") is None and self.event_timeline is not None:
+            payload["event_id"] = self.event_timeline.event_at(captured_at)
+        return payload
+
+    def _send(self, rows) -> List[str]:
+        """Deliver rows, returns the keys the server accepted."""
+        items = [(key, self._resolve(json.loads(payload), captured_at)) for key, payload, captured_at, _ in rows]
+
+        if self.batch and len(items) > 1:
+            response = self.client.post(self.server_url + "batch", json={
+                "items": [dict(payload, idempotency_key=key) for key, payload in items]
+            })
+            if response.status_code not in (404, 405):
+                response.raise_for_status() # Raise an exception for bad status codes
+                return response.json().get("accepted", [])
+            logger.warning("Server no longer offers batch uploads, sending one by one")
+            self.batch = False
+
+        accepted = []
+        for key, payload in items:
+            # Safe to retry, the key lets the server drop a duplicate
+            response = self.client.post(self.server_url, json=payload, headers={"Idempotency-Key": key})
+            response.raise_for_status() # Raise an exception for bad status codes
+            accepted.append(key)
+        return accepted
+
+    def _reschedule(self, rows, error: Exception):
+        now = time.time()
+        with self._lock:
+            for key, _, _, attempts in rows:
+                delay = random.uniform(RETRY_BASE, min(RETRY_CAP, RETRY_BASE * 2 ** attempts))
+                self._db.execute(
+                    "UPDATE outbox SET attempts = attempts + 1, next_attempt = ?, last_error = ? "
+                    "WHERE idempotency_key = ?",
+                    (now + delay, str(error)[:200], key),
+                )
+
+    def deliver_due(self, now: Optional[float] = None) -> int:
+        """Send everything that is due, returns how many uploads were accepted."""
+        with self._delivering:
+            delivered = self._deliver_due(now)
+        self.delivered += delivered
+        return delivered
+
+    def _deliver_due(self, now: Optional[float]) -> int:
+        delivered = 0
+        while True:
+            rows = self._due(time.time() if now is None else now)
+            if not rows:
+                break
+            try:
+                accepted = self._send(rows)
+            except (requests.exceptions.RequestException, ValueError) as e:
+                logger.warning(f"Upload delivery failed, {len(rows)} kept for retry: {e}")
+                self.failed_rounds += 1
+                self._reschedule(rows, e)
+                break
+
+            with self._lock:
+                self._db.executemany("DELETE FROM outbox WHERE idempotency_key = ?", [(k,) for k in accepted])
+            rejected = [row for row in rows if row[0] not in set(accepted)]
+            if rejected:
+                self._reschedule(rejected, RuntimeError("not accepted by server"))
+            delivered += len(accepted)
+            if not accepted:
+                break
+        return delivered
+
+    def compact(self, now: Optional[float] = None) -> int:
+        """
+        Drop entries that can no longer be delivered usefully: uploads past
+        max_age and uploads whose screenshot file is gone.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            rows = self._db.execute("SELECT idempotency_key, payload, created_at FROM outbox").fetchall()
+            obsolete = [
+                (key,) for key, payload, created_at in rows
+                if created_at < now - self.max_age
+                or not os.path.exists(json.loads(payload).get("file_location") or "")
+            ]
+            self._db.executemany("DELETE FROM outbox WHERE idempotency_key = ?", obsolete)
+            self._db.execute("PRAGMA incremental_vacuum")
+        if obsolete:
+            logger.info(f"Outbox compaction dropped {len(obsolete)} obsolete uploads")
+        return len(obsolete)
+
+    def flush(self, timeout: float) -> bool:
+        """Try to deliver everything now, returns True when the outbox is empty."""
+        deadline = time.monotonic() + timeout
+        with self.client.deadline(timeout):
+            while self.pending() and time.monotonic() < deadline:
+                try:
+                    if not self.deliver_due(now=float("inf")):
+                        break
+                except requests.exceptions.RequestException:
+                    break
+        return not self.pending()
+
+    def work_once(self):
+        """One worker round: refresh events, compact when needed, deliver what is due."""
+        if self.event_timeline is not None:
+            try:
+                self.event_timeline.refresh()
+            except (requests.exceptions.RequestException, ValueError) as e:
+                logger.info(f"Event timeline refresh failed: {e}")
+        try:
+            if self.pending() > COMPACT_THRESHOLD:
+                self.compact()
+            self.deliver_due()
+        except Exception as e:
+            logger.error(f"Outbox worker error: {e}")
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.work_once()
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def close(self):
+        self.stop()
+        with self._lock:
+            self._db.close()
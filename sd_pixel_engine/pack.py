@@ -0,0 +1,203 @@
+import os
+import mmap
+import struct
+import logging
+import argparse
+import threading
+from collections import namedtuple
+from datetime import datetime, timezone
+from typing import Dict, Iterator, Optional, Tuple
+
+from sd_pixel_engine.const import SCREENSHOT_PACK_FOLDER
+
+logger = logging.getLogger(__name__)
+
+FORMAT_PNG = 1
+FORMAT_OCR_PNG = 2
+FORMAT_SUFFIX = {FORMAT_PNG: ".png", FORMAT_OCR_PNG: "_ocr.png"}
+
+NO_EVENT_ID = -1
+
+# utc timestamp, offset, length, format, event_id
+INDEX_RECORD = struct.Struct("<dQIB3xq")
+
+PackRecord = namedtuple("PackRecord", ["timestamp", "offset", "length", "format", "event_id"])
+
+# What the engine reports for a final stored in a pack
+PackRef = namedtuple("PackRef", ["pack_path", "offset", "length"])
+
+
+def pack_path_for(user_id, captured_at: datetime, root=SCREENSHOT_PACK_FOLDER) -> str:
+    """<root>/<user>/<yyyy-mm-dd>.pack, dated by the UTC capture time."""
+    return os.path.join(root, str(user_id), captured_at.strftime("%Y-%m-%d") + ".pack")
+
+
+def _event_id_to_int(event_id) -> int:
+    try:
+        return int(event_id)
+    except (TypeError, ValueError):
+        return NO_EVENT_ID
+
+
+class DailyPack:
+    """
+    Append-only container holding one user's finals for one day.
+
+    Image bytes are appended to "<day>.pack" and every image gets a
+    fixed-width record in "<day>.idx". A record is only written after its
+    bytes are on disk, so a crash can leave unreferenced bytes at the end of
+    the pack but never a record pointing at missing data.
+    """
+
+    def __init__(self, pack_path: str):
+        self.pack_path = pack_path
+        self.index_path = os.path.splitext(pack_path)[0] + ".idx"
+        self._lock = threading.Lock()
+        self._records = []
+        self._lookup: Dict[Tuple[float, int], int] = {}
+        self._mm = None
+        self._mm_file = None
+
+        os.makedirs(os.path.dirname(pack_path), exist_ok=True)
+        self._pack = open(pack_path, "ab")
+        self._index = open(self.index_path, "ab")
+        self._load_index()
+
+    def _load_index(self):
+        with open(self.index_path, "rb") as f:
+            data = f.read()
+        usable = len(data) - len(data) % INDEX_RECORD.size
+        if usable != len(data):
+            logger.warning(f"Dropping torn index record in {self.index_path}")
+            self._index.truncate(usable)
+
+        for values in INDEX_RECORD.iter_unpack(data[:usable]):
+            self._add_record(PackRecord(*values))
+
+    def _add_record(self, record: PackRecord):
+        self._lookup[(record.timestamp, record.format)] = len(self._records)
+        self._records.append(record)
+
+    def __len__(self):
+        return len(self._records)
+
+    def append(self, timestamp: float, data: bytes, image_format=FORMAT_PNG, event_id=None) -> PackRecord:
+        with self._lock:
+            offset = self._pack.tell()
+            self._pack.write(data)
+            self._pack.flush()
+            os.fsync(self._pack.fileno())
+
+            record = PackRecord(timestamp, offset, len(data), image_format, _event_id_to_int(event_id))
+            self._index.write(INDEX_RECORD.pack(*record))
+            self._index.flush()
+            self._add_record(record)
+            return record
+
+    def append_file(self, timestamp: float, path: str, image_format=FORMAT_PNG, event_id=None) -> PackRecord:
+        with open(path, "rb") as f:
+            return self.append(timestamp, f.read(), image_format, event_id)
+
+    def record(self, number: int) -> PackRecord:
+        return self._records[number]
+
+    def lookup(self, timestamp: float, image_format=FORMAT_PNG) -> Optional[PackRecord]:
+        number = self._lookup.get((timestamp, image_format))
+        return None if number is None else self._records[number]
+
+    def records(self) -> Iterator[PackRecord]:
+        return iter(list(self._records))
+
+    def _mapping(self, end: int) -> mmap.mmap:
+        # The pack only grows, remap when a record lies past the current view
+        if self._mm is None or len(self._mm) < end:
+            self._close_mapping()
+            self._mm_file = open(self.pack_path, "rb")
+            self._mm = mmap.mmap(self._mm_file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mm
+
+    def read(self, record: PackRecord) -> memoryview:
+        """Zero-copy view of one image inside the pack."""
+        with self._lock:
+            mm = self._mapping(record.offset + record.length)
+            return memoryview(mm)[record.offset:record.offset + record.length]
+
+    def _close_mapping(self):
+        if self._mm is not None:
+            try:
+                self._mm.close()
+            except BufferError:
+                # Views handed out by read() are still alive, let GC close it
+                pass
+            self._mm_file.close()
+            self._mm = None
+            self._mm_file = None
+
+    def close(self):
+        with self._lock:
+            self._close_mapping()
+            self._pack.close()
+            self._index.close()
+
+
+class PackWriter:
+    """Route finals of one user into the pack of their capture day."""
+
+    def __init__(self, user_id, root=SCREENSHOT_PACK_FOLDER):
+        self.user_id = user_id
+        self.root = root
+        self.pack = None
+
+    def pack_for(self, captured_at: datetime) -> DailyPack:
+        pack_path = pack_path_for(self.user_id, captured_at, self.root)
+        if self.pack is None or self.pack.pack_path != pack_path:
+            if self.pack is not None:
+                self.pack.close()
+            self.pack = DailyPack(pack_path)
+        return self.pack
+
+    def write(self, captured_at: datetime, screenshot: bytes, screenshot_ocr: bytes,
+              event_id=None) -> PackRef:
+        """Append a final's PNG bytes and its OCR crop to the day pack, no loose files involved."""
+        pack = self.pack_for(captured_at)
+        timestamp = captured_at.timestamp()
+        record = pack.append(timestamp, screenshot, FORMAT_PNG, event_id)
+        pack.append(timestamp, screenshot_ocr, FORMAT_OCR_PNG, event_id)
+        return PackRef(os.path.abspath(pack.pack_path), record.offset, record.length)
+
+    def close(self):
+        if self.pack is not None:
+            self.pack.close()
+            self.pack = None
+
+
+def export_pack(pack_path: str, output_folder: str, user_id=None) -> int:
+    """Write every image of a pack back out as loose final PNG files."""
+    if user_id is None:
+        user_id = os.path.basename(os.path.dirname(os.path.abspath(pack_path)))
+    os.makedirs(output_folder, exist_ok=True)
+
+    pack = DailyPack(pack_path)
+    exported = 0
+    try:
+        for record in pack.records():
+            captured_at = datetime.fromtimestamp(record.timestamp, timezone.utc)
+            timestamp = captured_at.strftime("%Y-%m-%dT%H-%M-%S.%fZ")
+            filename = f"{user_id}_{timestamp}{FORMAT_SUFFIX.get(record.format, '.bin')}"
+            with open(os.path.join(output_folder, filename), "wb") as f:
+                f.write(pack.read(record))
+            exported += 1
+    finally:
+        pack.close()
+    return exported
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export a screenshot pack back to loose files")
+    parser.add_argument("pack_path", help="Path of the .pack file")
+    parser.add_argument("output_folder", help="Folder to write the PNG files to")
+    parser.add_argument("--user_id", default=None, help="User ID used in file names (default: pack folder name)")
+    args = parser.parse_args()
+
+    count = export_pack(args.pack_path, args.output_folder, args.user_id)
+    print(f"Exported {count} images to {args.output_folder}")
@@ -0,0 +1,214 @@
+import time
+import logging
+import argparse
+import tempfile
+from datetime import date, datetime, timedelta, timezone
+from typing import List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+HORIZON_DAYS = 14  # days of slots compiled at once
+SIMULATED_SERVER = "http://simulated.invalid/screenshot/"
+
+
+class SimulationEnd(BaseException):
+    """Raised by VirtualClock when simulated time passes its end, unwinds any engine loop."""
+
+
+class SystemClock:
+    """Real time. The engine reads every clock through this, so simulations can swap it."""
+
+    jumps = True  # the wall clock can jump (suspend, NTP), long waits poll it
+
+    def now(self) -> datetime:
+        return datetime.now()
+
+    def utcnow(self) -> datetime:
+        return datetime.now(timezone.utc)
+
+    def time(self) -> float:
+        return time.time()
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+    def sleep(self, seconds: float):
+        time.sleep(max(0.0, seconds))
+
+    def wait(self, event, timeout: float) -> bool:
+        return event.wait(max(0.0, timeout))
+
+
+class VirtualClock(SystemClock):
+    """
+    Simulated time that only moves when someone sleeps. Sleeping past `end`
+    raises SimulationEnd, which is how a fast-forwarded run stops.
+    """
+
+    jumps = False
+
+    def __init__(self, start: datetime, end: Optional[datetime] = None):
+        self.t = start.timestamp()
+        self.end = end.timestamp() if end is not None else None
+        self.slept = 0.0
+
+    def now(self) -> datetime:
+        return datetime.fromtimestamp(self.t)
+
+    def utcnow(self) -> datetime:
+        return datetime.fromtimestamp(self.t, timezone.utc)
+
+    def time(self) -> float:
+        return self.t
+
+    def monotonic(self) -> float:
+        return self.t
+
+    def sleep(self, seconds: float):
+        seconds = max(0.0, seconds)
+        self.t += seconds
+        self.slept += seconds
+        if self.end is not None and self.t >= self.end:
+            raise SimulationEnd()
+
+    def wait(self, event, timeout: float) -> bool:
+        if not event.is_set():
+            self.sleep(timeout)
+        return event.is_set()
+
+
+class ScheduleCalendar:
+    """
+    The slots of one schedule compiled into a sorted table of POSIX
+    timestamps, so the next slot is a binary search.
+
+    Window mode: slots at start + k * interval up to and including end, on
+    the allowed weekdays. A window whose end is not after its start crosses
+    midnight and belongs to the day it starts on.
+    Anchored mode (run_always): start + k * interval around the clock, the
+    grid restarts at every day's start and weekdays are not checked.
+
+    Every slot is shifted by phase_offset. The table covers HORIZON_DAYS and
+    is recompiled when a lookup falls outside it.
+    """
+
+    def __init__(self, start_time, end_time, interval: float, days, anchored=False,
+                 phase_offset=0.0, horizon_days=HORIZON_DAYS):
+        self.start_time = start_time
+        self.end_time = end_time
+        self.interval = interval
+        self.days = set(days)
+        self.anchored = anchored
+        self.phase_offset = phase_offset
+        self.horizon_days = horizon_days
+        self._slots = np.zeros(0, dtype=np.float64)
+        self._covers = (0.0, 0.0)
+        self.compiles = 0
+
+    def _day_slots(self, day: date) -> List[float]:
+        start = datetime.combine(day, self.start_time)
+        if self.anchored:
+            end = datetime.combine(day + timedelta(days=1), self.start_time) - timedelta(microseconds=1)
+        else:
+            if day.weekday() not in self.days:
+                return []
+            end = datetime.combine(day, self.end_time)
+            if end <= start:
+                end += timedelta(days=1)
+
+        slots = []
+        slot, k = start, 0
+        while slot <= end:
+            slots.append(slot.timestamp() + self.phase_offset)
+            k += 1
+            # Multiples of the interval, a repeated step would accumulate microsecond rounding
+            slot = start + timedelta(seconds=k * self.interval)
+        return slots
+
+    def compile(self, first_day: date, days: int):
+        slots = []
+        for offset in range(days):
+            slots.extend(self._day_slots(first_day + timedelta(days=offset)))
+        self._slots = np.array(slots, dtype=np.float64)
+        # The day before first_day may spill into it (cross-midnight, phase), start one day late
+        self._covers = (datetime.combine(first_day + timedelta(days=1), datetime.min.time()).timestamp(),
+                        datetime.combine(first_day + timedelta(days=days - 1), datetime.min.time()).timestamp())
+        self.compiles += 1
+
+    def slots(self) -> np.ndarray:
+        return self._slots
+
+    def next_slot(self, now: datetime) -> datetime:
+        """First slot strictly after now (naive local time)."""
+        timestamp = now.timestamp()
+        if not self._covers[0] <= timestamp < self._covers[1]:
+            self.compile(now.date() - timedelta(days=1), self.horizon_days + 1)
+
+        index = int(np.searchsorted(self._slots, timestamp, side="right"))
+        if index < len(self._slots):
+            return datetime.fromtimestamp(float(self._slots[index]))
+        # Nothing allowed within the horizon, look again at its end
+        return datetime.fromtimestamp(self._covers[1])
+
+
+def simulate(days=30, times_per_hour=7, start="08:00", end="17:00", weekdays="0,1,2,3,4",
+             anchored=False) -> dict:
+    """
+    Fast-forward one engine through `days` of virtual time against the mock
+    server, answered in process: every 30 second grab, slot and upload
+    runs, sleeps do not.
+    """
+    import os
+    os.environ.setdefault("LOCALAPPDATA", tempfile.mkdtemp(prefix="sd-simulate-"))
+    from sd_pixel_engine.utils import parse_time, parse_days
+    from sd_pixel_engine.screenshot import ScreenShot
+    from sd_pixel_engine.mock_server import InProcessAdapter, MockState
+    from sd_pixel_engine.loadgen import FakeCaptureSource
+
+    begin = datetime.combine(date.today(), datetime.min.time())
+    clock = VirtualClock(begin, begin + timedelta(days=days))
+    state = MockState(clock=clock.time)
+    screenshot = ScreenShot(SIMULATED_SERVER, "simulated", parse_time(start), parse_time(end), times_per_hour,
+                            parse_days(weekdays), staging="shared", clock=clock,
+                            capture_source=FakeCaptureSource(1, size=(36, 64)))
+    # The mock answers in process and there is no proxy to look up
+    screenshot.client.session.mount(SIMULATED_SERVER, InProcessAdapter(state))
+    screenshot.client.session.trust_env = False
+
+    grabs = [0]
+    take = screenshot._take_screenshot_30_seconds
+
+    def counted_take():
+        grabs[0] += 1
+        take()
+
+    screenshot._take_screenshot_30_seconds = counted_take
+    began = time.perf_counter()
+    try:
+        screenshot.run_always() if anchored else screenshot.run()
+    except SimulationEnd:
+        pass
+    elapsed = time.perf_counter() - began
+    uploads = len(state.uploads)
+    screenshot.shutdown()
+    return {
+        "simulated_days": days,
+        "wall_seconds": round(elapsed, 3),
+        "grabs": grabs[0],
+        "uploads": uploads,
+        "calendar_compiles": (screenshot.anchored_calendar if anchored else screenshot.calendar).compiles,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Fast-forward the engine through simulated days")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--times_per_hour", type=float, default=7)
+    parser.add_argument("--start_hour", default="08:00")
+    parser.add_argument("--end_hour", default="17:00")
+    parser.add_argument("--weekdays", default="0,1,2,3,4")
+    parser.add_argument("--anchored", action="store_true", help="run_always instead of the windowed run")
+    args = parser.parse_args()
+    print(simulate(args.days, args.times_per_hour, args.start_hour, args.end_hour, args.weekdays, args.anchored))
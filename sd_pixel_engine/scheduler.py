@@ -0,0 +1,161 @@
+import time
+import logging
+from collections import deque
+from typing import Callable, Optional
+
+from sd_pixel_engine.const import INTERVAL
+
+logger = logging.getLogger(__name__)
+
+LATE_POLICIES = ["catch-up", "skip"]
+MAX_SLEEP = 60  # seconds slept at once, so clock changes and resume are noticed
+LATENESS_HISTORY = 1000  # samples kept per metric
+
+
+def _summary(samples) -> dict:
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered), 3),
+        "p95": round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))], 3),
+        "max": round(ordered[-1], 3),
+    }
+
+
+class DriftFreeScheduler:
+    """
+    Absolute deadlines for the 30 second sampling ticks and slot boundaries.
+
+    Ticks sit on a fixed time.monotonic() grid, so the time spent grabbing
+    and encoding never pushes later ticks back. Slot boundaries are wall
+    clock instants (the schedule is in local time); the monotonic deadline
+    is re-derived from the wall target after every sleep chunk, which keeps
+    them right across suspend/resume and clock adjustments.
+
+    After a stall the late policy decides:
+      catch-up: run one missed tick right away, fire a late slot anyway
+      skip: drop missed ticks, skip a slot later than slot_grace seconds
+    Lateness of every tick and slot is kept as a metric.
+
+    With a trigger (triggers.CaptureTrigger) ticks leave the grid and run
+    when the trigger says so, waking early on its notifications. tick_interval
+    may change between ticks (adaptive.AdaptiveRate); with slot_tick a slot
+    that saw no tick runs one when it fires, so every slot has a grab.
+    """
+
+    def __init__(self, tick_interval=INTERVAL, late_policy="catch-up", slot_grace=INTERVAL,
+                 clock=time.monotonic, wall_clock=time.time, sleep=time.sleep, trigger=None,
+                 slot_tick=False):
+        if late_policy not in LATE_POLICIES:
+            raise ValueError(f"Unknown late policy: {late_policy}")
+        self.tick_interval = tick_interval
+        self.late_policy = late_policy
+        self.slot_grace = slot_grace
+        self.clock = clock
+        self.wall_clock = wall_clock
+        self.sleep = sleep
+        self.trigger = trigger
+        self.slot_tick = slot_tick
+
+        self._next_tick: Optional[float] = None
+        self.tick_lateness = deque(maxlen=LATENESS_HISTORY)
+        self.slot_lateness = deque(maxlen=LATENESS_HISTORY)
+        self.skipped_ticks = 0
+        self.skipped_slots = 0
+
+    def _monotonic_deadline(self, wall_target: float) -> float:
+        return self.clock() + (wall_target - self.wall_clock())
+
+    def _sleep_until(self, deadline: float, wall_target: Optional[float] = None):
+        """Sleep to a monotonic deadline, stopping early if the wall target comes first."""
+        while True:
+            if wall_target is not None:
+                deadline = min(deadline, self._monotonic_deadline(wall_target))
+            remaining = deadline - self.clock()
+            if remaining <= 0:
+                return
+            self.sleep(min(remaining, MAX_SLEEP))
+
+    def _advance_tick(self):
+        self._next_tick += self.tick_interval
+        behind = self.clock() - self._next_tick
+        if behind <= 0:
+            return
+        missed = int(behind // self.tick_interval) + 1
+        # catch-up keeps the most recent missed tick, it runs immediately
+        dropped = missed if self.late_policy == "skip" else missed - 1
+        self._next_tick += dropped * self.tick_interval
+        self.skipped_ticks += dropped
+        if dropped:
+            logger.info(f"Scheduler stalled {behind:.1f}s, dropped {dropped} ticks")
+
+    def _run_ticks(self, wall_target: float, on_tick: Callable[[], None]) -> int:
+        ticks = 0
+        while self._next_tick < self._monotonic_deadline(wall_target):
+            self._sleep_until(self._next_tick, wall_target)
+            now = self.clock()
+            if now < self._next_tick:
+                break  # the slot moved earlier (clock change), fire it first
+            self.tick_lateness.append(now - self._next_tick)
+            on_tick()
+            ticks += 1
+            self._advance_tick()
+        return ticks
+
+    def _run_triggered(self, wall_target: float, on_tick: Callable[[], None]) -> int:
+        ticks = 0
+        while True:
+            now = self.clock()
+            slot_deadline = self._monotonic_deadline(wall_target)
+            if now >= slot_deadline:
+                return ticks
+            due = self.trigger.next_grab(now)
+            if due <= now:
+                self.tick_lateness.append(now - due)
+                self.trigger.grabbed(now)
+                on_tick()
+                ticks += 1
+                continue
+            self.trigger.wait(min(due, slot_deadline, now + MAX_SLEEP) - now)
+
+    def wait_until(self, wall_target: float, on_tick: Callable[[], None]) -> Optional[float]:
+        """
+        Run on_tick on the tick grid until wall_target (POSIX seconds).
+
+        Returns how late the slot fires in seconds, or None when the skip
+        policy drops a slot that is too late.
+        """
+        if self._next_tick is None:
+            self._next_tick = self.clock()
+
+        if self.trigger is not None:
+            ticks = self._run_triggered(wall_target, on_tick)
+        else:
+            ticks = self._run_ticks(wall_target, on_tick)
+
+        self._sleep_until(self._monotonic_deadline(wall_target), wall_target)
+        lateness = max(0.0, self.wall_clock() - wall_target)
+        self.slot_lateness.append(lateness)
+        if self.late_policy == "skip" and lateness > self.slot_grace:
+            self.skipped_slots += 1
+            logger.warning(f"Slot {lateness:.1f}s late, skipping it")
+            return None
+        if self.slot_tick and not ticks:
+            on_tick()
+        return lateness
+
+    def reset(self):
+        """Start a new tick grid on the next wait, after hibernation."""
+        self._next_tick = None
+
+    def stats(self) -> dict:
+        return {
+            "policy": self.late_policy,
+            "tick_lateness": _summary(self.tick_lateness),
+            "slot_lateness": _summary(self.slot_lateness),
+            "skipped_ticks": self.skipped_ticks,
+            "skipped_slots": self.skipped_slots,
+            "trigger": None if self.trigger is None else self.trigger.stats(),
+        }
@@ -1,18 +1,32 @@
+import gc
 import logging
 import os
-import json
-import shutil
-from pathlib import Path
-from glob import glob
-from time import sleep as time_sleep
+import random
 from datetime import datetime, time, timedelta, timezone
 
 import requests
 from PIL import Image
 
-from sd_pixel_engine.utils import get_image_name_to_utc, add_second_to_utc, stop_process_by_exe
-from sd_pixel_engine.const import INTERVAL, SCREENSHOT_FOLDER, SCREENSHOT_FOLDER_USER
-from sd_pixel_engine.capture_window import crop_black_background, capture_screenshots
+from sd_pixel_engine.utils import add_second_to_utc, slot_phase_offset
+from sd_pixel_engine.const import INTERVAL, SLOT_NETWORK_DEADLINE
+from sd_pixel_engine.capture_window import grab_desktop, shrink_png
+from sd_pixel_engine.staging import create_staging
+from sd_pixel_engine.selection import CandidateSelector
+from sd_pixel_engine.http_client import SundialClient
+from sd_pixel_engine.event_cache import EventTimeline, utc_to_epoch, epoch_to_utc
+from sd_pixel_engine.window_timeline import WindowTimeline, WindowSampler, SampledDwell
+from sd_pixel_engine.layout import ScreenshotLayout, parse_final_name
+from sd_pixel_engine.pack import PackRef, PackWriter
+from sd_pixel_engine.outbox import UploadOutbox
+from sd_pixel_engine.scheduler import DriftFreeScheduler
+from sd_pixel_engine.triggers import MIN_SPACING, CaptureTrigger, WinEventSource
+from sd_pixel_engine.adaptive import AdaptiveRate, CpuLoad, slot_max_interval
+from sd_pixel_engine.activity import ActivityGate, IDLE_THRESHOLD
+from sd_pixel_engine.hibernation import wake_signal, SHUTDOWN_TIMEOUT
+from sd_pixel_engine.stream_upload import EncodedScreenshot, StreamUploader, upload_id
+from sd_pixel_engine.schedule import ScheduleCalendar, SystemClock
+from sd_pixel_engine.capture_worker import CaptureWorker
+from sd_pixel_engine.frame_feed import FrameFeed, FEED_NAME, SAMPLED, SELECTED
 
 os.environ.pop('HTTP_PROXY', None)
 os.environ.pop('HTTPS_PROXY', None)
@@ -22,13 +36,73 @@ logger = logging.getLogger(__name__)
 class ScreenShot:
     def __init__(self, server_url, user_id, start_time=time(0, 0), 
                  end_time=time(23, 59), times_per_hour=1, 
-                 days=[0,1,2,3,4], is_idle_screenshot=False):
+                 days=[0,1,2,3,4], is_idle_screenshot=False, staging="png",
+                 layout="flat", pack_finals=False, top_k=0, window_sampling=False,
+                 outbox=False, upload_mode="path", stream_rate_limit=0, capture_source=None,
+                 desync_slots=False, upload_jitter=0, late_policy="catch-up", capture_triggers=False,
+                 adaptive_rate=False, activity_gate=False, idle_threshold=IDLE_THRESHOLD,
+                 frame_pool=None, clock=None, capture_worker=False, frame_feed="off", feed_only=False,
+                 trigger_source=None, window_source=None):
         """
         server_url: URL to POST screenshots
         start_time, end_time: datetime.time objects (default 8:00 AM - 5:00 PM)
         times_per_hour: number of screenshots per hour (default 7)
         days: allowed weekdays (0=Mon, ..., 4=Fri by default)
+        staging: where 30 second grabs wait for the slot ("png", "ring", "ring-lz4"
+            or "shared", in memory and by reference in frame_pool)
+        layout: where final screenshots are written ("flat" or "sharded")
+        pack_finals: append finals to a daily pack file instead of loose PNGs
+        top_k: keep only this many candidate frames staged per slot (0 = keep all)
+        window_sampling: record foreground window changes every second and pick
+            the slot's frame and event interval locally
+        window_source: replaces the Windows foreground query of window_sampling,
+            returns the foreground window dict or None
+        outbox: queue uploads in a durable local outbox delivered by a
+            background worker, the capture loop never waits on the server
+        upload_mode: "path" sends the final's local path, "stream" sends the
+            encoded bytes from memory to a remote ingest server
+        stream_rate_limit: bytes per second for stream uploads (0 = unlimited)
+        capture_source: replaces the desktop grab, returns (frame, rect, window)
+        desync_slots: shift this user's slots by a fixed offset hashed from
+            user_id (within one interval), so machines do not fire together
+        upload_jitter: up to this many random seconds between the slot's
+            capture time and its upload
+        late_policy: after a stall, run missed work once ("catch-up") or
+            drop missed ticks and late slots ("skip")
+        capture_triggers: grab on foreground window changes and input activity
+            (debounced, with a periodic fallback) instead of every 30 seconds
+        trigger_source: replaces the WinEvent hooks as the notification
+            source of capture_triggers (triggers.FakeTriggerSource off Windows)
+        adaptive_rate: stretch the 30 second grab interval up to several
+            minutes for still screens or a busy CPU, shorten it for rapidly
+            changing content; every slot still gets at least one grab
+        activity_gate: skip grabs while the workstation is locked, the user
+            has been idle for idle_threshold seconds or the screen is blank;
+            a slot that staged nothing grabs once for its idle screenshot
+        frame_pool: staging.FramePool shared with other profiles of one engine
+        clock: schedule.SystemClock or a VirtualClock that fast-forwards sleeps
+        capture_worker: grab and encode in a supervised child process that hands
+            frames over in shared memory and is restarted on crashes and leaks;
+            capture_source then runs inside the worker and must be picklable
+        frame_feed: publish each slot's selected frame ("selected") or also every
+            sampled grab ("all") into the shared memory feed FEED_NAME, for
+            local consumers reading pixels in place; needs in-memory staging
+        feed_only: do not write the selected frame as PNG, the upload points
+            at its feed sequence number (shm://<feed>/<seq>) instead. The feed
+            is the only copy and keeps the last FEED_SLOTS finals (one per
+            slot), so consumers must read within that many slots; not with
+            frame_feed "all", where sampled grabs would overwrite it in minutes
         """
+        if upload_mode == "stream" and (outbox or pack_finals):
+            raise ValueError("Stream uploads keep no local copy, they cannot be combined with outbox or pack_finals")
+        if frame_feed != "off" and staging == "png":
+            raise ValueError("The frame feed publishes staged pixels, it needs ring, ring-lz4 or shared staging")
+        if feed_only and (frame_feed == "off" or outbox or pack_finals or upload_mode == "stream"):
+            raise ValueError("feed_only needs a frame feed and path uploads without outbox or pack_finals")
+        if feed_only and frame_feed == "all":
+            raise ValueError("feed_only keeps finals only in the feed, sampled grabs would overwrite them; "
+                             "use frame_feed selected")
+
         self.user_id = user_id
         self.start_time = start_time
         self.end_time = end_time
@@ -37,37 +111,61 @@ class ScreenShot:
         self.days = days
         self.is_idle_screenshot = is_idle_screenshot
         self.interval = 3600 / times_per_hour  # seconds between screenshots
+        self.phase_offset = slot_phase_offset(user_id, self.interval) if desync_slots else 0.0
+        self.clock = clock or SystemClock()
+        self.calendar = ScheduleCalendar(start_time, end_time, self.interval, days, phase_offset=self.phase_offset)
+        self.anchored_calendar = ScheduleCalendar(start_time, end_time, self.interval, days, anchored=True,
+                                                  phase_offset=self.phase_offset)
+        self.upload_jitter = upload_jitter
+        self.capture_trigger = (CaptureTrigger(clock=self.clock.monotonic, wait=self.clock.wait)
+                                if capture_triggers else None)
+        self.trigger_source = (trigger_source or WinEventSource()) if capture_triggers else None
+        self.rate = (AdaptiveRate(max_interval=slot_max_interval(self.interval), cpu_load=CpuLoad())
+                     if adaptive_rate else None)
+        self.scheduler = DriftFreeScheduler(INTERVAL, late_policy, clock=self.clock.monotonic,
+                                            wall_clock=self.clock.time, sleep=self.clock.sleep,
+                                            trigger=self.capture_trigger, slot_tick=adaptive_rate)
+        self.worker = CaptureWorker(capture_source) if capture_worker else None
+        grab = self.worker or capture_source
+        self.activity = ActivityGate(grab or grab_desktop, idle_threshold) if activity_gate else None
+        # Triggered and adaptive grabs come closer than INTERVAL, staging holds up to MAX_STAGED_FRAMES of them
+        min_spacing = INTERVAL
+        if capture_triggers:
+            min_spacing = min(min_spacing, MIN_SPACING)
+        if self.rate:
+            min_spacing = min(min_spacing, self.rate.min_interval)
+        self.staging = create_staging(staging, user_id, times_per_hour, top_k, self.activity or grab,
+                                      frame_pool, self.worker, min_spacing=min_spacing)
+        self.window_timeline = WindowTimeline() if window_sampling else None
+        self.window_sampler = (WindowSampler(self.window_timeline, window_source, clock=self.clock.time)
+                               if window_sampling else None)
+        dwell = SampledDwell(self.window_timeline, clock=self.clock.time) if window_sampling else None
+        self.selector = CandidateSelector(top_k, dwell) if top_k > 0 else None
+        self.client = SundialClient()
+        # With the outbox the worker refreshes events, slot matching stays local
+        self.event_timeline = EventTimeline(self.server_url, post=self.client.post, fetch_on_query=not outbox)
+        self.capabilities = set()
+        self.layout = ScreenshotLayout(layout)
+        self.pack_writer = PackWriter(user_id) if pack_finals else None
+        self.outbox = UploadOutbox(user_id, self.server_url, self.client, self.event_timeline) if outbox else None
+        self.stream_uploader = None
+        if upload_mode == "stream":
+            self.stream_uploader = StreamUploader(self.client, self.server_url, rate_limit=stream_rate_limit or None)
+        self.feed = FrameFeed(FEED_NAME.format(user_id=user_id)) if frame_feed != "off" else None
+        self.feed_all = frame_feed == "all"
+        self.feed_only = feed_only
 
     
     def _next_run_datetime(self, now: datetime) -> datetime:
         """
         Always returns the next valid execution datetime,
         correctly handling cross-midnight schedules forever.
-        """
-
-        interval = timedelta(seconds=self.interval)
-
-        today_start = datetime.combine(now.date(), self.start_time)
-        today_end = datetime.combine(now.date(), self.end_time)
 
-        # Handle cross-midnight window
-        if today_end <= today_start:
-            today_end += timedelta(days=1)
-
-        # If before start → first slot
-        if now < today_start:
-            return today_start
-
-        # If within window → next aligned slot
-        if today_start <= now <= today_end:
-            elapsed = (now - today_start).total_seconds()
-            slots_passed = int(elapsed // self.interval) + 1
-            return today_start + slots_passed * interval
+        Slots keep their nominal times and count, they only fire
+        phase_offset seconds later. A lookup in the compiled calendar.
+        """
+        return self.calendar.next_slot(now)
 
-        # After window → next day's first slot
-        next_day = now.date() + timedelta(days=1)
-        return datetime.combine(next_day, self.start_time)
-    
     def _is_within_time_window(self, now: time) -> bool:
         if self.end_time > self.start_time:
             return self.start_time <= now <= self.end_time
@@ -75,92 +173,183 @@ class ScreenShot:
             # Cross-midnight window
             return now >= self.start_time or now <= self.end_time
         
+    def _in_schedule(self, now: datetime) -> bool:
+        """Whether now (naive local, nominal slot time) is inside an allowed day's window."""
+        schedule_day = now.date()
+        if self.end_time <= self.start_time and now.time() <= self.end_time:
+            schedule_day -= timedelta(days=1)
+        return schedule_day.weekday() in self.days and self._is_within_time_window(now.time())
+
+    def _start_window_sampling(self):
+        if self.window_sampler:
+            self.window_sampler.start()
+        if self.trigger_source:
+            self.trigger_source.start(self.capture_trigger)
+
     def run(self):
         logger.info("Screenshot scheduler started (cross-midnight safe)")        
+        self._start_window_sampling()
+        self.negotiate_capabilities()
 
         while True:
-            now = datetime.now()
-
-            # Determine schedule day (cross-midnight safe)
-            schedule_day = now.date()
-            if self.end_time <= self.start_time and now.time() <= self.end_time:
-                schedule_day -= timedelta(days=1)
-
-            if schedule_day.weekday() not in self.days:
-                logger.info("Schedule day not allowed. Sleeping until next day.")
-                stop_process_by_exe("sd-pixel-engine.exe")
-                break                
-
-            next_run = self._next_run_datetime(now)
-            logger.info(f"next run => {next_run}")
-            sleep_seconds = (next_run - now).total_seconds()
-
-            while sleep_seconds > 0:
-                self._take_screenshot_30_seconds()
-                # sleep 30s or remaining time (whichever is smaller)
-                sleep_chunk = min(INTERVAL, sleep_seconds)                
-                time_sleep(sleep_chunk)
-                sleep_seconds -= sleep_chunk                
+            next_run, wake_at, reason = self._plan_next(self.clock.now())
+            if wake_at is not None:
+                self.hibernate(wake_at, reason)
+                continue
+
+            # next_run is naive local time, timestamp() reads it as such
+            lateness = self.scheduler.wait_until(next_run.timestamp(), self._take_screenshot_30_seconds)
+            logger.info(f"scheduler => {self.scheduler.stats()}")
+            if self.rate:
+                logger.info(f"sampling => {self.rate.stats()}")
+            if lateness is None or self._woke_from_long_sleep():
+                continue
 
             self._scheduled_job()   
 
-    def _sleep_until_next_day(self):
-        tomorrow = datetime.combine(
-            datetime.now().date() + timedelta(days=1),
-            time(0, 0)
-        )
-        time_sleep((tomorrow - datetime.now()).total_seconds())
-    
+    def _plan_next(self, now: datetime):
+        """
+        What the windowed loop does next: (next_run, None, None) to wait for
+        the next slot, or (None, wake_at, reason) to hibernate until wake_at.
+        """
+        # Determine schedule day (cross-midnight safe)
+        schedule_day = now.date()
+        if self.end_time <= self.start_time and now.time() <= self.end_time:
+            schedule_day -= timedelta(days=1)
+
+        if schedule_day.weekday() not in self.days:
+            logger.info("Schedule day not allowed. Sleeping until next day.")
+            wake_at = self._next_allowed_start(schedule_day) - timedelta(seconds=INTERVAL)
+            return None, wake_at, "schedule day not allowed"
+
+        next_run = self._next_run_datetime(now)
+        logger.info(f"next run => {next_run}")
+
+        # Wake one grab before the window opens, so its first slot has a frame
+        wake_at = next_run - timedelta(seconds=INTERVAL)
+        slot_now = now - timedelta(seconds=self.phase_offset)
+        # Right after the window's last slot the clock can still read end_time
+        window_closed = next_run - now > timedelta(seconds=self.interval + INTERVAL)
+        if (window_closed or not self._is_within_time_window(slot_now.time())) and wake_at > now:
+            return None, wake_at, "outside schedule window"
+        return next_run, None, None
+
+    def _next_allowed_start(self, schedule_day) -> datetime:
+        """Start of the first allowed schedule day after schedule_day."""
+        for offset in range(1, 8):
+            day = schedule_day + timedelta(days=offset)
+            if day.weekday() in self.days:
+                return datetime.combine(day, self.start_time)
+        # No allowed day at all, look again tomorrow
+        return datetime.combine(schedule_day + timedelta(days=1), self.start_time)
+
+    def _release_resources(self):
+        """Drop what a long wait does not need: staged frames, the ring mapping, cached events, sockets."""
+        if self.window_sampler:
+            self.window_sampler.stop()
+        if self.trigger_source:
+            # Hooks and the input poll restart with the window sampler
+            self.trigger_source.stop()
+            self.capture_trigger.reset()
+        self._finish_slot()
+        self.staging.close()
+        if self.pack_writer:
+            self.pack_writer.close()
+        self.event_timeline.clear()
+        self.client.close()
+        if self.worker:
+            # Hands back its memory and GDI handles, the next grab starts a fresh one
+            self.worker.stop()
+        self.scheduler.reset()
+        gc.collect()
+
+    def hibernate(self, until: datetime, reason: str):
+        """
+        Stay resident but idle until `until` (naive local time) or a resume
+        from suspend, instead of killing the process and cold starting it.
+        The outbox worker keeps delivering in the background.
+        """
+        logger.info(f"Hibernating until {until} ({reason})")
+        self._release_resources()
+        woken = wake_signal.sleep_until(until.timestamp(), self.clock)
+        logger.info(f"Hibernation ended => {'resume' if woken else 'scheduled'}")
+        wake_signal.take_long_sleep()  # nothing staged from before the sleep
+        self._start_window_sampling()
+
+    def _woke_from_long_sleep(self) -> bool:
+        if not wake_signal.take_long_sleep():
+            return False
+        logger.info("Resumed after a long sleep, dropping the frames staged before it")
+        self._release_resources()
+        self._start_window_sampling()
+        return True
+
+    def shutdown(self, timeout=SHUTDOWN_TIMEOUT):
+        """Graceful termination: stop background threads, deliver the outbox, close staging and packs."""
+        logger.info("Screenshot engine shutting down")
+        if self.window_sampler:
+            self.window_sampler.stop()
+        if self.trigger_source:
+            self.trigger_source.stop()
+        if self.outbox:
+            if not self.outbox.flush(timeout):
+                logger.warning(f"{self.outbox.pending()} uploads stay queued in the outbox for the next start")
+            self.outbox.close()
+        if self.pack_writer:
+            self.pack_writer.close()
+        self.staging.close()
+        if self.worker:
+            self.worker.stop()
+        if self.feed:
+            self.feed.close()
+        self.client.close()
+
     # 2026-01-13 06:58:16.823000+00:00 UTC Time
     # 2026-01-13T06-58-16.823000Z.png
-    def _take_screenshot_30_seconds(self, screenshot_folder=None):
-        
-        if screenshot_folder is None:
-            screenshot_folder = SCREENSHOT_FOLDER_USER.format(user_id=self.user_id)
-
-        os.makedirs(screenshot_folder, exist_ok=True)
-
+    def _take_screenshot_30_seconds(self):
         try:
-            utc_now = datetime.now(timezone.utc)
-            timestamp = utc_now.strftime("%Y-%m-%dT%H-%M-%S.%fZ")
-            output_file = os.path.join(
-                screenshot_folder,
-                f"{self.user_id}_{timestamp}.png"
-            )
-
-            output_file_ocr = os.path.join(
-                screenshot_folder,
-                f"{self.user_id}_{timestamp}_ocr.png"
-            )           
-            # capture_active_window_screenshot(output_file)
-            # capture_fullscreen(output_file, output_file_ocr)
-            capture_screenshots(output_file, output_file_ocr)
-
+            utc_now = self.clock.utcnow()
+            captured = self.staging.capture(utc_now)
+            if captured and self.feed_all:
+                self.feed.publish(captured.frame, captured.rect, utc_now.timestamp(), kind=SAMPLED)
+            if captured and self.selector:
+                for staged in self.selector.add(captured, utc_now.timestamp()):
+                    self.staging.discard(staged)
+            if self.rate:
+                self._adapt_rate(captured)
         except Exception as e:
             logger.error(f"MSS screenshot capture failed: {e}")
 
+    def _adapt_rate(self, captured):
+        previous = self.rate.interval
+        interval = self.rate.observe(captured.frame if captured else None, captured.window if captured else None)
+        self.scheduler.tick_interval = interval
+        if interval != previous:
+            logger.info(f"sampling interval => {interval:.0f}s ({self.rate.reason})")
+
            
+    def _slot_outside_window(self) -> bool:
+        # The nominal slot time decides, a phase offset may push past end_time
+        slot_time = self.clock.now() - timedelta(seconds=self.phase_offset)
+        now_time = slot_time.time().replace(second=0, microsecond=0)
+        if self._is_within_time_window(now_time):
+            return False
+        # run() hibernates until the window opens again
+        logger.warning(f"Job triggered outside of schedule time: {now_time}")
+        return True
+
     def _scheduled_job(self):
         try:           
-            now_time = datetime.now().time().replace(second=0, microsecond=0)
-            if not self._is_within_time_window(now_time):
-                logger.warning(f"Job triggered outside of schedule time: {now_time}")
-                stop_process_by_exe("sd-pixel-engine.exe")
+            if self._slot_outside_window():
+                self._finish_slot()
                 return
            
             logger.info("Scheduled screenshot triggered")
-            capture_time =  datetime.now(timezone.utc)
+            capture_time = self.clock.utcnow()
+            self._sleep_upload_jitter()
 
-            screenshot_path, event_id = self.get_image_path_and_event_id()
-            payload = {
-                'file_location': screenshot_path,
-                'is_idle_screenshot': self.is_idle_screenshot,
-                'created_at': capture_time.isoformat(),
-                'event_id': event_id
-            }          
-
-            response = requests.post(self.server_url, json=payload)
-            response.raise_for_status() # Raise an exception for bad status codes
+            with self.client.deadline(SLOT_NETWORK_DEADLINE):
+                self._finalize_slot(capture_time)
 
         except requests.exceptions.RequestException as req_e:
             logger.error(f"Error during API request: {req_e}")
@@ -168,19 +357,203 @@ class ScreenShot:
             logger.error(f"Error in scheduled job: {e}")
 
 
-    def get_image_path_and_event_id(self):
-        screenshot_folder_user = SCREENSHOT_FOLDER_USER.format(user_id=self.user_id)
-        filename_list = glob(os.path.join(screenshot_folder_user, "*.png"))
+    def _upload_delay(self) -> float:
+        return random.uniform(0, self.upload_jitter) if self.upload_jitter > 0 else 0.0
 
-        filtered_files = [f for f in filename_list if not f.endswith("_ocr.png")]
+    def _sleep_upload_jitter(self):
+        """Spread uploads of one slot across the fleet, the outbox delays its own delivery."""
+        if not self.outbox:
+            delay = self._upload_delay()
+            if delay:
+                self.clock.sleep(delay)
 
-        filename_list_tmp = sorted(filtered_files, reverse=False)
-        if len(filename_list_tmp) == 1: 
-            start_time = get_image_name_to_utc(filename_list_tmp[0])
-            end_time = get_image_name_to_utc(filename_list_tmp[0])
-        else:
-            start_time = get_image_name_to_utc(filename_list_tmp[0])
-            end_time = get_image_name_to_utc(filename_list_tmp[-1])
+    def negotiate_capabilities(self, start_outbox=True):
+        """
+        Ask the server once which protocol extensions it supports. Callers
+        that drive outbox.work_once() themselves pass start_outbox=False.
+        """
+        try:
+            response = self.client.get(self.server_url + "capabilities")
+            if response.status_code == 200:
+                self.capabilities = set(response.json().get("capabilities", []))
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.info(f"Capability negotiation failed, using two-call protocol: {e}")
+        logger.info(f"server capabilities => {sorted(self.capabilities)}")
+        if self.outbox:
+            self.outbox.batch = "batch" in self.capabilities
+            if start_outbox:
+                self.outbox.start()
+        if self.stream_uploader and "stream" not in self.capabilities:
+            logger.warning("Server does not advertise stream uploads, trying anyway")
+
+    def _ensure_slot_frame(self):
+        """Grabs were paused for the whole slot, take its idle screenshot now."""
+        logger.info(f"activity => {self.activity.stats()}")
+        if not self.staging.frames():
+            logger.info("Nothing staged while inactive, grabbing the slot's idle screenshot")
+            with self.activity.force():
+                self._take_screenshot_30_seconds()
+
+    def _finalize_slot(self, capture_time):
+        """Pick the slot's screenshot and event and hand it to the server."""
+        if self.activity:
+            self._ensure_slot_frame()
+        if self.outbox:
+            return self._enqueue_slot(capture_time)
+
+        # Pack offsets are only known after writing and streamed or feed-only
+        # finals have no path to offer, so they stay on the two-call flow
+        if "finalize" in self.capabilities and not (self.pack_writer or self.stream_uploader or self.feed_only):
+            try:
+                return self._finalize_combined(capture_time)
+            except requests.exceptions.HTTPError as http_e:
+                if http_e.response is None or http_e.response.status_code not in (404, 405):
+                    raise
+                logger.warning("Server no longer offers finalize, falling back to two calls")
+                self.capabilities.discard("finalize")
+
+        self._upload_slot(capture_time)
+
+    def _upload_slot(self, capture_time):
+        """Two-call flow: pick the frame and event from the event range, write it, then upload."""
+        screenshot_path, event_id = self.get_image_path_and_event_id()
+        self._send_slot(screenshot_path, event_id, capture_time)
+
+    def _prepare_slot(self, capture_time):
+        """
+        Staging half of a slot, for callers that upload on their own
+        (async_engine): pick and write the final, or queue it in the outbox.
+        Returns (screenshot_path, event_id) for _send_slot, None when
+        nothing is left to send. Always the two-call flow, the combined
+        finalize needs the server's answer before the write.
+        """
+        if self.activity:
+            self._ensure_slot_frame()
+        if not self.staging.frames():
+            logger.warning("Nothing staged for this slot, skipping it")
+            return None
+        if self.outbox:
+            self._enqueue_slot(capture_time)
+            return None
+        return self.get_image_path_and_event_id()
+
+    def _send_slot(self, screenshot_path, event_id, capture_time):
+        """Network half of the two-call flow: upload or stream a written final."""
+        if isinstance(screenshot_path, EncodedScreenshot):
+            return self._stream_slot(screenshot_path, event_id, capture_time)
+        payload = self._build_payload(screenshot_path, event_id, capture_time)
+
+        response = self.client.post(self.server_url, json=payload, idempotent=False)
+        response.raise_for_status() # Raise an exception for bad status codes
+
+    def _stream_slot(self, encoded: EncodedScreenshot, event_id, capture_time):
+        metadata = {
+            'file_name': encoded.name + ".png",
+            'is_idle_screenshot': self.is_idle_screenshot,
+            'created_at': capture_time.isoformat(),
+            'event_id': event_id
+        }
+        self.stream_uploader.upload(upload_id(self.user_id, encoded.name),
+                                    {"screenshot": encoded.screenshot, "ocr": encoded.ocr}, metadata)
+        logger.info(f"streamed {encoded.name} => {len(encoded.screenshot) + len(encoded.ocr)} bytes")
+
+    def _enqueue_slot(self, capture_time):
+        """
+        Outbox flow: match the slot against the locally cached events and
+        queue the upload. A missing event id is resolved at delivery time.
+        """
+        _, end_time = self._slot_time_range(self.staging.frames())
+        slot_end = utc_to_epoch(end_time)
+        stale = not self.event_timeline.covers(slot_end, slot_end)
+
+        screenshot_path, event_id = self.get_image_path_and_event_id()
+        if stale:
+            # Cached events end before the slot, let the worker pick the event
+            event_id = None
+        payload = self._build_payload(screenshot_path, event_id, capture_time)
+
+        parsed = parse_final_name(payload['file_location'])
+        captured_at = parsed[1] if parsed else capture_time
+        key = self.outbox.enqueue(payload, captured_at.timestamp(), delay=self._upload_delay())
+        logger.info(f"upload queued => {key}, {self.outbox.pending()} pending")
+
+    def _finalize_combined(self, capture_time):
+        """
+        Send every candidate with the path it will be written to, the server
+        picks the event and frame and holds the upload; write that frame and
+        confirm it. Nothing is recorded before the confirm: a failed write
+        aborts the upload, and a choice matching no staged frame aborts it
+        and falls back to the two-call flow.
+        """
+        staged_frames = self.staging.frames()
+        start_time, end_time = self._slot_time_range(staged_frames)
+
+        payload = {
+            'start_time': start_time,
+            'end_time': end_time,
+            'is_idle_screenshot': self.is_idle_screenshot,
+            'created_at': capture_time.isoformat(),
+            'candidates': [
+                {'timestamp': staged.utc_time, 'file_location': self.layout.resolve(staged.name + ".png")}
+                for staged in staged_frames
+            ],
+        }
+        response = self.client.post(self.server_url + "finalize", json=payload, idempotent=False)
+        response.raise_for_status() # Raise an exception for bad status codes
+        result = response.json()
+        upload = result.get('upload_id')
+
+        tmp_file = next((f for f in staged_frames if f.utc_time == result.get('timestamp')), None)
+        if tmp_file is None:
+            logger.warning(f"finalize chose no staged frame => {result}, falling back to two calls")
+            self._abort_finalize(upload)
+            return self._upload_slot(capture_time)
+
+        try:
+            screenshot_path = self.move_image_file(tmp_file, result.get('event_id'))
+        except Exception:
+            self._abort_finalize(upload)
+            raise
+        response = self.client.post(self.server_url + f"finalize/{upload}/confirm",
+                                    json={'file_location': screenshot_path})
+        response.raise_for_status() # Raise an exception for bad status codes
+        logger.info(f"finalized => {result}")
+        self._finish_slot()
+
+    def _abort_finalize(self, upload):
+        """Best effort, the server also drops uploads that are never confirmed."""
+        if upload is None:
+            return
+        try:
+            self.client.post(self.server_url + f"finalize/{upload}/abort", json={}).raise_for_status()
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"finalize abort failed for {upload}: {e}")
+
+    def _slot_time_range(self, staged_frames):
+        start_time = staged_frames[0].utc_time
+        end_time = staged_frames[-1].utc_time
+        if self.selector and self.selector.slot_start:
+            # Evicted candidates still belong to the slot's time range
+            start_time = min(start_time, self.selector.slot_start)
+        return start_time, end_time
+
+    def _build_payload(self, screenshot_path, event_id, capture_time):
+        payload = {
+            'file_location': screenshot_path,
+            'is_idle_screenshot': self.is_idle_screenshot,
+            'created_at': capture_time.isoformat(),
+            'event_id': event_id
+        }
+        if isinstance(screenshot_path, PackRef):
+            # The final lives inside a day pack, point at its byte range
+            payload['file_location'] = screenshot_path.pack_path
+            payload['pack_offset'] = screenshot_path.offset
+            payload['pack_length'] = screenshot_path.length
+        return payload
+
+    def get_image_path_and_event_id(self):
+        staged_frames = self.staging.frames()
+        start_time, end_time = self._slot_time_range(staged_frames)
 
         payload = {
             'start_time': start_time,
@@ -188,19 +561,22 @@ class ScreenShot:
         }
 
         logger.info(f"screenshot time range => {payload}")
-        response = requests.post(self.server_url + "get_event_time_range", json=payload)
-        response.raise_for_status() # Raise an exception for bad status codes
-        
-        response_result_tmp = response.json()      
-        response_result = json.loads(response_result_tmp["result"])
-      
-        if not os.path.isdir(SCREENSHOT_FOLDER):
-            os.makedirs(SCREENSHOT_FOLDER)
+
+        if self.window_timeline:
+            matched = self._match_with_window_timeline(staged_frames, start_time, end_time)
+            if matched:
+                tmp_file, event_id = matched
+                screenshot_path = self.move_image_file(tmp_file, event_id)
+                self._finish_slot()
+                return screenshot_path, event_id
+
+        response_result, idle_event_id = self.event_timeline.query(start_time, end_time)
+        logger.info(f"event timeline => {self.event_timeline.stats()}")
 
         screenshot_to_events = []
         if response_result and len(response_result) > 1:
-            for tmp_file in filename_list_tmp:
-                file_utc_time = get_image_name_to_utc(tmp_file)
+            for tmp_file in staged_frames:
+                file_utc_time = tmp_file.utc_time
                 
                 for row in response_result:
                     start_time, end_time = add_second_to_utc(row.get('timestamp'), row.get('duration'))
@@ -225,17 +601,13 @@ class ScreenShot:
                 max_row = max(response_result, key=lambda x: x['duration'])
                 event_id = max_row.get('id')
         
-                if len(filename_list_tmp) > 1:
-                    tmp_file = filename_list_tmp[-1]
-                else:
-                    tmp_file = filename_list_tmp[0]
+                tmp_file = staged_frames[-1]
                 
                 logger.info(f"event_id => {event_id}")            
 
-            screenshot_path = self.move_image_file(tmp_file)         
+            screenshot_path = self.move_image_file(tmp_file, event_id)         
 
-            for tmp_file_data in filename_list:
-                os.remove(tmp_file_data)
+            self._finish_slot()
 
             return screenshot_path, event_id
         
@@ -246,22 +618,68 @@ class ScreenShot:
             # so screenshot_path will be used the lastest screenshot and
             # event_id will be used from the latest event row.
             
-            tmp_file = filename_list_tmp[-1]            
-
-            screenshot_path = self.move_image_file(tmp_file)
-
-            for tmp_file_data in filename_list:
-                os.remove(tmp_file_data)             
+            tmp_file = staged_frames[-1]            
 
+            event_id = None
             if response_result:
                 event_id = response_result[0].get('id')
                 logger.info(f"idle time event_id => {event_id}")
             else:
-                if isinstance(response_result_tmp, dict):
-                    event_id = response_result_tmp.get('event_id')
-                    logger.info(f"idle time event_id => {event_id}")
+                event_id = idle_event_id
+                logger.info(f"idle time event_id => {event_id}")
+
+            screenshot_path = self.move_image_file(tmp_file, event_id)
+
+            self._finish_slot()
+
             return screenshot_path, event_id
         
+    def _match_with_window_timeline(self, staged_frames, start_time, end_time):
+        """
+        Pick the frame and event locally from the sampled window timeline.
+
+        The frame is the latest one taken while the window with the most dwell
+        was in front. Only the longest interval of that window is looked up,
+        which the event timeline usually answers without a round trip.
+        """
+        winner = self.window_timeline.winning_window(utc_to_epoch(start_time), utc_to_epoch(end_time))
+        if winner is None:
+            return None
+        window_key, intervals = winner
+
+        tmp_file = None
+        for staged in staged_frames:
+            captured_at = utc_to_epoch(staged.utc_time)
+            if any(begin <= captured_at <= finish for begin, finish in intervals):
+                tmp_file = staged
+        if tmp_file is None:
+            return None
+
+        begin, finish = max(intervals, key=lambda i: i[1] - i[0])
+        try:
+            rows, idle_event_id = self.event_timeline.query(epoch_to_utc(begin), epoch_to_utc(finish))
+        except requests.exceptions.RequestException as req_e:
+            # Server slow or down, settle for what the local timeline already knows
+            logger.warning(f"Event lookup failed, using cached events: {req_e}")
+            rows = self.event_timeline.events_between(begin, finish)
+            idle_event_id = None
+
+        event_id = idle_event_id
+        if rows:
+            # Event overlapping the winning interval the most
+            def overlap(row):
+                row_start = utc_to_epoch(row.get('timestamp'))
+                return min(finish, row_start + float(row.get('duration') or 0)) - max(begin, row_start)
+            event_id = max(rows, key=overlap).get('id')
+
+        logger.info(f"local match => window {window_key[1]!r}, event_id => {event_id}")
+        return tmp_file, event_id
+
+    def _finish_slot(self):
+        self.staging.clear()
+        if self.selector:
+            self.selector.reset()
+
     def get_readable_file_size(self, file_path):
         size_bytes = os.path.getsize(file_path)
         
@@ -296,21 +714,31 @@ class ScreenShot:
             # 4. Save with optimization
             img.save(output_path, "PNG", optimize=True)
     
-    def move_image_file(self, tmp_file):
-        # logger.info(f"tmp_file => {tmp_file}")
-        full_screen_img = Path(tmp_file).name
-        tmp_ocr, ocr_ext = os.path.splitext(full_screen_img)
-        ocr_img = tmp_ocr + "_ocr.png"
-        screenshot_path = os.path.join(SCREENSHOT_FOLDER, full_screen_img)
-        screenshot_ocr_path = os.path.join(SCREENSHOT_FOLDER, ocr_img)
-        
-        tmp_ocr_full_path, ocr_tmp_ext = os.path.splitext(tmp_file)
-        ocr_tmp_file = tmp_ocr_full_path + "_ocr.png"
+    def move_image_file(self, tmp_file, event_id=None):
+        # logger.info(f"tmp_file => {tmp_file.name}")
+        if self.feed:
+            pixels, rect = self.staging.pixels(tmp_file)
+            seq = self.feed.publish(pixels, rect, utc_to_epoch(tmp_file.utc_time), event_id, SELECTED)
+            if self.feed_only:
+                # Local consumers read the final from the feed, nothing is written
+                return self.feed.uri(seq)
+
+        if self.stream_uploader:
+            # Remote ingest, the final is encoded in memory and never written
+            return EncodedScreenshot(tmp_file.name, *self.staging.encode(tmp_file))
+
+        if self.pack_writer:
+            # Encoded (cropped, size capped) in memory and appended, the pack keeps the only copy
+            screenshot, screenshot_ocr = self.staging.encode(tmp_file)
+            captured_at = datetime.strptime(tmp_file.utc_time, "%Y-%m-%d %H:%M:%S.%f").replace(tzinfo=timezone.utc)
+            return self.pack_writer.write(captured_at, shrink_png(screenshot), screenshot_ocr, event_id)
 
-        shutil.copy2(tmp_file, screenshot_path)
-        shutil.copy2(ocr_tmp_file, screenshot_ocr_path)
+        screenshot_path = self.layout.resolve(tmp_file.name + ".png")
+        screenshot_ocr_path = self.layout.resolve(tmp_file.name + "_ocr.png")
 
-        crop_black_background(screenshot_path, screenshot_path)
+        self.staging.materialize(tmp_file, screenshot_path, screenshot_ocr_path)
+
+        self.staging.codec.crop(screenshot_path)
 
         if os.path.getsize(screenshot_path) > 1024 * 1024:
             file_size = self.get_readable_file_size(screenshot_path)
@@ -322,83 +750,64 @@ class ScreenShot:
 
     # Always Option Tracking Interval
 
-    def _sleep_until(self, target: datetime):
-
-        while True:
-            now = datetime.now()
-            remaining = (target - now).total_seconds()
-
-            if remaining <= 0:
-                return
-            
-            # Sleep in small chunks (max 60s)
-            time_sleep(min(60, remaining))
-
     def _next_anchored_time(self, now: datetime) -> datetime:
-        
-        interval = timedelta(seconds=3600 / self.times_per_hour)
-
-        today_start = datetime.combine(now.date(), self.start_time)
+        """Next start_time + k * interval slot, the grid restarts every day at start_time."""
+        return self.anchored_calendar.next_slot(now)
 
-        # If started before today's start_time
-        if now < today_start:
-            return today_start
+    def _anchored_job(self):
+        """One anchored slot, for callers that own the loop (engine.MultiProfileEngine)."""
+        try:
+            logger.info("Taking anchored screenshot")
+            capture_time = self.clock.utcnow()
+            self._sleep_upload_jitter()
 
-        elapsed = now - today_start
-        intervals_passed = int(elapsed.total_seconds() // interval.total_seconds()) + 1
+            with self.client.deadline(SLOT_NETWORK_DEADLINE):
+                self._finalize_slot(capture_time)
+        except requests.exceptions.RequestException as req_e:
+            logger.error(f"API error: {req_e}")
+        except Exception:
+            logger.exception("Anchored slot error")
 
-        return today_start + interval * intervals_passed
-    
-   
     def run_always(self):
         logger.info(
             f"Anchored mode: {self.times_per_hour} screenshots/hour "
             f"(every {int(3600 / self.times_per_hour)} seconds)"
         )
+        self._start_window_sampling()
+        self.negotiate_capabilities()
 
-        next_run = self._next_anchored_time(datetime.now())
+        next_run = self._next_anchored_time(self.clock.now())
 
         logger.info(f"First anchored screenshot at {next_run.strftime('%H:%M:%S')}")
 
         while True:
             try:
-                now = datetime.now()
-
-                sleep_seconds = (next_run - now).total_seconds()
-                while sleep_seconds > 0:
-                    self._take_screenshot_30_seconds()
-                    # sleep 30s or remaining time (whichever is smaller)
-                    sleep_chunk = min(INTERVAL, sleep_seconds)
-                    time_sleep(sleep_chunk)
-                    sleep_seconds -= sleep_chunk
-                    
-                logger.info("Taking anchored screenshot")
-
-                capture_time =  datetime.now(timezone.utc)
-
-                screenshot_path, event_id = self.get_image_path_and_event_id()
-                payload = {
-                    'file_location': screenshot_path,
-                    'is_idle_screenshot': self.is_idle_screenshot,
-                    'created_at': capture_time.isoformat(),
-                    'event_id': event_id
-                }          
-
-                response = requests.post(self.server_url, json=payload)
-                response.raise_for_status() # Raise an exception for bad status codes
+                lateness = self.scheduler.wait_until(next_run.timestamp(), self._take_screenshot_30_seconds)
+                logger.info(f"scheduler => {self.scheduler.stats()}")
+                if self.rate:
+                    logger.info(f"sampling => {self.rate.stats()}")
+
+                if lateness is not None and not self._woke_from_long_sleep():
+                    logger.info("Taking anchored screenshot")
+
+                    capture_time = self.clock.utcnow()
+                    self._sleep_upload_jitter()
+
+                    with self.client.deadline(SLOT_NETWORK_DEADLINE):
+                        self._finalize_slot(capture_time)
                 # logger.info(f"Upload response always => {response.json()}")              
 
                 # Move to next anchored slot
-                next_run += timedelta(seconds=3600 / self.times_per_hour)
+                next_run = self._next_anchored_time(next_run)
                 logger.info(f"Second anchored screenshot at {next_run.strftime('%H:%M:%S')}")
                 # Safety re-align (sleep / lag)
-                if next_run <= datetime.now():
-                    next_run = self._next_anchored_time(datetime.now())
+                if next_run <= self.clock.now():
+                    next_run = self._next_anchored_time(self.clock.now())
 
             except requests.exceptions.RequestException as req_e:
                 logger.error(f"API error: {req_e}")
-                time_sleep(10)
+                self.clock.sleep(10)
 
             except Exception as e:
                 logger.exception("Anchored scheduler error")
-                time_sleep(10)
+                self.clock.sleep(10)
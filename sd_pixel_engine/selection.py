@@ -0,0 +1,109 @@
+import logging
+from collections import namedtuple
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from sd_pixel_engine.staging import Capture, StagedFrame
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_WIDTH = 64
+NOVELTY_WEIGHT = 0.5
+
+Candidate = namedtuple("Candidate", ["staged", "timestamp", "window_key", "thumbnail"])
+
+
+def make_thumbnail(frame: np.ndarray, width: int = THUMBNAIL_WIDTH) -> np.ndarray:
+    """Tiny grayscale thumbnail by strided sampling, no resampling filter."""
+    step = max(1, frame.shape[1] // width)
+    return frame[::step, ::step].mean(axis=2, dtype=np.float32)
+
+
+def window_key(window: Optional[dict]):
+    if not window:
+        return None
+    return window.get("id"), window.get("owner")
+
+
+class DwellTimeline:
+    """
+    Seconds each foreground window spent in front during the current slot.
+
+    Every observation closes the interval since the previous one and credits
+    it to the window that was in front at that time.
+    """
+
+    def __init__(self):
+        self._dwell: Dict[object, float] = {}
+        self._last = None
+
+    def reset(self):
+        self._dwell.clear()
+        self._last = None
+
+    def record(self, timestamp: float, key):
+        if self._last is not None:
+            last_timestamp, last_key = self._last
+            self._dwell[last_key] = self._dwell.get(last_key, 0.0) + max(0.0, timestamp - last_timestamp)
+        self._dwell.setdefault(key, 0.0)
+        self._last = (timestamp, key)
+
+    def dwell(self, key) -> float:
+        return self._dwell.get(key, 0.0)
+
+    def total(self) -> float:
+        return sum(self._dwell.values())
+
+
+class CandidateSelector:
+    """
+    Keep only the K most promising staged frames of a slot.
+
+    A frame scores by how long its foreground window has been in front so far
+    (the slot's final pick favours the longest running event) plus how much
+    it differs from the closest other candidate, so near-duplicates of the
+    same screen are dropped first. The latest frame is always kept because the
+    slot falls back to it when no event matches.
+    """
+
+    def __init__(self, k: int, dwell_timeline: Optional[DwellTimeline] = None):
+        self.k = k
+        self.dwell_timeline = dwell_timeline or DwellTimeline()
+        self.candidates: List[Candidate] = []
+        self.slot_start = None  # utc_time string of the first grab in the slot
+
+    def reset(self):
+        self.candidates = []
+        self.slot_start = None
+        self.dwell_timeline.reset()
+
+    def _novelty(self, candidate: Candidate) -> float:
+        distances = [
+            float(np.abs(candidate.thumbnail - other.thumbnail).mean()) / 255
+            for other in self.candidates
+            if other is not candidate and other.thumbnail.shape == candidate.thumbnail.shape
+        ]
+        return min(distances) if distances else 1.0
+
+    def score(self, candidate: Candidate) -> float:
+        total = self.dwell_timeline.total() or 1.0
+        dwell = self.dwell_timeline.dwell(candidate.window_key) / total
+        return dwell + NOVELTY_WEIGHT * self._novelty(candidate)
+
+    def add(self, captured: Capture, timestamp: float) -> List[StagedFrame]:
+        """Offer a new grab, returns the staged frames that should be discarded now."""
+        if self.slot_start is None:
+            self.slot_start = captured.staged.utc_time
+
+        key = window_key(captured.window)
+        self.dwell_timeline.record(timestamp, key)
+        self.candidates.append(Candidate(captured.staged, timestamp, key, make_thumbnail(captured.frame)))
+
+        discarded = []
+        while len(self.candidates) > self.k + 1:
+            # Never evict the latest frame
+            worst = min(self.candidates[:-1], key=lambda c: (self.score(c), c.timestamp))
+            self.candidates.remove(worst)
+            discarded.append(worst.staged)
+        return discarded
@@ -0,0 +1,337 @@
+import os
+import math
+import shutil
+import logging
+import threading
+from glob import glob
+from collections import namedtuple
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from PIL import Image
+
+from sd_pixel_engine.utils import get_image_name_to_utc
+from sd_pixel_engine.const import INTERVAL, SCREENSHOT_FOLDER_USER, RING_FILE_NAME
+from sd_pixel_engine.capture_window import (
+    grab_desktop, render_screenshots, encode_screenshots, crop_black_image, png_bytes, crop_black_background
+)
+from sd_pixel_engine.frame_ring import FrameRing
+
+logger = logging.getLogger(__name__)
+
+STAGING_BACKENDS = ["png", "ring", "ring-lz4", "shared"]
+# Frames staged per slot when triggers or the adaptive rate grab closer than
+# the 30 second tick; a slot never stages fewer than its ticks
+MAX_STAGED_FRAMES = 64
+
+# utc_time: '2026-01-14 00:55:52.905552' (same format the event API uses)
+# name: file stem of the final screenshot, "<user_id>_<timestamp>"
+# key: backend specific handle of the staged frame
+StagedFrame = namedtuple("StagedFrame", ["utc_time", "name", "key"])
+
+# What one grab produced: the staged frame plus the pixels and foreground
+# window it was taken with, for online selection
+Capture = namedtuple("Capture", ["staged", "frame", "rect", "window"])
+
+
+class LocalCodec:
+    """
+    Renders, encodes and crops frames on the calling thread.
+    capture_worker.CaptureWorker offers the same three calls out of process.
+    """
+
+    render = staticmethod(render_screenshots)
+    encode = staticmethod(encode_screenshots)
+
+    @staticmethod
+    def crop(path: str):
+        crop_black_background(path, path)
+
+
+def frame_name(user_id, utc_now: datetime) -> str:
+    timestamp = utc_now.strftime("%Y-%m-%dT%H-%M-%S.%fZ")
+    return f"{user_id}_{timestamp}"
+
+
+class PngStaging:
+    """
+    Stage every grab as a pair of PNG files in the user screenshot folder.
+
+    source replaces grab_desktop, it returns (frame, rect, window) or None;
+    codec renders the PNGs (LocalCodec by default).
+    """
+
+    def __init__(self, user_id, screenshot_folder=None, source=None, codec=None):
+        self.user_id = user_id
+        self.screenshot_folder = screenshot_folder or SCREENSHOT_FOLDER_USER.format(user_id=user_id)
+        self.grab = source or grab_desktop
+        self.codec = codec or LocalCodec
+
+    def capture(self, utc_now: datetime) -> Optional[Capture]:
+        os.makedirs(self.screenshot_folder, exist_ok=True)
+
+        grabbed = self.grab()
+        if grabbed is None:
+            return None
+        frame, rect, window = grabbed
+
+        name = frame_name(self.user_id, utc_now)
+        output_file = os.path.join(self.screenshot_folder, f"{name}.png")
+        output_file_ocr = os.path.join(self.screenshot_folder, f"{name}_ocr.png")
+        self.codec.render(frame, rect, output_file, output_file_ocr)
+
+        staged = StagedFrame(utc_now.strftime("%Y-%m-%d %H:%M:%S.%f"), name, output_file)
+        return Capture(staged, frame, rect, window)
+
+    def frames(self) -> List[StagedFrame]:
+        filename_list = glob(os.path.join(self.screenshot_folder, "*.png"))
+        filtered_files = sorted(f for f in filename_list if not f.endswith("_ocr.png"))
+
+        return [
+            StagedFrame(get_image_name_to_utc(os.path.basename(f)),
+                        os.path.splitext(os.path.basename(f))[0], f)
+            for f in filtered_files
+        ]
+
+    def materialize(self, frame: StagedFrame, screenshot_path: str, screenshot_ocr_path: str):
+        tmp_full_path, _ = os.path.splitext(frame.key)
+        shutil.copy2(frame.key, screenshot_path)
+        shutil.copy2(tmp_full_path + "_ocr.png", screenshot_ocr_path)
+
+    def encode(self, frame: StagedFrame) -> Tuple[bytes, bytes]:
+        """Final (screenshot, ocr) PNG bytes, the staged files are already encoded."""
+        tmp_full_path, _ = os.path.splitext(frame.key)
+        with Image.open(frame.key) as img:
+            screenshot = png_bytes(crop_black_image(img.convert("RGB")))
+        with open(tmp_full_path + "_ocr.png", "rb") as f:
+            return screenshot, f.read()
+
+    def discard(self, frame: StagedFrame):
+        tmp_full_path, _ = os.path.splitext(frame.key)
+        for path in (frame.key, tmp_full_path + "_ocr.png"):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def clear(self):
+        for tmp_file_data in glob(os.path.join(self.screenshot_folder, "*.png")):
+            os.remove(tmp_file_data)
+
+    def close(self):
+        pass
+
+
+class RingStaging:
+    """
+    Stage raw frames in a preallocated memory-mapped ring file.
+
+    Nothing is encoded until the slot is finalized, and only the selected
+    frame is ever written out as PNG.
+    """
+
+    def __init__(self, user_id, frames_per_slot: int, compress: bool = False,
+                 screenshot_folder=None, source=None, codec=None):
+        self.user_id = user_id
+        self.grab = source or grab_desktop
+        self.codec = codec or LocalCodec
+        self.frames_per_slot = frames_per_slot
+        self.compress = compress
+        self.screenshot_folder = screenshot_folder or SCREENSHOT_FOLDER_USER.format(user_id=user_id)
+        self.ring = None
+
+    def _ensure_ring(self, frame):
+        if self.ring is not None and self.ring.fits(frame):
+            return
+        if self.ring is not None:
+            # Monitor topology grew, the old slots are too small
+            logger.warning("Display topology changed, reallocating frame ring")
+            self.ring.close()
+
+        height, width = frame.shape[:2]
+        self.ring = FrameRing.for_frame_shape(
+            os.path.join(self.screenshot_folder, RING_FILE_NAME),
+            self.frames_per_slot, height, width, compress=self.compress
+        )
+
+    def capture(self, utc_now: datetime) -> Optional[Capture]:
+        grabbed = self.grab()
+        if grabbed is None:
+            return None
+        frame, rect, window = grabbed
+        self._ensure_ring(frame)
+        staged = self.ring.entries()
+        if len(staged) >= self.ring.slot_count:
+            logger.warning(f"Frame ring full ({self.ring.slot_count} frames), "
+                           f"overwriting the frame of {datetime.fromtimestamp(staged[0].timestamp, timezone.utc)}")
+        entry = self.ring.append(utc_now.timestamp(), frame, rect)
+
+        staged = StagedFrame(utc_now.strftime("%Y-%m-%d %H:%M:%S.%f"),
+                             frame_name(self.user_id, utc_now), entry.slot)
+        return Capture(staged, frame, rect, window)
+
+    def frames(self) -> List[StagedFrame]:
+        if self.ring is None:
+            return []
+
+        staged = []
+        for entry in self.ring.entries():
+            utc_now = datetime.fromtimestamp(entry.timestamp, timezone.utc)
+            staged.append(StagedFrame(utc_now.strftime("%Y-%m-%d %H:%M:%S.%f"),
+                                      frame_name(self.user_id, utc_now), entry.slot))
+        return staged
+
+    def materialize(self, frame: StagedFrame, screenshot_path: str, screenshot_ocr_path: str):
+        pixels, entry = self.ring.read(frame.key)
+        self.codec.render(pixels, entry.rect, screenshot_path, screenshot_ocr_path)
+
+    def encode(self, frame: StagedFrame) -> Tuple[bytes, bytes]:
+        """Final (screenshot, ocr) PNG bytes straight from the ring, nothing touches disk."""
+        pixels, entry = self.ring.read(frame.key)
+        return self.codec.encode(pixels, entry.rect)
+
+    def pixels(self, frame: StagedFrame):
+        """Raw (pixels, rect) of a staged frame."""
+        pixels, entry = self.ring.read(frame.key)
+        return pixels, entry.rect
+
+    def discard(self, frame: StagedFrame):
+        if self.ring is not None:
+            self.ring.discard(frame.key)
+
+    def clear(self):
+        if self.ring is not None:
+            self.ring.clear()
+
+    def close(self):
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
+
+class FramePool:
+    """
+    Grabbed frames held in memory once, whatever the number of profiles
+    staging them. Entries are keyed by the frame object and counted, the
+    last release drops the frame.
+    """
+
+    def __init__(self):
+        self._frames = {}  # id(frame) -> [frame, rect, refs]
+        self._lock = threading.Lock()
+
+    def acquire(self, frame, rect) -> int:
+        key = id(frame)
+        with self._lock:
+            entry = self._frames.get(key)
+            if entry is None:
+                entry = self._frames[key] = [frame, rect, 0]
+            entry[2] += 1
+        return key
+
+    def get(self, key: int):
+        frame, rect, _ = self._frames[key]
+        return frame, rect
+
+    def release(self, key: int):
+        with self._lock:
+            entry = self._frames.get(key)
+            if entry is None:
+                return
+            entry[2] -= 1
+            if entry[2] <= 0:
+                del self._frames[key]
+
+    def __len__(self):
+        return len(self._frames)
+
+    def nbytes(self) -> int:
+        with self._lock:
+            return sum(entry[0].nbytes for entry in self._frames.values())
+
+
+class SharedStaging:
+    """
+    Stage frames by reference in a FramePool, which several profiles fed by
+    one capture stream may share. Like the ring, nothing is encoded until
+    the slot is finalized; at most frames_per_slot frames stay staged.
+    """
+
+    def __init__(self, user_id, frames_per_slot: int, pool: Optional[FramePool] = None, source=None,
+                 codec=None):
+        self.user_id = user_id
+        self.grab = source or grab_desktop
+        self.codec = codec or LocalCodec
+        self.frames_per_slot = frames_per_slot
+        self.pool = pool if pool is not None else FramePool()
+        self._staged: List[StagedFrame] = []
+
+    def capture(self, utc_now: datetime) -> Optional[Capture]:
+        grabbed = self.grab()
+        if grabbed is None:
+            return None
+        frame, rect, window = grabbed
+        if len(self._staged) >= self.frames_per_slot:
+            logger.warning(f"Staging full ({self.frames_per_slot} frames), "
+                           f"dropping the frame of {self._staged[0].utc_time}")
+            self.discard(self._staged[0])
+
+        staged = StagedFrame(utc_now.strftime("%Y-%m-%d %H:%M:%S.%f"),
+                             frame_name(self.user_id, utc_now), self.pool.acquire(frame, rect))
+        self._staged.append(staged)
+        return Capture(staged, frame, rect, window)
+
+    def frames(self) -> List[StagedFrame]:
+        return list(self._staged)
+
+    def materialize(self, frame: StagedFrame, screenshot_path: str, screenshot_ocr_path: str):
+        pixels, rect = self.pool.get(frame.key)
+        self.codec.render(pixels, rect, screenshot_path, screenshot_ocr_path)
+
+    def encode(self, frame: StagedFrame) -> Tuple[bytes, bytes]:
+        pixels, rect = self.pool.get(frame.key)
+        return self.codec.encode(pixels, rect)
+
+    def pixels(self, frame: StagedFrame):
+        return self.pool.get(frame.key)
+
+    def discard(self, frame: StagedFrame):
+        if frame in self._staged:
+            self._staged.remove(frame)
+            self.pool.release(frame.key)
+
+    def clear(self):
+        for frame in self._staged:
+            self.pool.release(frame.key)
+        self._staged = []
+
+    def close(self):
+        self.clear()
+
+
+def frames_per_slot(times_per_hour, top_k=0, min_spacing=INTERVAL) -> int:
+    """
+    Number of grabs staged before one slot is finalized.
+
+    Grabs are at least min_spacing seconds apart: the 30 second tick, or
+    less when capture triggers or the adaptive rate grab in between. Those
+    closer grabs are held up to MAX_STAGED_FRAMES, past that the ring
+    overwrites its oldest frame and shared staging drops the new one. With
+    online top-K selection only the K candidates, the protected latest
+    frame and the incoming grab are ever staged at once.
+    """
+    if top_k > 0:
+        return top_k + 2
+    ticks = math.ceil(3600 / times_per_hour / INTERVAL) + 1
+    grabs = math.ceil(3600 / times_per_hour / min_spacing) + 1
+    return min(grabs, max(ticks, MAX_STAGED_FRAMES))
+
+
+def create_staging(backend, user_id, times_per_hour, top_k=0, source=None, pool=None, codec=None,
+                   min_spacing=INTERVAL):
+    if backend == "png":
+        return PngStaging(user_id, source=source, codec=codec)
+    if backend in ("ring", "ring-lz4"):
+        return RingStaging(user_id, frames_per_slot(times_per_hour, top_k, min_spacing),
+                           compress=backend == "ring-lz4", source=source, codec=codec)
+    if backend == "shared":
+        return SharedStaging(user_id, frames_per_slot(times_per_hour, top_k, min_spacing), pool, source, codec)
+    raise ValueError(f"Unknown staging backend: {backend}")
@@ -0,0 +1,120 @@
+import time
+import uuid
+import logging
+import threading
+from collections import namedtuple
+from typing import Dict, Optional
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_MODES = ["path", "stream"]
+CHUNK_SIZE = 256 * 1024
+MAX_RESUMES = 5  # times one upload may pick up again from the server's offset
+
+# A final that only exists in memory: file stem plus screenshot and OCR PNG bytes
+EncodedScreenshot = namedtuple("EncodedScreenshot", ["name", "screenshot", "ocr"])
+
+
+def upload_id(user_id, name: str) -> str:
+    """Stable per final, so a retried slot resumes instead of starting over."""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"sundial:{user_id}:stream:{name}"))
+
+
+class TokenBucket:
+    """
+    Byte rate limiter. Tokens refill at `rate` bytes per second up to
+    `capacity`; consume() sleeps until enough tokens are available.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity or max(rate, CHUNK_SIZE)
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = self.capacity
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def consume(self, amount: int):
+        # Requests larger than the bucket are let through once it is full
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill()
+            while self.tokens < amount:
+                self.sleep((amount - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= amount
+
+
+class StreamUploader:
+    """
+    Upload encoded screenshots from memory to a remote ingest server.
+
+    Each part (screenshot, ocr) is sent as a series of multipart chunks
+    tagged with their byte offset. When a chunk fails the uploader asks the
+    server how much of the upload it already holds and resumes from there,
+    then commits the upload with the slot metadata. Chunks are idempotent
+    (the server writes them at their offset), so they may be retried.
+    """
+
+    def __init__(self, client, server_url, chunk_size=CHUNK_SIZE, rate_limit: Optional[float] = None):
+        self.client = client
+        self.server_url = server_url
+        self.chunk_size = chunk_size
+        self.bucket = TokenBucket(rate_limit) if rate_limit else None
+        self.bytes_sent = 0
+        self.resumes = 0
+
+    def _url(self, upload: str, suffix="") -> str:
+        return f"{self.server_url}stream/{upload}{suffix}"
+
+    def received(self, upload: str) -> Dict[str, int]:
+        """Bytes of each part the server already holds, empty for a new upload."""
+        response = self.client.get(self._url(upload))
+        if response.status_code == 404:
+            return {}
+        response.raise_for_status() # Raise an exception for bad status codes
+        return response.json().get("parts", {})
+
+    def _send_part(self, upload: str, part: str, data: bytes, offset: int):
+        view = memoryview(data)
+        while offset < len(data):
+            chunk = view[offset:offset + self.chunk_size]
+            if self.bucket:
+                self.bucket.consume(len(chunk))
+            response = self.client.post(
+                self._url(upload),
+                data={"part": part, "offset": str(offset), "total": str(len(data))},
+                files={"chunk": (part + ".png", chunk.tobytes(), "application/octet-stream")},
+            )
+            response.raise_for_status() # Raise an exception for bad status codes
+            offset += len(chunk)
+            self.bytes_sent += len(chunk)
+
+    def upload(self, upload: str, parts: Dict[str, bytes], metadata: dict) -> requests.Response:
+        offsets = {part: 0 for part in parts}
+        for attempt in range(MAX_RESUMES + 1):
+            try:
+                for part, data in parts.items():
+                    self._send_part(upload, part, data, offsets[part])
+                    offsets[part] = len(data)
+                break
+            except requests.exceptions.RequestException as e:
+                if attempt == MAX_RESUMES:
+                    raise
+                self.resumes += 1
+                logger.warning(f"Stream upload {upload} interrupted, resuming: {e}")
+                received = self.received(upload)
+                offsets = {part: min(int(received.get(part, 0)), len(data)) for part, data in parts.items()}
+
+        response = self.client.post(self._url(upload, "/commit"), json=dict(
+            metadata, sizes={part: len(data) for part, data in parts.items()}))
+        response.raise_for_status() # Raise an exception for bad status codes
+        return response
@@ -0,0 +1,302 @@
+import sys
+import math
+import json
+import time
+import random
+import logging
+import argparse
+import threading
+from typing import Callable, List, Optional, Tuple
+
+from sd_pixel_engine.const import INTERVAL
+
+logger = logging.getLogger(__name__)
+
+DEBOUNCE = 2  # seconds a new foreground window must stay before it is grabbed
+MIN_SPACING = 5  # seconds between two grabs, whatever happens
+MAX_SPACING = 2 * INTERVAL  # periodic fallback when nothing is reported
+INPUT_DELAY = INTERVAL  # input in the same window is grabbed at most this late
+INPUT_POLL = 1  # seconds between GetLastInputInfo checks
+
+EVENT_SYSTEM_FOREGROUND = 0x0003
+EVENT_OBJECT_NAMECHANGE = 0x800C
+WINEVENT_OUTOFCONTEXT = 0x0000
+WINEVENT_SKIPOWNPROCESS = 0x0002
+OBJID_WINDOW = 0
+WM_QUIT = 0x0012
+
+
+class CaptureTrigger:
+    """
+    Decide when to grab from foreground and input notifications.
+
+    A foreground change schedules a grab `debounce` seconds later, and every
+    further change restarts that wait, so alt-tab bursts cost one grab.
+    Input activity schedules a grab at most `input_delay` seconds later.
+    Grabs are never closer than `min_spacing` and never further apart than
+    `max_spacing` (the periodic fallback). All times come from `clock`
+    (time.monotonic() by default) and wait(event, timeout) blocks on the
+    matching clock, so the engine's VirtualClock drives it too.
+    """
+
+    def __init__(self, debounce=DEBOUNCE, min_spacing=MIN_SPACING, max_spacing=MAX_SPACING,
+                 input_delay=INPUT_DELAY, clock=time.monotonic, wait=None):
+        self.debounce = debounce
+        self.min_spacing = min_spacing
+        self.max_spacing = max_spacing
+        self.input_delay = input_delay
+        self.clock = clock
+        self._wait = wait or (lambda event, timeout: event.wait(timeout))
+        self.last_grab: Optional[float] = None
+        self.pending: Optional[float] = None
+        self.notifications = 0
+        self.grabs = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+
+    def notify(self, kind: str, timestamp: Optional[float] = None):
+        """Called from source threads: kind is "foreground" or "input"."""
+        timestamp = self.clock() if timestamp is None else timestamp
+        with self._lock:
+            self.notifications += 1
+            if kind == "foreground":
+                self.pending = timestamp + self.debounce
+            elif self.pending is None:
+                self.pending = timestamp + self.input_delay
+        self._wake.set()
+
+    def next_grab(self, now: float) -> float:
+        with self._lock:
+            if self.last_grab is None:
+                return now
+            due = self.last_grab + self.max_spacing
+            if self.pending is not None:
+                due = min(due, self.pending)
+            return max(due, self.last_grab + self.min_spacing)
+
+    def grabbed(self, timestamp: float):
+        with self._lock:
+            self.last_grab = timestamp
+            self.grabs += 1
+            if self.pending is not None and self.pending <= timestamp:
+                self.pending = None
+
+    def reset(self):
+        """Forget the last grab and pending notifications, after hibernation."""
+        with self._lock:
+            self.last_grab = None
+            self.pending = None
+        self._wake.clear()
+
+    def stats(self) -> dict:
+        return {"notifications": self.notifications, "grabs": self.grabs}
+
+    def wait(self, timeout: float):
+        """Sleep up to timeout, returning early when a notification arrives."""
+        self._wait(self._wake, max(0.0, timeout))
+        self._wake.clear()
+
+
+class FakeTriggerSource:
+    """Replays (timestamp, kind) notifications into a trigger, for tests and simulations."""
+
+    def __init__(self, events: List[Tuple[float, str]]):
+        self.events = sorted(events)
+        self._index = 0
+
+    def replay_until(self, trigger: CaptureTrigger, timestamp: float):
+        while self._index < len(self.events) and self.events[self._index][0] <= timestamp:
+            event_time, kind = self.events[self._index]
+            trigger.notify(kind, event_time)
+            self._index += 1
+
+    def next_event(self) -> Optional[float]:
+        return self.events[self._index][0] if self._index < len(self.events) else None
+
+    def start(self, trigger: CaptureTrigger):
+        pass
+
+    def stop(self):
+        pass
+
+
+class WinEventSource:
+    """
+    Foreground notifications from WinEvent hooks plus input activity from
+    GetLastInputInfo, feeding a CaptureTrigger (Windows only).
+
+    The hooks are out-of-context, so they need a message loop on the thread
+    that installed them; input is polled because only low-level hooks
+    report it as events. stop() joins both threads, so the source can be
+    started again after hibernation.
+    """
+
+    def __init__(self, input_poll=INPUT_POLL):
+        if sys.platform != "win32":
+            raise RuntimeError("WinEvent triggers need Windows, use FakeTriggerSource elsewhere")
+        self.input_poll = input_poll
+        self._trigger = None
+        self._thread_id = None
+        self._threads = []
+        self._stop = threading.Event()
+        self._hooked = threading.Event()
+
+    def _hook_loop(self):
+        import ctypes
+        from ctypes import wintypes
+
+        user32 = ctypes.windll.user32
+        WinEventProc = ctypes.WINFUNCTYPE(None, wintypes.HANDLE, wintypes.DWORD, wintypes.HWND,
+                                          wintypes.LONG, wintypes.LONG, wintypes.DWORD, wintypes.DWORD)
+
+        def on_event(hook, event, hwnd, id_object, id_child, thread, event_time):
+            if event == EVENT_SYSTEM_FOREGROUND:
+                self._trigger.notify("foreground")
+            elif id_object == OBJID_WINDOW and hwnd == user32.GetForegroundWindow():
+                # Title of the foreground window changed (tab switch, new document)
+                self._trigger.notify("foreground")
+
+        callback = WinEventProc(on_event)  # must stay referenced while hooked
+        flags = WINEVENT_OUTOFCONTEXT | WINEVENT_SKIPOWNPROCESS
+        hooks = [
+            user32.SetWinEventHook(EVENT_SYSTEM_FOREGROUND, EVENT_SYSTEM_FOREGROUND, 0, callback, 0, 0, flags),
+            user32.SetWinEventHook(EVENT_OBJECT_NAMECHANGE, EVENT_OBJECT_NAMECHANGE, 0, callback, 0, 0, flags),
+        ]
+        self._thread_id = ctypes.windll.kernel32.GetCurrentThreadId()
+        self._hooked.set()
+
+        msg = wintypes.MSG()
+        while user32.GetMessageW(ctypes.byref(msg), 0, 0, 0) > 0:
+            user32.TranslateMessage(ctypes.byref(msg))
+            user32.DispatchMessageW(ctypes.byref(msg))
+
+        for hook in hooks:
+            if hook:
+                user32.UnhookWinEvent(hook)
+
+    def _input_loop(self):
+        import ctypes
+        from ctypes import wintypes
+
+        class LASTINPUTINFO(ctypes.Structure):
+            _fields_ = [("cbSize", wintypes.UINT), ("dwTime", wintypes.DWORD)]
+
+        info = LASTINPUTINFO(cbSize=ctypes.sizeof(LASTINPUTINFO))
+        last = None
+        while not self._stop.wait(self.input_poll):
+            if ctypes.windll.user32.GetLastInputInfo(ctypes.byref(info)):
+                if last is not None and info.dwTime != last:
+                    self._trigger.notify("input")
+                last = info.dwTime
+
+    def start(self, trigger: CaptureTrigger):
+        if self._threads:
+            return
+        self._trigger = trigger
+        self._stop = threading.Event()
+        self._hooked = threading.Event()
+        self._thread_id = None
+        for target in (self._hook_loop, self._input_loop):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=2.0):
+        import ctypes
+        if not self._threads:
+            return
+        self._stop.set()
+        # The quit message needs the hook thread's id, it is set once the hooks are in
+        if self._hooked.wait(timeout) and self._thread_id:
+            ctypes.windll.user32.PostThreadMessageW(self._thread_id, WM_QUIT, 0, 0)
+        for thread in self._threads:
+            thread.join(timeout)
+            if thread.is_alive():
+                logger.warning(f"Trigger thread {thread.name} did not stop within {timeout}s")
+        self._threads = []
+        self._thread_id = None
+
+
+def synthetic_trace(hours=1.0, seed=1, dwell=12.0) -> dict:
+    """Foreground switches with mostly short and some long dwells, plus input bursts."""
+    rng = random.Random(seed)
+    end = hours * 3600
+    foreground, inputs = [], []
+    now, window = 0.0, 0
+    while now < end:
+        foreground.append([now, f"window-{window}"])
+        stay = rng.lognormvariate(math.log(dwell), 1.3)  # median `dwell`, long tail of minutes
+        for i in range(int(stay // 4)):
+            if rng.random() < 0.4:
+                inputs.append(now + i * 4 + rng.uniform(0, 4))
+        now += max(1.0, stay)
+        window = rng.randrange(40) if rng.random() < 0.7 else window + 1000
+    return {"foreground": foreground, "input": inputs, "duration": end}
+
+
+def _foreground_at(foreground, timestamp):
+    current = None
+    for start, window in foreground:
+        if start > timestamp:
+            break
+        current = window
+    return current
+
+
+def replay(trace: dict, grab_times: Callable[[dict], List[float]]) -> dict:
+    grabs = grab_times(trace)
+    foreground = trace["foreground"]
+    seen = {_foreground_at(foreground, t) for t in grabs}
+    windows = {window for _, window in foreground}
+
+    # Windows that stayed in front at least MIN_SPACING seconds once
+    lasting = set()
+    for (start, window), (end, _) in zip(foreground, foreground[1:] + [[trace["duration"], None]]):
+        if end - start >= MIN_SPACING:
+            lasting.add(window)
+
+    hours = trace["duration"] / 3600
+    return {
+        "grabs_per_hour": round(len(grabs) / hours, 1),
+        "window_coverage": round(len(seen & windows) / len(windows), 3),
+        "lasting_window_coverage": round(len(seen & lasting) / max(1, len(lasting)), 3),
+    }
+
+
+def fixed_interval_grabs(trace: dict, interval=INTERVAL) -> List[float]:
+    return [i * interval for i in range(int(trace["duration"] // interval) + 1)]
+
+
+def triggered_grabs(trace: dict, **kwargs) -> List[float]:
+    """Run a CaptureTrigger over the trace on a virtual clock."""
+    events = [(t, "foreground") for t, _ in trace["foreground"]] + [(t, "input") for t in trace["input"]]
+    source = FakeTriggerSource(events)
+    trigger = CaptureTrigger(clock=lambda: 0.0, **kwargs)
+    grabs, now = [], 0.0
+    while now <= trace["duration"]:
+        source.replay_until(trigger, now)
+        due = trigger.next_grab(now)
+        if due <= now:
+            trigger.grabbed(now)
+            grabs.append(now)
+            continue
+        next_event = source.next_event()
+        now = min(due, next_event) if next_event is not None else due
+    return grabs
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Replay a foreground trace: fixed interval vs triggered grabs")
+    parser.add_argument("--trace", help="JSON with foreground [[t, window]], input [t] and duration")
+    parser.add_argument("--hours", type=float, default=8, help="Length of the synthetic trace")
+    parser.add_argument("--dwell", type=float, default=12, help="Median seconds a synthetic window stays in front")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.trace:
+        with open(args.trace) as f:
+            trace = json.load(f)
+    else:
+        trace = synthetic_trace(args.hours, args.seed, args.dwell)
+    print(f"fixed {INTERVAL}s  {replay(trace, fixed_interval_grabs)}")
+    print(f"triggered  {replay(trace, triggered_grabs)}")
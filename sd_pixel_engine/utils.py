@@ -1,13 +1,20 @@
 import re
-import subprocess
+import hashlib
 import logging
 import argparse
 from datetime import datetime, timezone, timedelta, time
-from time import sleep as time_sleep
 
 
 logger = logging.getLogger(__name__)
 
+def slot_phase_offset(user_id, interval: float) -> float:
+    """
+    Deterministic offset in [0, interval) seconds for this user's slots, so a
+    fleet sharing one schedule spreads its captures and uploads over the slot.
+    """
+    digest = hashlib.sha256(str(user_id).encode()).digest()
+    return int.from_bytes(digest[:8], "big") / 2 ** 64 * interval
+
 # filename: "0a07029c9a901fe0819abf69dca12c0d_2026-01-14T00-55-52.905552Z.png"
 # '2026-01-14 00:55:52.905552'
 def get_image_name_to_utc(filename : str) -> str:
@@ -60,11 +67,6 @@ def str2bool(v):
     else:
         raise argparse.ArgumentTypeError("Boolean value expected (true/false).")
 
-def stop_process_by_exe(exe_name, time_sleep_time=0.2):
-    logger.info(f"killing start cmd_name {exe_name}")
-    subprocess.run(f"taskkill /F /IM {exe_name}", shell=True)
-    time_sleep(time_sleep_time)  # wait 200ms for process cleanup
-
 if __name__ == '__main__':
     # add_second_to_utc("2026-01-14 06:49:15.373000+00:00", 2.015)
     a, b = add_second_to_utc("2026-01-14 06:49:18.394000+00:00", 5.04)
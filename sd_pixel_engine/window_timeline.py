@@ -0,0 +1,252 @@
+import os
+import sys
+import time
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_INTERVAL = 1  # seconds between foreground window checks
+TIMELINE_CAPACITY = 4096  # foreground changes kept in the ring buffer
+
+PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+DWMWA_EXTENDED_FRAME_BOUNDS = 9
+
+# One row per foreground change: the window stays in front until the next row
+WINDOW_RECORD = np.dtype([
+    ("timestamp", "<f8"),
+    ("hwnd", "<i8"),
+    ("title", "<i4"),
+    ("process", "<i4"),
+    ("rect", "<i4", (4,)),
+])
+
+
+def foreground_window_sample() -> Optional[dict]:
+    """Foreground window metadata on Windows, without grabbing any pixels."""
+    import ctypes
+    from ctypes import wintypes
+
+    user32 = ctypes.windll.user32
+    hwnd = user32.GetForegroundWindow()
+    if not hwnd:
+        return None
+
+    length = user32.GetWindowTextLengthW(hwnd)
+    title = ctypes.create_unicode_buffer(length + 1)
+    user32.GetWindowTextW(hwnd, title, length + 1)
+
+    rect = wintypes.RECT()
+    ctypes.windll.dwmapi.DwmGetWindowAttribute(
+        wintypes.HWND(hwnd), wintypes.DWORD(DWMWA_EXTENDED_FRAME_BOUNDS),
+        ctypes.byref(rect), ctypes.sizeof(rect)
+    )
+
+    process = ""
+    pid = wintypes.DWORD()
+    user32.GetWindowThreadProcessId(hwnd, ctypes.byref(pid))
+    handle = ctypes.windll.kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid.value)
+    if handle:
+        try:
+            size = wintypes.DWORD(260)
+            path = ctypes.create_unicode_buffer(size.value)
+            if ctypes.windll.kernel32.QueryFullProcessImageNameW(handle, 0, path, ctypes.byref(size)):
+                process = os.path.basename(path.value)
+        finally:
+            ctypes.windll.kernel32.CloseHandle(handle)
+
+    return {
+        "id": int(hwnd),
+        "owner": title.value,
+        "process": process,
+        "rect": (rect.left, rect.top, rect.right, rect.bottom),
+    }
+
+
+class WindowTimeline:
+    """
+    Compact ring buffer of foreground window changes.
+
+    Titles and process names are interned, so every change costs one fixed
+    40 byte row. Window identity is (hwnd, title), the same key the frame
+    selector uses, so a browser tab switch counts as a new window.
+    """
+
+    def __init__(self, capacity=TIMELINE_CAPACITY):
+        self.capacity = capacity
+        self._rows = np.zeros(capacity, dtype=WINDOW_RECORD)
+        self._count = 0
+        self._head = 0
+        self._strings: List[str] = []
+        self._string_ids: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._last = None
+
+    def __len__(self):
+        return self._count
+
+    def _intern(self, value: str) -> int:
+        string_id = self._string_ids.get(value)
+        if string_id is None:
+            string_id = len(self._strings)
+            self._strings.append(value)
+            self._string_ids[value] = string_id
+        return string_id
+
+    def _compact_strings(self):
+        # Strings of overwritten rows are garbage once the ring has wrapped
+        rows = self._ordered_rows()
+        strings, string_ids = [], {}
+        for field in ("title", "process"):
+            for i, old_id in enumerate(rows[field]):
+                value = self._strings[old_id]
+                if value not in string_ids:
+                    string_ids[value] = len(strings)
+                    strings.append(value)
+                rows[field][i] = string_ids[value]
+        self._strings, self._string_ids = strings, string_ids
+        self._rows[:self._count] = rows
+        self._head = self._count % self.capacity
+
+    def record(self, timestamp: float, window: Optional[dict]):
+        """Store a sample, only keeping it when the foreground window changed."""
+        if window is None:
+            window = {"id": 0, "owner": "", "process": "", "rect": (0, 0, 0, 0)}
+        current = (window["id"], window["owner"], window.get("process", ""), tuple(window.get("rect", (0, 0, 0, 0))))
+
+        with self._lock:
+            if current == self._last:
+                return
+            self._last = current
+
+            if len(self._strings) > 4 * self.capacity:
+                self._compact_strings()
+
+            row = self._rows[self._head]
+            row["timestamp"] = timestamp
+            row["hwnd"] = current[0]
+            row["title"] = self._intern(current[1])
+            row["process"] = self._intern(current[2])
+            row["rect"] = current[3]
+            self._head = (self._head + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+
+    def _ordered_rows(self) -> np.ndarray:
+        if self._count < self.capacity:
+            return self._rows[:self._count].copy()
+        return np.concatenate((self._rows[self._head:], self._rows[:self._head]))
+
+    def intervals(self, start: float, end: float) -> List[Tuple[float, float, tuple]]:
+        """(from, to, (hwnd, title)) foreground intervals clipped to [start, end]."""
+        with self._lock:
+            rows = self._ordered_rows()
+            strings = list(self._strings)
+
+        if not len(rows):
+            return []
+        timestamps = rows["timestamp"]
+        first = max(int(np.searchsorted(timestamps, start, side="right")) - 1, 0)
+        last = int(np.searchsorted(timestamps, end, side="right"))
+
+        result = []
+        for i in range(first, last):
+            begin = max(timestamps[i], start)
+            finish = min(timestamps[i + 1] if i + 1 < len(rows) else end, end)
+            if finish > begin:
+                key = (int(rows["hwnd"][i]), strings[rows["title"][i]])
+                result.append((float(begin), float(finish), key))
+        return result
+
+    def dwell(self, start: float, end: float) -> Dict[tuple, float]:
+        totals: Dict[tuple, float] = {}
+        for begin, finish, key in self.intervals(start, end):
+            totals[key] = totals.get(key, 0.0) + finish - begin
+        return totals
+
+    def winning_window(self, start: float, end: float) -> Optional[Tuple[tuple, List[Tuple[float, float]]]]:
+        """The window with the most dwell in [start, end] and its intervals."""
+        intervals = [i for i in self.intervals(start, end) if i[2][0]]
+        if not intervals:
+            return None
+        totals: Dict[tuple, float] = {}
+        for begin, finish, key in intervals:
+            totals[key] = totals.get(key, 0.0) + finish - begin
+        winner = max(totals, key=totals.get)
+        return winner, [(begin, finish) for begin, finish, key in intervals if key == winner]
+
+
+class WindowSampler:
+    """
+    Background thread recording foreground window changes once a second.
+
+    source returns the current foreground window as a dict ("id", "owner",
+    "process", "rect") or None, tests can pass a fake one.
+    """
+
+    def __init__(self, timeline: WindowTimeline, source: Optional[Callable[[], Optional[dict]]] = None,
+                 interval=SAMPLE_INTERVAL, clock=time.time):
+        if source is None and sys.platform != "win32":
+            raise RuntimeError("Foreground window sampling needs Windows or an explicit source")
+        self.timeline = timeline
+        self.source = source or foreground_window_sample
+        self.interval = interval
+        self.clock = clock
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sample(self):
+        try:
+            self.timeline.record(self.clock(), self.source())
+        except Exception as e:
+            logger.debug(f"Window sample failed: {e}")
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.sample()
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval * 2)
+            self._thread = None
+
+
+class SampledDwell:
+    """
+    Dwell source for the frame selector backed by the sampled timeline.
+
+    Drop-in for selection.DwellTimeline: it ignores the per-grab records and
+    answers from the 1 second timeline since the slot started instead.
+    """
+
+    def __init__(self, timeline: WindowTimeline, clock=time.time):
+        self.timeline = timeline
+        self.clock = clock
+        self.slot_start = None
+        self._totals = {}
+
+    def reset(self):
+        self.slot_start = None
+        self._totals = {}
+
+    def record(self, timestamp: float, key):
+        if self.slot_start is None:
+            self.slot_start = timestamp
+        self._totals = self.timeline.dwell(self.slot_start, self.clock())
+
+    def dwell(self, key) -> float:
+        return self._totals.get(key, 0.0)
+
+    def total(self) -> float:
+        return sum(self._totals.values())
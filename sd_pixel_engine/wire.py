@@ -0,0 +1,201 @@
+import json
+import struct
+import time
+import argparse
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:  # optional, the columnar and JSON codecs need nothing extra
+    msgpack = None
+
+CONTENT_COLUMNAR = "application/x-sundial-events"
+CONTENT_MSGPACK = "application/msgpack"
+CONTENT_JSON = "application/json"
+
+# Typed event rows, what the event timeline stores and searches
+EVENT_RECORD = np.dtype([
+    ("id", "<i8"),
+    ("start", "<f8"),  # POSIX seconds, UTC
+    ("duration", "<f8"),
+])
+# Same rows for servers whose event ids are not integers (UUIDs, strings),
+# the ids are kept as received; only the JSON and msgpack encodings carry them
+OPAQUE_EVENT_RECORD = np.dtype([
+    ("id", object),
+    ("start", "<f8"),
+    ("duration", "<f8"),
+])
+
+# magic, version, event count, idle event id; then ids, starts, durations as columns
+COLUMNAR_HEADER = struct.Struct("<4sB3xIq")
+COLUMNAR_MAGIC = b"SDEV"
+COLUMNAR_VERSION = 1
+NO_EVENT_ID = -(2 ** 63)
+
+
+def accept_header() -> str:
+    """Preferred encodings for event ranges, JSON last so old servers keep working."""
+    offers = [CONTENT_COLUMNAR]
+    if msgpack is not None:
+        offers.append(CONTENT_MSGPACK + ";q=0.9")
+    offers.append(CONTENT_JSON + ";q=0.5")
+    return ", ".join(offers)
+
+
+def choose_content_type(accept: Optional[str], integer_ids=True) -> str:
+    """
+    Server side of the negotiation, the first offer we can produce wins.
+    The columnar encoding only fits integer event ids.
+    """
+    for offer in (accept or "").split(","):
+        content_type = offer.split(";")[0].strip()
+        if content_type == CONTENT_COLUMNAR and integer_ids:
+            return content_type
+        if content_type == CONTENT_MSGPACK and msgpack is not None:
+            return content_type
+    return CONTENT_JSON
+
+
+def _event_timestamp_to_epoch(value: str) -> float:
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def epoch_to_event_timestamp(timestamp: float) -> str:
+    # Same shape as the server: '2026-01-14 06:49:15.373000+00:00'
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat(sep=" ", timespec="microseconds")
+
+
+def event_array(ids: list, starts: list, durations: list) -> np.ndarray:
+    """Typed events, EVENT_RECORD when every id is an integer, else OPAQUE_EVENT_RECORD."""
+    integer = all(isinstance(event_id, (int, np.integer)) and not isinstance(event_id, bool) for event_id in ids)
+    events = np.empty(len(ids), dtype=EVENT_RECORD if integer else OPAQUE_EVENT_RECORD)
+    events["id"] = ids
+    events["start"] = starts
+    events["duration"] = durations
+    return events
+
+
+def integer_ids(events: np.ndarray) -> bool:
+    return events.dtype == EVENT_RECORD
+
+
+def as_event_id(value):
+    """One id of a typed event column as a plain Python value."""
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def events_from_rows(rows: List[dict]) -> np.ndarray:
+    """JSON rows ({"id", "timestamp", "duration"}) to typed events."""
+    return event_array([row.get("id") for row in rows],
+                       [_event_timestamp_to_epoch(row.get("timestamp")) for row in rows],
+                       [float(row.get("duration") or 0) for row in rows])
+
+
+def events_to_rows(events: np.ndarray) -> List[dict]:
+    """Typed events back to the rows the server's JSON answer contains."""
+    return [
+        {"id": event_id, "timestamp": epoch_to_event_timestamp(start), "duration": float(duration)}
+        for event_id, start, duration in zip(events["id"].tolist(), events["start"].tolist(),
+                                             events["duration"].tolist())
+    ]
+
+
+def decode_event_rows(response_result_tmp) -> List[dict]:
+    """The event list arrives as a JSON string inside the JSON body."""
+    result = response_result_tmp.get("result") if isinstance(response_result_tmp, dict) else None
+    if isinstance(result, str):
+        result = json.loads(result)
+    return result or []
+
+
+def encode_events(events: np.ndarray, idle_event_id=None, content_type=CONTENT_COLUMNAR) -> bytes:
+    if content_type == CONTENT_COLUMNAR:
+        if not integer_ids(events) or not isinstance(idle_event_id, (int, type(None))):
+            raise ValueError("The columnar encoding only carries integer event ids")
+        header = COLUMNAR_HEADER.pack(COLUMNAR_MAGIC, COLUMNAR_VERSION, len(events),
+                                      NO_EVENT_ID if idle_event_id is None else int(idle_event_id))
+        columns = [np.ascontiguousarray(events[field]).astype(EVENT_RECORD[field]).tobytes()
+                   for field in EVENT_RECORD.names]
+        return header + b"".join(columns)
+    if content_type == CONTENT_MSGPACK:
+        return msgpack.packb({
+            "id": events["id"].tolist(),
+            "start": events["start"].tolist(),
+            "duration": events["duration"].tolist(),
+            "event_id": idle_event_id,
+        })
+    return json.dumps({"result": json.dumps(events_to_rows(events)), "event_id": idle_event_id}).encode()
+
+
+def _decode_columnar(body: bytes) -> Tuple[np.ndarray, object]:
+    magic, version, count, idle_event_id = COLUMNAR_HEADER.unpack_from(body)
+    if magic != COLUMNAR_MAGIC or version != COLUMNAR_VERSION:
+        raise ValueError(f"Unknown event encoding {magic!r} v{version}")
+    if len(body) != COLUMNAR_HEADER.size + count * EVENT_RECORD.itemsize:
+        raise ValueError(f"Truncated event body, {len(body)} bytes for {count} events")
+
+    events = np.empty(count, dtype=EVENT_RECORD)
+    offset = COLUMNAR_HEADER.size
+    for field in EVENT_RECORD.names:
+        column_type = EVENT_RECORD[field]
+        events[field] = np.frombuffer(body, dtype=column_type, count=count, offset=offset)
+        offset += count * column_type.itemsize
+    return events, None if idle_event_id == NO_EVENT_ID else idle_event_id
+
+
+def _decode_msgpack(body: bytes) -> Tuple[np.ndarray, object]:
+    columns = msgpack.unpackb(body)
+    events = event_array(columns.get("id") or [], columns.get("start") or [], columns.get("duration") or [])
+    return events, columns.get("event_id")
+
+
+def decode_events(content_type: Optional[str], body: bytes) -> Tuple[np.ndarray, object]:
+    """
+    Decode an event range answer into (typed events, idle event id).
+
+    Binary answers land in the typed array column by column; anything else
+    is treated as the original JSON-in-JSON answer.
+    """
+    content_type = (content_type or "").split(";")[0].strip()
+    if content_type == CONTENT_COLUMNAR:
+        return _decode_columnar(body)
+    if content_type == CONTENT_MSGPACK and msgpack is not None:
+        return _decode_msgpack(body)
+
+    response_result_tmp = json.loads(body)
+    idle_event_id = response_result_tmp.get("event_id") if isinstance(response_result_tmp, dict) else None
+    return events_from_rows(decode_event_rows(response_result_tmp)), idle_event_id
+
+
+def benchmark(count: int, repeat: int = 5):
+    start = time.time() - count * 45
+    events = np.empty(count, dtype=EVENT_RECORD)
+    events["id"] = np.arange(count) + 900_000_000
+    events["start"] = start + np.arange(count) * 45.0
+    events["duration"] = np.random.uniform(1, 45, count).round(3)
+
+    content_types = [CONTENT_JSON, CONTENT_COLUMNAR] + ([CONTENT_MSGPACK] if msgpack is not None else [])
+    for content_type in content_types:
+        body = encode_events(events, 1, content_type)
+        timings = []
+        for _ in range(repeat):
+            began = time.perf_counter()
+            decoded, _ = decode_events(content_type, body)
+            timings.append(time.perf_counter() - began)
+        assert np.array_equal(decoded["id"], events["id"])
+        print(f"{content_type:32} {len(body) / 1024:10.1f} KiB {min(timings) * 1000:10.2f} ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark event range decoding per wire encoding")
+    parser.add_argument("--events", type=int, default=50_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    benchmark(args.events, args.repeat)
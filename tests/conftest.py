@@ -0,0 +1,35 @@
+import os
+import tempfile
+
+# const.py resolves every engine folder from LOCALAPPDATA at import time
+os.environ.setdefault("LOCALAPPDATA", tempfile.mkdtemp(prefix="sd-pixel-engine-tests-"))
+
+import numpy as np
+import pytest
+
+from sd_pixel_engine.mock_server import MockState, MockSundialServer
+
+
+class FakeGrab:
+    """Stands in for grab_desktop: a different small frame on every call."""
+
+    def __init__(self, size=(90, 160)):
+        self.size = size
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        frame = np.random.default_rng(self.calls).integers(0, 255, (*self.size, 3), dtype=np.uint8)
+        return frame, (10, 10, 100, 80), {"id": self.calls % 2, "owner": f"app{self.calls % 2}"}
+
+
+@pytest.fixture
+def fake_grab():
+    return FakeGrab()
+
+
+@pytest.fixture
+def mock_server():
+    server = MockSundialServer(state=MockState()).start()
+    yield server
+    server.stop()
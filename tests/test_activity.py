@@ -0,0 +1,70 @@
+import numpy as np
+
+from sd_pixel_engine.activity import ActivityGate, is_blank_frame
+from sd_pixel_engine.screenshot import ScreenShot
+
+
+class Session:
+    """Lock state and input idle time the gate polls."""
+
+    def __init__(self):
+        self.is_locked = False
+        self.idle = 0.0
+
+    def locked(self):
+        return self.is_locked
+
+    def idle_seconds(self):
+        return self.idle
+
+
+def blank_grab():
+    return np.zeros((90, 160, 3), dtype=np.uint8), (0, 0, 160, 90), None
+
+
+def test_locked_and_idle_sessions_are_not_grabbed(fake_grab):
+    session = Session()
+    gate = ActivityGate(fake_grab, idle_threshold=300, idle_seconds=session.idle_seconds, locked=session.locked)
+
+    assert gate() is not None
+    session.is_locked = True
+    assert gate() is None
+    session.is_locked, session.idle = False, 300
+    assert gate() is None and gate() is None
+    session.idle = 5
+    assert gate() is not None
+
+    assert fake_grab.calls == 2
+    assert gate.stats() == {"state": "active", "paused": {"locked": 1, "idle": 2}}
+
+
+def test_blank_frames_are_dropped_unless_forced():
+    session = Session()
+    gate = ActivityGate(blank_grab, idle_seconds=session.idle_seconds, locked=session.locked)
+
+    assert is_blank_frame(blank_grab()[0])
+    assert gate() is None
+    assert gate.state == "blank"
+
+    session.is_locked = True
+    with gate.force():
+        assert gate() is not None
+    assert gate() is None
+    assert gate.stats()["paused"] == {"blank": 1, "locked": 1}
+
+
+def test_inactive_slot_still_gets_its_screenshot(fake_grab):
+    screenshot = ScreenShot(None, "activity-test", staging="shared", capture_source=fake_grab, activity_gate=True)
+    screenshot.activity.locked = lambda: True
+    try:
+        for _ in range(10):
+            screenshot._take_screenshot_30_seconds()
+        assert fake_grab.calls == 0
+        assert screenshot.staging.frames() == []
+
+        # One grab for the slot's idle event, whatever the lock state
+        screenshot._ensure_slot_frame()
+        assert fake_grab.calls == 1
+        assert len(screenshot.staging.frames()) == 1
+    finally:
+        screenshot.shutdown()
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from sd_pixel_engine.adaptive import BACKOFF, MIN_INTERVAL, SLOT_GRABS, AdaptiveRate, slot_max_interval
+from sd_pixel_engine.const import INTERVAL
+from sd_pixel_engine.staging import MAX_STAGED_FRAMES
+from sd_pixel_engine.screenshot import ScreenShot
+
+
+def test_still_screen_backs_off_only_to_the_slot_cap():
+    slot = 900
+    rate = AdaptiveRate(max_interval=slot_max_interval(slot))
+
+    for _ in range(20):
+        rate.update(change=0.0, load=0.1)
+
+    assert rate.interval == slot / SLOT_GRABS
+    assert rate.reason == "still"
+
+
+def test_rapid_change_tightens_and_a_window_switch_resets():
+    rate = AdaptiveRate()
+
+    for _ in range(5):
+        rate.update(change=0.5, load=0.1)
+    assert rate.interval == MIN_INTERVAL
+
+    assert rate.update(change=0.5, load=0.1, switched=True) == INTERVAL
+    # A busy CPU wins over rapid change
+    assert rate.update(change=0.5, load=0.99) == INTERVAL * BACKOFF
+    assert rate.stats()["reasons"] == {"rapid change": 5, "window switch": 1, "cpu busy": 1}
+
+
+def test_observe_compares_consecutive_grabs():
+    rate = AdaptiveRate()
+    frame = np.full((90, 160, 3), 128, dtype=np.uint8)
+
+    rate.observe(frame, {"id": 1, "owner": "app"})
+    assert rate.observe(frame, {"id": 1, "owner": "app"}) == INTERVAL * BACKOFF
+    assert rate.observe(frame, {"id": 2, "owner": "other"}) == INTERVAL
+
+
+@pytest.mark.parametrize("times_per_hour, staged", [(1, 121), (4, MAX_STAGED_FRAMES), (30, 13)])
+def test_adaptive_staging_is_bounded(fake_grab, times_per_hour, staged):
+    screenshot = ScreenShot(None, "adaptive-test", times_per_hour=times_per_hour, staging="shared",
+                            capture_source=fake_grab, adaptive_rate=True)
+    try:
+        # Without the cap a one-per-hour slot staged 361 frames at MIN_INTERVAL
+        assert screenshot.staging.frames_per_slot == staged
+    finally:
+        screenshot.shutdown()
+
+
+def test_staging_never_holds_more_than_its_bound(fake_grab):
+    screenshot = ScreenShot(None, "adaptive-test", times_per_hour=30, staging="shared",
+                            capture_source=fake_grab, adaptive_rate=True)
+    try:
+        for _ in range(20):
+            screenshot._take_screenshot_30_seconds()
+        assert len(screenshot.staging.frames()) == screenshot.staging.frames_per_slot == 13
+    finally:
+        screenshot.shutdown()
@@ -0,0 +1,70 @@
+from datetime import datetime, time
+
+import pytest
+
+from sd_pixel_engine.async_engine import AsyncEngine
+from sd_pixel_engine.schedule import SimulationEnd, VirtualClock
+from sd_pixel_engine.screenshot import ScreenShot
+
+EVERY_DAY = [0, 1, 2, 3, 4, 5, 6]
+
+
+@pytest.fixture
+def engine(mock_server, fake_grab):
+    """Windowed 08:00-10:00, 4 slots an hour, simulated from 07:50 to 10:30."""
+    def make(capture_source=fake_grab):
+        clock = VirtualClock(datetime(2026, 1, 5, 7, 50), datetime(2026, 1, 5, 10, 30))
+        screenshot = ScreenShot(mock_server.url, "async-test", time(8, 0), time(10, 0), 4, EVERY_DAY,
+                                staging="shared", capture_source=capture_source, clock=clock)
+        made.append(screenshot)
+        return AsyncEngine(screenshot)
+
+    made = []
+    yield make
+    for screenshot in made:
+        screenshot.shutdown()
+
+
+def run(engine):
+    with pytest.raises(SimulationEnd):
+        engine.run()
+    return engine.screenshot.clock
+
+
+def test_every_slot_uploads_on_the_virtual_clock(mock_server, engine):
+    engine = engine()
+    send_slot = engine.screenshot._send_slot
+    locked = []
+
+    def recording_send(*args):
+        locked.append(engine._staging.locked())
+        return send_slot(*args)
+
+    engine.screenshot._send_slot = recording_send
+    clock = run(engine)
+
+    assert clock.now() == datetime(2026, 1, 5, 10, 30)
+    assert mock_server.state.requests["/screenshot/"] == 9  # 08:00 to 10:00 every 15 minutes
+    # One grab before the window opens, then every 30 seconds up to the last slot
+    assert engine.latency.stats()["capture"]["run"]["count"] == 242
+    assert locked == [False] * 9
+
+
+def test_slot_tick_grabs_for_a_slot_without_ticks(mock_server, engine):
+    engine = engine()
+    engine.screenshot.scheduler.slot_tick = True
+    engine.screenshot.scheduler.tick_interval = 3600  # adaptive interval longer than a slot
+
+    run(engine)
+
+    assert mock_server.state.requests["/screenshot/"] == 9
+
+
+def test_slot_without_frames_is_skipped(mock_server, engine, caplog):
+    engine = engine(capture_source=lambda: None)
+
+    run(engine)
+
+    assert "/screenshot/" not in mock_server.state.requests
+    assert caplog.text.count("Nothing staged for this slot") == 9
+    assert "Slot finalize failed" not in caplog.text
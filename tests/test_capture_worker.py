@@ -0,0 +1,20 @@
+import numpy as np
+
+from sd_pixel_engine.capture_worker import CaptureWorker
+
+
+def test_first_grab_survives_the_segment_resize(fake_grab):
+    # The grab function is pickled into the worker process, its calls are counted there
+    worker = CaptureWorker(fake_grab)
+    try:
+        frame, rect, window = worker()
+        # The worker kept the grab that did not fit the (missing) segment and sent it again
+        assert worker.stats()["calls"] == {"grab": 1, "resend": 1}
+        assert np.array_equal(frame, np.random.default_rng(1).integers(0, 255, (90, 160, 3), dtype=np.uint8))
+        assert window["owner"] == "app1"
+
+        frame, rect, window = worker()
+        assert worker.stats()["calls"] == {"grab": 2, "resend": 1}
+        assert window["owner"] == "app0"
+    finally:
+        worker.stop()
@@ -0,0 +1,74 @@
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from sd_pixel_engine import compaction
+from sd_pixel_engine.compaction import COMPACTION_MAX_WIDTH, COMPACTION_RETRIES, compact_screenshots
+from sd_pixel_engine.layout import shard_folder
+
+
+@pytest.fixture
+def folders(tmp_path, monkeypatch):
+    flat, sharded = tmp_path / "flat", tmp_path / "archive"
+    flat.mkdir()
+    monkeypatch.setattr(compaction, "SCREENSHOT_FOLDER", str(flat))
+    monkeypatch.setattr(compaction, "SCREENSHOT_SHARDED_FOLDER", str(sharded))
+    return flat, sharded, str(tmp_path / "checkpoint.json")
+
+
+def final_name(days_ago: float, suffix=".png") -> str:
+    captured_at = datetime.now(timezone.utc) - timedelta(days=days_ago)
+    return f"compaction-test_{captured_at.strftime('%Y-%m-%dT%H-%M-%S.%fZ')}{suffix}", captured_at
+
+
+def write_final(folder, name, width=1200):
+    os.makedirs(folder, exist_ok=True)
+    pixels = np.random.default_rng(1).integers(0, 255, (100, width, 3), dtype=np.uint8)
+    path = os.path.join(folder, name)
+    Image.fromarray(pixels).save(path)
+    return path
+
+
+def test_old_finals_are_reencoded_once(folders):
+    flat, sharded, checkpoint = folders
+    old_name, _ = final_name(10)
+    old_flat = write_final(flat, old_name)
+    old_ocr = write_final(flat, old_name.replace(".png", "_ocr.png"))
+    sharded_name, captured_at = final_name(9)
+    old_sharded = write_final(shard_folder("compaction-test", captured_at, str(sharded)), sharded_name)
+    recent = write_final(flat, final_name(1)[0])
+    sizes = {path: os.path.getsize(path) for path in (old_flat, old_ocr, old_sharded, recent)}
+
+    report = compact_screenshots(7, workers=1, checkpoint_path=checkpoint)
+
+    assert report.files == 2 and report.reclaimed_bytes > 0
+    for path in (old_flat, old_sharded):
+        with Image.open(path) as img:
+            assert img.mode == "P" and img.width == COMPACTION_MAX_WIDTH
+        assert os.path.getsize(path) < sizes[path]
+    # OCR crops keep full quality unless asked for, recent finals are left alone
+    assert os.path.getsize(old_ocr) == sizes[old_ocr]
+    assert os.path.getsize(recent) == sizes[recent]
+
+    # The checkpoint makes the next run skip what is done
+    assert compact_screenshots(7, workers=1, checkpoint_path=checkpoint).files == 0
+
+
+def test_failed_final_is_retried_a_few_runs(folders):
+    flat, _, checkpoint = folders
+    broken = os.path.join(flat, final_name(10)[0])
+    with open(broken, "wb") as f:
+        f.write(b"not a png")
+
+    for attempt in range(1, COMPACTION_RETRIES + 1):
+        assert compact_screenshots(7, workers=1, checkpoint_path=checkpoint).files == 0
+        with open(checkpoint) as f:
+            failed = json.load(f)["failed"]
+        assert failed == ({broken: attempt} if attempt < COMPACTION_RETRIES else {})
+
+    # Given up on, and behind the checkpoint: never picked up again
+    assert compact_screenshots(7, workers=1, checkpoint_path=checkpoint).files == 0
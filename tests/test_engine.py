@@ -0,0 +1,39 @@
+import os
+from collections import Counter
+from datetime import datetime
+
+import pytest
+
+from sd_pixel_engine.engine import MultiProfileEngine
+from sd_pixel_engine.schedule import SimulationEnd, VirtualClock
+
+
+@pytest.fixture
+def defaults(mock_server):
+    return {"server_url": mock_server.url, "start_time": "08:00", "end_time": "09:00", "days": "0,1,2,3,4",
+            "tracking_interval": 1}
+
+
+def test_profiles_share_one_capture_stream(mock_server, fake_grab, defaults):
+    clock = VirtualClock(datetime(2026, 1, 5, 7, 50), datetime(2026, 1, 5, 9, 10))
+    configs = [{"user_id": "alice", "times_per_hour": 4}, {"user_id": "bob", "times_per_hour": 2}]
+    engine = MultiProfileEngine.from_configs(configs, defaults, grab=fake_grab, clock=clock)
+    try:
+        with pytest.raises(SimulationEnd):
+            engine.run()
+    finally:
+        engine.shutdown()
+
+    # One grab before 08:00, then every 30 seconds up to 09:00, whatever the number of profiles
+    assert engine.stream.grabs == fake_grab.calls == 121
+    uploaded = Counter(os.path.basename(upload["file_location"]).rsplit("_", 1)[0]
+                       for upload in mock_server.state.uploads)
+    assert uploaded == {"alice": 5, "bob": 3}
+
+
+def test_profiles_need_distinct_user_ids(defaults):
+    # Both fall back to the default user id
+    configs = [{"times_per_hour": 4}, {"times_per_hour": 2}]
+
+    with pytest.raises(ValueError, match="repeated: shared"):
+        MultiProfileEngine.from_configs(configs, dict(defaults, user_id="shared"))
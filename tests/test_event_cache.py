@@ -0,0 +1,25 @@
+import numpy as np
+
+from sd_pixel_engine.event_cache import EventTimeline
+from sd_pixel_engine.wire import events_from_rows
+
+ROWS = [
+    {"id": 900000001, "timestamp": "2026-01-14 06:49:15.373000+00:00", "duration": 12.5},
+    {"id": 900000002, "timestamp": "2026-01-14 06:49:27.873000+00:00", "duration": 40.0},
+]
+UUID_ROWS = [dict(row, id=f"3f2b6c1e-0000-4000-8000-00000000000{i}") for i, row in enumerate(ROWS)]
+
+
+def test_timeline_keeps_opaque_ids():
+    timeline = EventTimeline("http://unused/", fetch_on_query=False)
+    timeline.merge(ROWS)
+    # A server that moved to UUIDs mid-session, and an update of a running event
+    timeline.merge(UUID_ROWS[1:])
+    timeline.merge([dict(UUID_ROWS[1], duration=50.0)])
+
+    first, second = events_from_rows(ROWS)["start"]
+    assert timeline.event_at(first + 1) == ROWS[0]["id"]
+    assert timeline.event_at(second + 45) == UUID_ROWS[1]["id"]
+    assert [row["id"] for row in timeline.events_between(first, second + 1)] == \
+        [ROWS[0]["id"], ROWS[1]["id"], UUID_ROWS[1]["id"]]
+    assert np.count_nonzero(timeline._events["duration"] == 50.0) == 1
@@ -0,0 +1,92 @@
+import os
+from datetime import datetime, timezone
+
+import pytest
+
+from sd_pixel_engine.screenshot import ScreenShot
+
+
+@pytest.fixture
+def screenshot(mock_server, fake_grab):
+    screenshot = ScreenShot(mock_server.url, "finalize-test", staging="shared", capture_source=fake_grab)
+    yield screenshot
+    screenshot.shutdown()
+
+
+def run_slot(screenshot, grabs=3):
+    screenshot.negotiate_capabilities(start_outbox=False)
+    for _ in range(grabs):
+        screenshot._take_screenshot_30_seconds()
+    screenshot._finalize_slot(datetime.now(timezone.utc))
+
+
+def test_finalize_records_upload_after_the_file_is_written(mock_server, screenshot):
+    run_slot(screenshot)
+
+    state = mock_server.state
+    assert "finalize" in screenshot.capabilities
+    assert state.requests.get("/screenshot/finalize") == 1
+    assert "/screenshot/" not in state.requests
+    assert not state.pending
+    assert len(state.uploads) == 1
+    assert os.path.isfile(state.uploads[0]["file_location"])
+    assert screenshot.staging.frames() == []
+
+
+def test_failed_write_aborts_the_finalize(mock_server, screenshot, monkeypatch):
+    def failing_write(tmp_file, event_id=None):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(screenshot, "move_image_file", failing_write)
+    with pytest.raises(OSError):
+        run_slot(screenshot)
+
+    state = mock_server.state
+    assert state.uploads == []
+    assert not state.pending
+    assert state.aborted == 1
+
+
+def test_choice_without_staged_frame_falls_back_to_two_calls(mock_server, screenshot, monkeypatch):
+    state = mock_server.state
+    monkeypatch.setattr(state, "choose", lambda candidates, start, end: (
+        {"timestamp": "2000-01-01 00:00:00.000000", "file_location": "nowhere.png"}, 7))
+    run_slot(screenshot)
+
+    assert state.aborted == 1
+    assert state.requests.get("/screenshot/") == 1
+    assert len(state.uploads) == 1
+    assert os.path.isfile(state.uploads[0]["file_location"])
+
+
+def test_legacy_server_gets_two_calls(mock_server, screenshot):
+    state = mock_server.state
+    state.finalize = False
+    run_slot(screenshot)
+
+    assert screenshot.capabilities == set()
+    assert "/screenshot/finalize" not in state.requests
+    assert state.requests.get("/screenshot/get_event_time_range", 0) >= 1
+    assert state.requests.get("/screenshot/") == 1
+    assert len(state.uploads) == 1
+    assert os.path.isfile(state.uploads[0]["file_location"])
+
+
+def test_finalize_404_downgrades_to_two_calls(mock_server, screenshot):
+    state = mock_server.state
+    screenshot.negotiate_capabilities(start_outbox=False)
+    assert "finalize" in screenshot.capabilities
+
+    # The server is rolled back to a version without finalize
+    state.finalize = False
+    run_slot(screenshot)
+
+    assert "finalize" not in screenshot.capabilities
+    assert state.requests.get("/screenshot/finalize") == 1
+    assert state.requests.get("/screenshot/") == 1
+    assert len(state.uploads) == 1
+
+    # Later slots go straight to the two-call flow
+    run_slot(screenshot)
+    assert state.requests.get("/screenshot/finalize") == 1
+    assert len(state.uploads) == 2
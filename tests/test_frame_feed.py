@@ -0,0 +1,95 @@
+import os
+import uuid
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from sd_pixel_engine.frame_feed import FEED_NAME, FEED_SLOTS, SAMPLED, SELECTED, FeedReader, FrameFeed
+from sd_pixel_engine.screenshot import ScreenShot
+
+
+def noise(seed, size=(90, 160)):
+    return np.random.default_rng(seed).integers(0, 255, (*size, 3), dtype=np.uint8)
+
+
+@pytest.fixture
+def feed():
+    feed = FrameFeed(f"sd-feed-test-{os.getpid()}")
+    reader = FeedReader(feed.name)
+    yield feed, reader
+    reader.close()
+    feed.close()
+
+
+def test_publish_and_read_in_place(feed):
+    feed, reader = feed
+    assert reader.latest() is None
+
+    seq = feed.publish(noise(1), (1, 2, 3, 4), 1000.5, event_id=42)
+    feed.publish(noise(2), (0, 0, 10, 10), 1001.0, event_id=str(uuid.uuid4()), kind=SAMPLED)
+
+    frame = reader.read(seq)
+    assert frame[:5] == (1, 1000.5, (1, 2, 3, 4), 42, SELECTED)
+    assert np.array_equal(frame.pixels, noise(1))
+    assert not frame.pixels.flags.writeable
+    # Opaque event ids do not fit the record
+    assert reader.latest().event_id is None
+    assert [f.seq for f in reader.frames_since(0)] == [1, 2]
+
+
+def test_overwritten_frames_are_detected(feed):
+    feed, reader = feed
+    first = reader.read(feed.publish(noise(1), (0, 0, 1, 1), 0.0))
+
+    for i in range(FEED_SLOTS):
+        feed.publish(noise(i + 2), (0, 0, 1, 1), float(i))
+
+    assert not reader.valid(first)
+    assert reader.read(1) is None
+    assert [f.seq for f in reader.frames_since(0)] == list(range(2, FEED_SLOTS + 2))
+
+
+def test_larger_frames_move_to_a_new_generation(feed):
+    feed, reader = feed
+    feed.publish(noise(1), (0, 0, 1, 1), 0.0)
+
+    seq = feed.publish(noise(2, (180, 320)), (0, 0, 1, 1), 1.0)
+
+    assert feed.generation == 2
+    assert np.array_equal(reader.read(seq).pixels, noise(2, (180, 320)))
+    assert reader.generation == 2
+
+
+@pytest.mark.parametrize("options", [
+    {"frame_feed": "all", "feed_only": True},
+    {"frame_feed": "off", "feed_only": True},
+    {"frame_feed": "selected", "feed_only": True, "outbox": True},
+    {"frame_feed": "selected", "staging": "png"},
+])
+def test_incompatible_feed_options(options):
+    with pytest.raises(ValueError):
+        ScreenShot(None, "feed-test", **dict({"staging": "shared"}, **options))
+
+
+def test_feed_only_uploads_point_into_the_feed(mock_server, fake_grab):
+    user_id = f"feed-test-{os.getpid()}"
+    screenshot = ScreenShot(mock_server.url, user_id, staging="shared", capture_source=fake_grab,
+                            frame_feed="selected", feed_only=True)
+    reader = None
+    try:
+        screenshot.negotiate_capabilities()
+        for _ in range(3):
+            screenshot._take_screenshot_30_seconds()
+        screenshot._finalize_slot(datetime.now(timezone.utc))
+
+        name = FEED_NAME.format(user_id=user_id)
+        assert [upload["file_location"] for upload in mock_server.state.uploads] == [f"shm://{name}/1"]
+        reader = FeedReader(name)
+        selected = reader.latest()
+        assert selected.kind == SELECTED
+        assert any(np.array_equal(selected.pixels, noise(seed)) for seed in (1, 2, 3))
+    finally:
+        if reader:
+            reader.close()
+        screenshot.shutdown()
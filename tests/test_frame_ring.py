@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from sd_pixel_engine.frame_ring import CODEC_LZ4, CODEC_RAW, FrameRing
+
+HEIGHT, WIDTH = 48, 64
+RECT = (1, 2, 30, 40)
+
+
+def noise(seed):
+    return np.random.default_rng(seed).integers(0, 255, (HEIGHT, WIDTH, 3), dtype=np.uint8)
+
+
+@pytest.fixture
+def ring_path(tmp_path):
+    return str(tmp_path / "frames.ring")
+
+
+@pytest.fixture
+def open_ring(ring_path):
+    opened = []
+
+    def make(slot_count=3, compress=False):
+        ring = FrameRing.for_frame_shape(ring_path, slot_count, HEIGHT, WIDTH, compress=compress)
+        opened.append(ring)
+        return ring
+
+    yield make
+    for ring in opened:
+        ring.close()
+
+
+def test_append_and_read_back(open_ring):
+    ring = open_ring()
+    frame = noise(1)
+
+    entry = ring.append(100.0, frame, RECT)
+    pixels, read = ring.read(entry.slot)
+
+    assert np.array_equal(pixels, frame)
+    assert not pixels.flags.writeable
+    assert read == entry
+    assert (read.timestamp, read.rect, read.codec) == (100.0, RECT, CODEC_RAW)
+    del pixels
+
+
+def test_full_ring_overwrites_the_oldest_frame(open_ring):
+    ring = open_ring(slot_count=3)
+    for k in range(5):
+        ring.append(float(k), noise(k), RECT)
+
+    assert [e.timestamp for e in ring.entries()] == [2.0, 3.0, 4.0]
+    oldest = ring.entries()[0]
+    pixels, _ = ring.read(oldest.slot)
+    assert np.array_equal(pixels, noise(2))
+    del pixels
+
+
+def test_discarded_slot_is_reused_first(open_ring):
+    ring = open_ring(slot_count=3)
+    first, second, _ = (ring.append(float(k), noise(k), RECT) for k in range(3))
+    ring.discard(second.slot)
+
+    assert ring.append(3.0, noise(3), RECT).slot == second.slot
+    ring.discard(first.slot)
+    with pytest.raises(KeyError):
+        ring.read(first.slot)
+
+
+def test_reopened_ring_starts_empty(open_ring):
+    ring = open_ring()
+    ring.append(1.0, noise(1), RECT)
+    ring.close()
+
+    assert open_ring().entries() == []
+
+
+def test_lz4_ring_stores_incompressible_frames_raw(open_ring):
+    pytest.importorskip("lz4.frame")
+    ring = open_ring(compress=True)
+    flat = np.zeros((HEIGHT, WIDTH, 3), dtype=np.uint8)
+
+    packed = ring.append(1.0, flat, RECT)
+    raw = ring.append(2.0, noise(2), RECT)
+
+    assert packed.codec == CODEC_LZ4 and packed.length < flat.nbytes
+    assert raw.codec == CODEC_RAW and raw.length == ring.slot_size
+    assert np.array_equal(ring.read(packed.slot)[0], flat)
+    pixels, _ = ring.read(raw.slot)
+    assert np.array_equal(pixels, noise(2))
+    del pixels
@@ -0,0 +1,28 @@
+import threading
+import time
+
+from sd_pixel_engine.hibernation import WakeSignal
+from sd_pixel_engine.schedule import SystemClock
+
+
+def test_resume_cuts_hibernation_short():
+    signal = WakeSignal()
+    timer = threading.Timer(0.05, signal.resumed, kwargs={"long_sleep": True})
+    timer.start()
+
+    started = time.monotonic()
+    assert signal.sleep_until(time.time() + 30, SystemClock(), poll=0.01) is True
+    assert time.monotonic() - started < 5
+    timer.join()
+
+    # The long sleep is handed over once
+    assert signal.take_long_sleep() is True
+    assert signal.take_long_sleep() is False
+
+
+def test_resume_before_hibernating_does_not_wake_it():
+    signal = WakeSignal()
+    signal.resumed()
+
+    assert signal.sleep_until(time.time() + 0.05, SystemClock()) is False
+    assert signal.take_long_sleep() is False
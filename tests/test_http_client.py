@@ -0,0 +1,86 @@
+import pytest
+
+from sd_pixel_engine.http_client import CircuitBreaker, CircuitOpenError, SundialClient
+
+CAPABILITIES = "/screenshot/capabilities"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_half_open_lets_a_single_trial_through():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60, clock=clock)
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    clock.now = 60
+    assert breaker.state == "half-open"
+    assert breaker.allow() is True
+    # Every other caller waits for the trial
+    assert breaker.allow() is False
+    assert breaker.allow() is False
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow() and breaker.allow()
+
+
+def test_failed_trial_reopens_for_a_full_period():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60, clock=clock)
+    breaker.record_failure()
+
+    clock.now = 60
+    assert breaker.allow() is True
+    clock.now = 70
+    breaker.record_failure()
+
+    assert breaker.state == "open"
+    clock.now = 129
+    assert not breaker.allow()
+    clock.now = 130
+    assert breaker.allow() is True
+
+
+def test_lost_trial_frees_its_token_after_another_period():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60, clock=clock)
+    breaker.record_failure()
+
+    clock.now = 60
+    assert breaker.allow() is True
+    clock.now = 119
+    assert breaker.allow() is False
+    clock.now = 120
+    assert breaker.allow() is True
+
+
+def test_open_circuit_skips_the_server(mock_server):
+    mock_server.state.failure_rate = 1.0
+    clock = FakeClock()
+    client = SundialClient(max_retries=0, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60, clock=clock))
+    url = mock_server.url + "capabilities"
+    try:
+        for _ in range(2):
+            with pytest.raises(Exception):
+                client.get(url).raise_for_status()
+        with pytest.raises(CircuitOpenError):
+            client.get(url)
+        assert mock_server.state.requests[CAPABILITIES] == 2
+
+        # The server came back, the half-open trial closes the circuit
+        mock_server.state.failure_rate = 0.0
+        clock.now = 60
+        assert client.get(url).status_code == 200
+        assert client.breaker.state == "closed"
+        assert mock_server.state.requests[CAPABILITIES] == 3
+    finally:
+        client.close()
@@ -0,0 +1,30 @@
+import os
+from datetime import datetime, timezone
+
+import pytest
+
+from sd_pixel_engine.layout import ScreenshotLayout, parse_final_name
+
+CAPTURED_AT = datetime(2026, 1, 14, 0, 55, 52, 905552, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize("user_id", ["0a07029c9a901fe0819abf69dca12c0d", "team_a_42"])
+@pytest.mark.parametrize("suffix", [".png", "_ocr.png"])
+def test_parse_final_name(user_id, suffix):
+    assert parse_final_name(f"{user_id}_2026-01-14T00-55-52.905552Z{suffix}") == (user_id, CAPTURED_AT)
+
+
+def test_parse_final_name_rejects_other_files():
+    assert parse_final_name("frames.ring") is None
+    assert parse_final_name("team_a_42.png") is None
+
+
+def test_sharded_final_of_a_user_id_with_underscores(tmp_path):
+    layout = ScreenshotLayout("sharded", flat_folder=str(tmp_path / "flat"),
+                              sharded_folder=str(tmp_path / "archive"))
+
+    path = layout.resolve("team_a_42_2026-01-14T00-55-52.905552Z.png")
+
+    assert path == str(tmp_path / "archive" / "team_a_42" / "2026" / "01" / "14" /
+                       "team_a_42_2026-01-14T00-55-52.905552Z.png")
+    assert os.path.isdir(os.path.dirname(path))
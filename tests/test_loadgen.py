@@ -0,0 +1,51 @@
+import numpy as np
+
+from sd_pixel_engine.loadgen import FakeCaptureSource, run_load, setup_argument_parser, simulate_fleet
+from sd_pixel_engine.mock_server import MockState
+
+
+def test_fake_capture_source_is_seeded():
+    first, second = FakeCaptureSource(7, size=(90, 160)), FakeCaptureSource(7, size=(90, 160))
+
+    for _ in range(5):
+        frame, rect, window = first()
+        other_frame, other_rect, other_window = second()
+        assert frame.shape == (90, 160, 3)
+        assert np.array_equal(frame, other_frame)
+        assert (rect, window) == (other_rect, other_window)
+    assert first.grabs == 5
+
+
+def test_fault_injection_rates():
+    assert MockState(failure_rate=1.0).fault() == "fail"
+    assert MockState(drop_rate=1.0).fault() == "drop"
+
+    state = MockState(failure_rate=0.2, drop_rate=0.1, seed=3)
+    outcomes = [state.fault() for _ in range(2000)]
+    assert abs(outcomes.count("fail") / 2000 - 0.2) < 0.04
+    assert abs(outcomes.count("drop") / 2000 - 0.1) < 0.04
+
+
+def test_agents_against_the_bundled_mock():
+    args = setup_argument_parser().parse_args(["--agents", "3", "--slots", "1", "--slot_seconds", "0.5",
+                                               "--ticks_per_slot", "2", "--latency_ms", "0", "--jitter_ms", "0"])
+
+    report = run_load(args)
+
+    assert report["slots"] == 3
+    assert report["slot_errors"] == 0
+    # Every agent negotiated and finalized its slot once
+    assert report["server_paths"]["/screenshot/capabilities"] == 3
+    assert report["server_paths"]["/screenshot/finalize"] == 3
+    assert report["server"]["errors"] == 0
+    assert report["finalize_max_ms"] >= report["finalize_p50_ms"]
+
+
+def test_desync_flattens_fleet_traffic():
+    aligned = simulate_fleet(500, 60)
+    desynced = simulate_fleet(500, 60, desync=True)
+
+    assert aligned["mean_per_bucket"] == desynced["mean_per_bucket"]
+    # Every agent in one bucket versus close to the mean
+    assert aligned["peak_per_bucket"] == 500 * 2
+    assert desynced["peak_to_mean"] < 3
@@ -0,0 +1,137 @@
+import os
+import socket
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+import pytest
+import requests
+
+from sd_pixel_engine.http_client import NamedPipeSocket, SundialClient, UNIX_SCHEME, local_url, _never_sent
+from sd_pixel_engine.mock_server import MockState, MockSundialServer
+from sd_pixel_engine.screenshot import ScreenShot
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="needs Unix domain sockets")
+
+
+@pytest.fixture
+def socket_path():
+    # Socket paths are limited to ~100 bytes, keep it short
+    folder = tempfile.mkdtemp(prefix="sd-")
+    yield os.path.join(folder, "api.sock")
+    os.rmdir(folder)
+
+
+@pytest.fixture
+def unix_server(socket_path):
+    server = MockSundialServer(state=MockState(), unix_socket=socket_path).start()
+    yield server
+    server.stop()
+
+
+def test_unix_socket_round_trip(unix_server, socket_path):
+    assert unix_server.url == local_url(UNIX_SCHEME, socket_path)
+    client = SundialClient()
+    try:
+        capabilities = client.get(unix_server.url + "capabilities")
+        assert capabilities.status_code == 200
+        assert "finalize" in capabilities.json()["capabilities"]
+
+        response = client.post(unix_server.url, json={"file_location": "a.png", "event_id": 3}, idempotent=False)
+        response.raise_for_status()
+    finally:
+        client.close()
+
+    assert unix_server.state.uploads == [{"file_location": "a.png", "event_id": 3}]
+    assert unix_server.state.requests["/screenshot/capabilities"] == 1
+
+
+def test_slot_over_unix_socket(unix_server, fake_grab):
+    screenshot = ScreenShot(unix_server.url, "uds-test", staging="shared", capture_source=fake_grab)
+    try:
+        screenshot.negotiate_capabilities(start_outbox=False)
+        for _ in range(2):
+            screenshot._take_screenshot_30_seconds()
+        screenshot._finalize_slot(datetime.now(timezone.utc))
+    finally:
+        screenshot.shutdown()
+
+    uploads = unix_server.state.uploads
+    assert len(uploads) == 1
+    assert os.path.isfile(uploads[0]["file_location"])
+
+
+def test_http_urls_stay_on_tcp(mock_server):
+    client = SundialClient()
+    try:
+        response = client.get(mock_server.url + "capabilities")
+        assert response.status_code == 200
+        local = client.session.get_adapter(local_url(UNIX_SCHEME, "/unused"))
+        assert local._local_pools == {}
+    finally:
+        client.close()
+
+
+def test_missing_socket_is_never_sent(socket_path):
+    client = SundialClient(max_retries=0)
+    try:
+        with pytest.raises(requests.exceptions.ConnectionError) as error:
+            client.post(local_url(UNIX_SCHEME, socket_path), json={}, idempotent=False)
+    finally:
+        client.close()
+    # Nothing reached a server, even a non-idempotent upload may be retried
+    assert _never_sent(error.value)
+
+
+@pytest.fixture
+def silent_peer(socket_path):
+    """Accepts connections on the socket and never answers."""
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    listener.listen()
+    accepted = []
+
+    def accept():
+        while True:
+            try:
+                accepted.append(listener.accept()[0])
+            except OSError:
+                return
+
+    threading.Thread(target=accept, daemon=True).start()
+    yield socket_path
+    listener.close()
+    for conn in accepted:
+        conn.close()
+    os.unlink(socket_path)
+
+
+def test_silent_unix_peer_times_out(silent_peer):
+    client = SundialClient(read_timeout=0.2, max_retries=0)
+    try:
+        began = time.monotonic()
+        with pytest.raises(requests.exceptions.ReadTimeout):
+            client.get(local_url(UNIX_SCHEME, silent_peer) + "capabilities")
+        assert time.monotonic() - began < 5
+
+        # A slot deadline caps the read timeout too
+        with client.deadline(0.2), pytest.raises(requests.exceptions.Timeout):
+            client.get(local_url(UNIX_SCHEME, silent_peer) + "capabilities")
+    finally:
+        client.close()
+
+
+@pytest.mark.skipif(not hasattr(os, "mkfifo"), reason="needs a FIFO to stand in for a named pipe")
+def test_silent_pipe_read_times_out(tmp_path):
+    path = str(tmp_path / "pipe")
+    os.mkfifo(path)
+    pipe = NamedPipeSocket(path)
+    try:
+        pipe.settimeout(0.2)
+        began = time.monotonic()
+        with pytest.raises(socket.timeout):
+            pipe.makefile("rb").read(1)
+        assert 0.2 <= time.monotonic() - began < 5
+    finally:
+        pipe.close()
@@ -0,0 +1,89 @@
+import time
+
+import pytest
+
+from sd_pixel_engine.http_client import SundialClient
+from sd_pixel_engine.outbox import MAX_AGE, UploadOutbox, idempotency_key
+
+
+@pytest.fixture
+def outbox(mock_server, tmp_path):
+    client = SundialClient(max_retries=0)
+    outbox = UploadOutbox("outbox-test", mock_server.url, client, path=str(tmp_path / "outbox.db"))
+    yield outbox
+    outbox.close()
+    client.close()
+
+
+@pytest.fixture
+def payload(tmp_path):
+    def make(minute, exists=True):
+        final = tmp_path / f"outbox-test_2026-01-05T08-{minute:02d}-00.000000Z.png"
+        if exists:
+            final.write_bytes(b"png")
+        return {"file_location": str(final), "event_id": minute, "is_idle_screenshot": False,
+                "created_at": f"2026-01-05 08:{minute:02d}:00.000000"}
+    return make
+
+
+def test_failed_delivery_keeps_the_uploads(mock_server, outbox, payload):
+    for minute in (0, 15):
+        outbox.enqueue(payload(minute), time.time())
+    mock_server.state.failure_rate = 1.0
+
+    assert outbox.deliver_due() == 0
+    assert outbox.pending() == 2 and outbox.failed_rounds == 1
+    assert mock_server.state.uploads == []
+
+    mock_server.state.failure_rate = 0.0
+    # Rescheduled with backoff, delivered once the retry is due
+    assert outbox.deliver_due() == 0
+    assert outbox.deliver_due(now=float("inf")) == 2
+    assert outbox.pending() == 0
+    assert [upload["event_id"] for upload in mock_server.state.uploads] == [0, 15]
+
+
+def test_a_resent_upload_reuses_its_idempotency_key(mock_server, outbox, payload):
+    first = outbox.enqueue(payload(0), time.time())
+    assert outbox.enqueue(payload(0), time.time()) == first == idempotency_key("outbox-test", payload(0)["created_at"])
+    assert outbox.pending() == 1
+    outbox.deliver_due()
+
+    # Delivered, but say the process died before the row was deleted
+    outbox.enqueue(payload(0), time.time())
+    outbox.deliver_due()
+
+    assert outbox.pending() == 0
+    assert len(mock_server.state.uploads) == 1
+    assert mock_server.state.duplicates == 1
+
+
+def test_batch_uploads_in_one_round_trip(mock_server, outbox, payload):
+    outbox.batch = True
+    for minute in (0, 15, 30):
+        outbox.enqueue(payload(minute), time.time())
+
+    assert outbox.deliver_due() == 3
+    assert mock_server.state.requests == {"/screenshot/batch": 1}
+    assert len(mock_server.state.uploads) == 3
+
+
+def test_server_without_batch_falls_back_to_single_uploads(mock_server, outbox, payload):
+    mock_server.state.finalize = False  # an old server: no batch endpoint
+    outbox.batch = True
+    for minute in (0, 15):
+        outbox.enqueue(payload(minute), time.time())
+
+    assert outbox.deliver_due() == 2
+    assert outbox.batch is False
+    assert mock_server.state.requests == {"/screenshot/batch": 1, "/screenshot/": 2}
+
+
+def test_compact_drops_missing_and_expired_uploads(outbox, payload):
+    outbox.enqueue(payload(0), time.time())
+    outbox.enqueue(payload(15, exists=False), time.time())
+
+    assert outbox.compact() == 1
+    assert outbox.pending() == 1
+    assert outbox.compact(now=time.time() + MAX_AGE + 60) == 1
+    assert outbox.pending() == 0
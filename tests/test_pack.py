@@ -0,0 +1,70 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from sd_pixel_engine.layout import parse_final_name
+from sd_pixel_engine.pack import (FORMAT_OCR_PNG, FORMAT_PNG, INDEX_RECORD, NO_EVENT_ID, DailyPack, PackWriter,
+                                  export_pack)
+
+CAPTURED_AT = datetime(2026, 1, 14, 8, 15, 0, 123456, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def writer(tmp_path):
+    writer = PackWriter("pack-test", root=str(tmp_path / "packs"))
+    yield writer
+    writer.close()
+
+
+def test_written_finals_read_back_from_the_pack(writer):
+    ref = writer.write(CAPTURED_AT, b"screenshot-1", b"ocr-1", event_id=42)
+    writer.write(CAPTURED_AT + timedelta(minutes=15), b"screenshot-2", b"ocr-2")
+
+    pack = writer.pack
+    assert ref.pack_path.endswith(os.path.join("pack-test", "2026-01-14.pack"))
+    assert (ref.offset, ref.length) == (0, len(b"screenshot-1"))
+    assert len(pack) == 4
+    record = pack.lookup(CAPTURED_AT.timestamp())
+    assert bytes(pack.read(record)) == b"screenshot-1" and record.event_id == 42
+    ocr = pack.lookup(CAPTURED_AT.timestamp(), FORMAT_OCR_PNG)
+    assert bytes(pack.read(ocr)) == b"ocr-1"
+    assert pack.lookup((CAPTURED_AT + timedelta(minutes=15)).timestamp()).event_id == NO_EVENT_ID
+
+
+def test_next_day_starts_a_new_pack(writer):
+    first = writer.write(CAPTURED_AT, b"a", b"a-ocr")
+    second = writer.write(CAPTURED_AT + timedelta(days=1), b"b", b"b-ocr")
+
+    assert os.path.basename(second.pack_path) == "2026-01-15.pack"
+    assert first.pack_path != second.pack_path
+    assert len(writer.pack) == 2
+
+
+def test_reopened_pack_drops_a_torn_index_record(writer):
+    ref = writer.write(CAPTURED_AT, b"screenshot", b"ocr")
+    index_path = writer.pack.index_path
+    writer.close()
+    with open(index_path, "ab") as f:
+        f.write(b"\x01\x02\x03")  # a crash in the middle of a record
+
+    pack = DailyPack(ref.pack_path)
+    try:
+        assert [record.format for record in pack.records()] == [FORMAT_PNG, FORMAT_OCR_PNG]
+        assert bytes(pack.read(pack.record(0))) == b"screenshot"
+    finally:
+        pack.close()
+    assert os.path.getsize(index_path) % INDEX_RECORD.size == 0
+
+
+def test_export_writes_loose_finals(writer, tmp_path):
+    ref = writer.write(CAPTURED_AT, b"screenshot", b"ocr")
+    writer.close()
+
+    output = tmp_path / "export"
+    assert export_pack(ref.pack_path, str(output)) == 2
+
+    names = sorted(os.listdir(output))
+    assert names == ["pack-test_2026-01-14T08-15-00.123456Z.png", "pack-test_2026-01-14T08-15-00.123456Z_ocr.png"]
+    assert all(parse_final_name(name) == ("pack-test", CAPTURED_AT) for name in names)
+    assert (output / names[0]).read_bytes() == b"screenshot"
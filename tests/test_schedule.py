@@ -0,0 +1,138 @@
+from datetime import datetime, time, timedelta
+
+import pytest
+
+from sd_pixel_engine.const import INTERVAL
+from sd_pixel_engine.hibernation import WakeSignal
+from sd_pixel_engine.schedule import ScheduleCalendar, VirtualClock
+from sd_pixel_engine.screenshot import ScreenShot
+from sd_pixel_engine.utils import slot_phase_offset
+
+MONDAY = datetime(2026, 1, 5)
+WEEKDAYS = [0, 1, 2, 3, 4]
+
+
+def slots_between(calendar, start: datetime, end: datetime):
+    """Every slot in [start, end), walked through next_slot like the engine does."""
+    found = []
+    slot = calendar.next_slot(start - timedelta(microseconds=1))
+    while slot < end:
+        found.append(slot)
+        slot = calendar.next_slot(slot)
+    return found
+
+
+def test_same_day_window_slot_count():
+    calendar = ScheduleCalendar(time(8, 0), time(17, 0), 3600 / 7, WEEKDAYS)
+
+    monday = slots_between(calendar, MONDAY, MONDAY + timedelta(days=1))
+    # start + k * interval up to and including 17:00: k = 0..63
+    assert len(monday) == 64
+    assert monday[0] == MONDAY.replace(hour=8)
+    assert monday[-1] <= MONDAY.replace(hour=17)
+    assert slots_between(calendar, MONDAY + timedelta(days=5), MONDAY + timedelta(days=7)) == []
+
+
+def test_cross_midnight_window_belongs_to_its_start_day():
+    calendar = ScheduleCalendar(time(22, 0), time(2, 0), 900, [0])
+
+    week = slots_between(calendar, MONDAY, MONDAY + timedelta(days=7))
+    assert len(week) == 17  # 22:00 to 02:00 inclusive, every 15 minutes
+    assert week[0] == MONDAY.replace(hour=22)
+    assert week[-1] == MONDAY + timedelta(days=1, hours=2)
+    # Tuesday is not allowed, the window after Monday's is next Monday's
+    assert calendar.next_slot(week[-1]) == MONDAY + timedelta(days=7, hours=22)
+
+
+def test_anchored_grid_restarts_every_day():
+    interval = 3600 / 7
+    calendar = ScheduleCalendar(time(8, 15), time(17, 0), interval, WEEKDAYS, anchored=True)
+    grid_start = MONDAY.replace(hour=8, minute=15)
+
+    day = slots_between(calendar, grid_start, grid_start + timedelta(days=1))
+    assert len(day) == 168  # around the clock, weekdays and end time do not apply
+    for k, slot in enumerate(day):
+        assert abs((slot - grid_start).total_seconds() - k * interval) < 1e-3
+    # Saturday is on the grid too, and it starts over at 08:15 instead of continuing the previous day's
+    saturday = grid_start + timedelta(days=5)
+    assert calendar.next_slot(saturday - timedelta(seconds=1)) == saturday
+
+
+def test_phase_offset_shifts_every_slot():
+    plain = ScheduleCalendar(time(8, 0), time(17, 0), 1200, WEEKDAYS)
+    shifted = ScheduleCalendar(time(8, 0), time(17, 0), 1200, WEEKDAYS, phase_offset=42.5)
+
+    end = MONDAY + timedelta(days=1)
+    assert [slot + timedelta(seconds=42.5) for slot in slots_between(plain, MONDAY, end)] == \
+        slots_between(shifted, MONDAY, end)
+
+
+def test_phase_offset_is_hashed_from_the_user_id():
+    offsets = [slot_phase_offset(f"agent{i:04d}", 1200) for i in range(200)]
+
+    assert offsets == [slot_phase_offset(f"agent{i:04d}", 1200) for i in range(200)]
+    assert all(0 <= offset < 1200 for offset in offsets)
+    # Spread over the whole interval, not bunched up
+    assert len({int(offset // 120) for offset in offsets}) == 10
+
+
+@pytest.fixture
+def windowed():
+    def make(now: datetime, start=time(8, 0), end=time(17, 0), user_id="schedule-test", **options):
+        clock = VirtualClock(now)
+        return ScreenShot(None, user_id, start, end, 3, WEEKDAYS, staging="shared", clock=clock, **options), clock
+    return make
+
+
+@pytest.mark.parametrize("now, wake_at, reason", [
+    # After the window: one grab before tomorrow's first slot
+    (MONDAY.replace(hour=18), MONDAY + timedelta(days=1, hours=8, seconds=-INTERVAL), "outside schedule window"),
+    # Before the window on an allowed day
+    (MONDAY.replace(hour=6), MONDAY.replace(hour=8) - timedelta(seconds=INTERVAL), "outside schedule window"),
+    # Weekend: straight through to Monday
+    (MONDAY + timedelta(days=5, hours=10), MONDAY + timedelta(days=7, hours=8, seconds=-INTERVAL),
+     "schedule day not allowed"),
+])
+def test_hibernation_wake_point(windowed, now, wake_at, reason):
+    screenshot, _ = windowed(now)
+
+    assert screenshot._plan_next(now) == (None, wake_at, reason)
+
+
+def test_no_hibernation_inside_the_window(windowed):
+    now = MONDAY.replace(hour=8, minute=10)
+    screenshot, _ = windowed(now)
+
+    assert screenshot._plan_next(now) == (MONDAY.replace(hour=8, minute=20), None, None)
+
+
+def test_no_hibernation_after_midnight_inside_a_cross_midnight_window(windowed):
+    now = MONDAY + timedelta(days=1, hours=1, minutes=5)
+    screenshot, _ = windowed(now, time(22, 0), time(2, 0))
+
+    assert screenshot._plan_next(now) == (MONDAY + timedelta(days=1, hours=1, minutes=20), None, None)
+
+
+def test_hibernation_sleeps_to_the_wake_point(windowed):
+    now = MONDAY.replace(hour=18)
+    screenshot, clock = windowed(now)
+    _, wake_at, _ = screenshot._plan_next(now)
+
+    assert WakeSignal().sleep_until(wake_at.timestamp(), clock) is False
+    assert clock.now() == wake_at
+    assert screenshot._plan_next(clock.now()) == (MONDAY + timedelta(days=1, hours=8), None, None)
+
+
+def test_desync_fires_every_slot_later_and_keeps_the_last_one(windowed):
+    offset = slot_phase_offset("alice", 1200)
+    now = MONDAY.replace(hour=8, minute=10)
+    screenshot, clock = windowed(now, user_id="alice", desync_slots=True)
+
+    assert screenshot.phase_offset == offset
+    assert screenshot._plan_next(now) == (MONDAY.replace(hour=8, minute=20) + timedelta(seconds=offset), None, None)
+
+    # The 17:00 slot fires after end_time, its nominal time is still inside the window
+    clock.sleep((MONDAY.replace(hour=17) + timedelta(seconds=offset) - now).total_seconds())
+    assert screenshot._slot_outside_window() is False
+    aligned, _ = windowed(clock.now())
+    assert aligned._slot_outside_window() is True
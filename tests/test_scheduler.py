@@ -0,0 +1,67 @@
+from datetime import datetime
+
+import pytest
+
+from sd_pixel_engine.schedule import VirtualClock
+from sd_pixel_engine.scheduler import DriftFreeScheduler
+
+START = datetime(2026, 1, 5, 8, 0)
+
+
+def make_scheduler(late_policy="catch-up"):
+    clock = VirtualClock(START)
+    scheduler = DriftFreeScheduler(tick_interval=30, late_policy=late_policy, slot_grace=30,
+                                   clock=clock.monotonic, wall_clock=clock.time, sleep=clock.sleep)
+    return scheduler, clock
+
+
+def recorder(clock, start, work=lambda tick: 0.0):
+    ticks = []
+
+    def on_tick():
+        ticks.append(clock.time() - start)
+        clock.sleep(work(len(ticks)))
+    return ticks, on_tick
+
+
+def test_slow_ticks_do_not_drift():
+    scheduler, clock = make_scheduler()
+    start = clock.time()
+    # Every grab takes 7 seconds, the next one still starts on the grid
+    ticks, on_tick = recorder(clock, start, lambda tick: 7.0)
+
+    assert scheduler.wait_until(start + 300, on_tick) == 0.0
+    assert ticks == [30.0 * k for k in range(10)]
+    assert scheduler.stats()["skipped_ticks"] == 0
+
+
+@pytest.mark.parametrize("late_policy, expected, skipped", [
+    # The most recent missed tick runs right away, 10 seconds late
+    ("catch-up", [0, 30, 130, 150, 180, 210, 240, 270], 2),
+    ("skip", [0, 30, 150, 180, 210, 240, 270], 3),
+])
+def test_missed_ticks_after_a_stall(late_policy, expected, skipped):
+    scheduler, clock = make_scheduler(late_policy)
+    start = clock.time()
+    ticks, on_tick = recorder(clock, start, lambda tick: 100.0 if tick == 2 else 0.0)
+
+    scheduler.wait_until(start + 300, on_tick)
+
+    assert ticks == expected
+    assert scheduler.skipped_ticks == skipped
+
+
+@pytest.mark.parametrize("late_policy, lateness, skipped", [("catch-up", 70.0, 0), ("skip", None, 1)])
+def test_late_slot(late_policy, lateness, skipped):
+    scheduler, clock = make_scheduler(late_policy)
+    start = clock.time()
+    _, on_tick = recorder(clock, start, lambda tick: 100.0 if tick == 2 else 0.0)
+
+    assert scheduler.wait_until(start + 60, on_tick) == lateness
+    assert scheduler.skipped_slots == skipped
+    assert list(scheduler.slot_lateness) == [70.0]
+
+
+def test_unknown_late_policy():
+    with pytest.raises(ValueError, match="Unknown late policy"):
+        DriftFreeScheduler(late_policy="later")
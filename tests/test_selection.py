@@ -0,0 +1,55 @@
+import numpy as np
+
+from sd_pixel_engine.screenshot import ScreenShot
+from sd_pixel_engine.selection import CandidateSelector
+from sd_pixel_engine.staging import Capture, StagedFrame
+
+EDITOR = {"id": 1, "owner": "editor"}
+BROWSER = {"id": 2, "owner": "browser"}
+
+
+def capture(name, frame, window):
+    return Capture(StagedFrame(name, name, name), frame, (0, 0, 10, 10), window)
+
+
+def noise(seed):
+    return np.random.default_rng(seed).integers(0, 255, (90, 160, 3), dtype=np.uint8)
+
+
+def test_near_duplicates_are_dropped_first():
+    selector = CandidateSelector(2)
+    still = noise(1)
+
+    discarded = []
+    for timestamp, name, frame, window in ((0, "a0", still, EDITOR), (10, "a1", still, EDITOR),
+                                           (20, "b", noise(2), BROWSER), (90, "a2", noise(3), EDITOR)):
+        discarded += selector.add(capture(name, frame, window), timestamp)
+
+    # The browser was in front longest, the two identical editor frames tie and the oldest goes
+    assert [staged.name for staged in discarded] == ["a0"]
+    assert [c.staged.name for c in selector.candidates] == ["a1", "b", "a2"]
+
+
+def test_latest_frame_is_always_kept():
+    selector = CandidateSelector(1)
+    for timestamp in range(0, 300, 30):
+        selector.add(capture(f"editor{timestamp}", noise(timestamp), EDITOR), timestamp)
+    selector.add(capture("browser", noise(1000), BROWSER), 300)
+
+    # The browser frame scores lowest (no dwell yet) but the slot falls back to the latest grab
+    assert len(selector.candidates) == 2
+    assert selector.candidates[-1].staged.name == "browser"
+
+    selector.reset()
+    assert selector.candidates == [] and selector.dwell_timeline.total() == 0
+
+
+def test_top_k_bounds_the_staged_frames(fake_grab):
+    screenshot = ScreenShot(None, "selection-test", staging="shared", capture_source=fake_grab, top_k=2)
+    try:
+        for _ in range(8):
+            screenshot._take_screenshot_30_seconds()
+        assert screenshot.staging.frames_per_slot == 4
+        assert len(screenshot.staging.frames()) == len(screenshot.selector.candidates) == 3
+    finally:
+        screenshot.shutdown()
@@ -0,0 +1,77 @@
+import os
+
+import pytest
+
+from sd_pixel_engine.http_client import SundialClient
+from sd_pixel_engine.stream_upload import StreamUploader, TokenBucket, upload_id
+
+CHUNK = 1024
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def uploader(mock_server):
+    client = SundialClient(max_retries=0)
+    yield StreamUploader(client, mock_server.url, chunk_size=CHUNK)
+    client.close()
+
+
+@pytest.fixture
+def parts():
+    return {"screenshot": os.urandom(3 * CHUNK + 10), "ocr": os.urandom(CHUNK // 2)}
+
+
+@pytest.mark.parametrize("fault", ["stream_drops", "stream_failures"])
+def test_interrupted_upload_resumes_from_the_server_offset(mock_server, uploader, parts, fault):
+    setattr(mock_server.state, fault, 1)
+    upload = upload_id("stream-test", "final")
+
+    uploader.upload(upload, parts, {"event_id": 7})
+
+    assert uploader.resumes == 1
+    # The first chunk was stored unacknowledged, resuming does not send it again
+    assert uploader.bytes_sent == sum(len(data) for data in parts.values()) - CHUNK
+    assert mock_server.state.requests[f"/screenshot/stream/{upload}"] == 5 + 1  # chunks, one offset query
+    assert {part: bytes(data) for part, data in mock_server.state.streams[upload].items()} == parts
+    assert mock_server.state.uploads == [{"event_id": 7, "sizes": {"screenshot": 3 * CHUNK + 10, "ocr": CHUNK // 2},
+                                          "size": 3 * CHUNK + 10 + CHUNK // 2,
+                                          "file_location": f"stream:{upload}"}]
+
+
+def test_token_bucket_paces_to_its_rate():
+    fake = FakeTime()
+    bucket = TokenBucket(1000, capacity=1000, clock=fake.clock, sleep=fake.sleep)
+
+    bucket.consume(1000)  # starts full
+    assert fake.slept == []
+    bucket.consume(500)
+    assert fake.slept == [0.5]
+    # More than the bucket holds waits for a full bucket, not forever
+    bucket.consume(5000)
+    assert fake.now == 1.5
+    fake.now += 0.25
+    bucket.consume(100)
+    assert fake.now == 1.75 and bucket.tokens == 150
+
+
+def test_rate_limited_upload_takes_size_over_rate(mock_server, uploader, parts):
+    fake = FakeTime()
+    uploader.bucket = TokenBucket(CHUNK, capacity=CHUNK, clock=fake.clock, sleep=fake.sleep)
+
+    uploader.upload(upload_id("stream-test", "paced"), parts, {})
+
+    total = sum(len(data) for data in parts.values())
+    # The first chunk drains the full bucket, everything after it waits for refills
+    assert fake.now == pytest.approx((total - CHUNK) / CHUNK)
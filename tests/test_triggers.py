@@ -0,0 +1,38 @@
+from sd_pixel_engine.staging import MAX_STAGED_FRAMES, frames_per_slot
+from sd_pixel_engine.screenshot import ScreenShot
+from sd_pixel_engine.triggers import MAX_SPACING, CaptureTrigger, FakeTriggerSource, triggered_grabs
+
+
+def test_notifications_from_a_fake_source_drive_the_grabs():
+    trace = {"foreground": [[10, "a"], [11, "b"], [12, "c"]], "input": [40], "duration": 200}
+
+    # First grab right away, the alt-tab burst once 2s after its last switch,
+    # input 30s later at most, then the periodic fallback
+    assert triggered_grabs(trace) == [0.0, 14, 70, 70 + MAX_SPACING, 70 + 2 * MAX_SPACING]
+
+
+def test_grabs_keep_their_minimum_spacing():
+    source = FakeTriggerSource([(1, "foreground"), (2.5, "input"), (3, "foreground")])
+    trigger = CaptureTrigger(debounce=0, min_spacing=5)
+    trigger.grabbed(0)
+
+    source.replay_until(trigger, 3)
+
+    assert trigger.next_grab(3) == 5
+    assert source.next_event() is None
+    assert trigger.stats() == {"notifications": 3, "grabs": 1}
+
+
+def test_triggered_staging_is_capped(fake_grab):
+    source = FakeTriggerSource([])
+    screenshot = ScreenShot(None, "trigger-test", times_per_hour=1, staging="shared", capture_source=fake_grab,
+                            capture_triggers=True, trigger_source=source)
+    try:
+        assert screenshot.trigger_source is source
+        # 720 triggered grabs fit an hour slot, only as many as its 30 second ticks are staged
+        assert screenshot.staging.frames_per_slot == frames_per_slot(1) == 121
+    finally:
+        screenshot.shutdown()
+
+    assert frames_per_slot(4, min_spacing=5) == MAX_STAGED_FRAMES
+    assert frames_per_slot(60, min_spacing=5) == 13
@@ -0,0 +1,66 @@
+from datetime import datetime
+
+import pytest
+
+from sd_pixel_engine.schedule import VirtualClock
+from sd_pixel_engine.screenshot import ScreenShot
+
+EDITOR = {"id": 1, "owner": "notes.txt - Editor", "process": "editor.exe", "rect": (0, 0, 800, 600)}
+BROWSER = {"id": 2, "owner": "Docs - Browser", "process": "browser.exe", "rect": (0, 0, 1280, 720)}
+
+
+class FakeWindowSource:
+    def __init__(self):
+        self.window = None
+
+    def __call__(self):
+        return self.window
+
+
+@pytest.fixture
+def sampled(mock_server, fake_grab):
+    clock = VirtualClock(datetime(2026, 1, 5, 9, 0))
+    source = FakeWindowSource()
+    screenshot = ScreenShot(mock_server.url, "window-test", staging="shared", capture_source=fake_grab,
+                            window_sampling=True, window_source=source, clock=clock)
+    yield screenshot, source, clock
+    screenshot.shutdown()
+
+
+def test_samples_are_taken_on_the_engine_clock(sampled):
+    screenshot, source, clock = sampled
+    start = clock.time()
+
+    for window, seconds in ((EDITOR, 10), (BROWSER, 40), (EDITOR, 5)):
+        source.window = window
+        screenshot.window_sampler.sample()
+        clock.sleep(seconds)
+
+    intervals = screenshot.window_timeline.intervals(start, clock.time())
+    assert [(begin - start, finish - start, key[1]) for begin, finish, key in intervals] == [
+        (0, 10, EDITOR["owner"]), (10, 50, BROWSER["owner"]), (50, 55, EDITOR["owner"])]
+
+
+def test_slot_frame_comes_from_the_longest_dwelling_window(sampled):
+    screenshot, source, clock = sampled
+
+    source.window = EDITOR
+    screenshot.window_sampler.sample()
+    screenshot._take_screenshot_30_seconds()
+    clock.sleep(10)
+    source.window = BROWSER
+    screenshot.window_sampler.sample()
+    clock.sleep(10)
+    screenshot._take_screenshot_30_seconds()  # the only grab of the browser
+    browser_grab = clock.utcnow()
+    clock.sleep(30)
+    source.window = EDITOR
+    screenshot.window_sampler.sample()
+    clock.sleep(5)
+    screenshot._take_screenshot_30_seconds()
+
+    staged = screenshot.staging.frames()
+    start_time, end_time = screenshot._slot_time_range(staged)
+    matched, _ = screenshot._match_with_window_timeline(staged, start_time, end_time)
+
+    assert matched.utc_time == browser_grab.strftime("%Y-%m-%d %H:%M:%S.%f")
@@ -0,0 +1,47 @@
+import pytest
+
+from sd_pixel_engine.wire import (CONTENT_COLUMNAR, CONTENT_JSON, CONTENT_MSGPACK, EVENT_RECORD, OPAQUE_EVENT_RECORD,
+                                  accept_header, choose_content_type, decode_events, encode_events,
+                                  events_from_rows, events_to_rows, msgpack)
+
+ROWS = [
+    {"id": 900000001, "timestamp": "2026-01-14 06:49:15.373000+00:00", "duration": 12.5},
+    {"id": 900000002, "timestamp": "2026-01-14 06:49:27.873000+00:00", "duration": 40.0},
+]
+UUID_ROWS = [dict(row, id=f"3f2b6c1e-0000-4000-8000-00000000000{i}") for i, row in enumerate(ROWS)]
+
+
+def content_types():
+    return [CONTENT_COLUMNAR, CONTENT_JSON] + ([CONTENT_MSGPACK] if msgpack is not None else [])
+
+
+@pytest.mark.parametrize("content_type", content_types())
+def test_integer_ids_round_trip(content_type):
+    events = events_from_rows(ROWS)
+    assert events.dtype == EVENT_RECORD
+
+    decoded, idle_event_id = decode_events(content_type, encode_events(events, 77, content_type))
+
+    assert events_to_rows(decoded) == ROWS
+    assert idle_event_id == 77
+
+
+@pytest.mark.parametrize("content_type", [t for t in content_types() if t != CONTENT_COLUMNAR])
+def test_opaque_ids_round_trip(content_type):
+    events = events_from_rows(UUID_ROWS)
+    assert events.dtype == OPAQUE_EVENT_RECORD
+
+    decoded, idle_event_id = decode_events(content_type, encode_events(events, "idle-uuid", content_type))
+
+    assert events_to_rows(decoded) == UUID_ROWS
+    assert idle_event_id == "idle-uuid"
+
+
+def test_opaque_ids_are_never_sent_columnar():
+    events = events_from_rows(UUID_ROWS)
+
+    with pytest.raises(ValueError):
+        encode_events(events, None, CONTENT_COLUMNAR)
+    assert choose_content_type(accept_header(), integer_ids=False) != CONTENT_COLUMNAR
+    assert choose_content_type(accept_header()) == CONTENT_COLUMNAR
+